@@ -1,12 +1,13 @@
+import datetime
 import json
 import re
 
 from PySide2 import QtGui
 from PySide2.QtCore import Qt
 from PySide2.QtWidgets import QDialog, QGridLayout, QLineEdit, QPushButton, QSizePolicy, QLabel, QPlainTextEdit, \
-    QTextEdit, QCheckBox, QApplication, QFrame
+    QTextEdit, QCheckBox, QApplication, QFrame, QComboBox, QScrollArea, QListWidget, QListWidgetItem, QAbstractItemView
 
-from . import Globals, Utils
+from . import Globals, Utils, Palette, Reports, TimeHistory, Export
 from .Globals import default_window_style
 
 
@@ -398,7 +399,7 @@ class ChangelogDialog(QDialog):
 
 class StatisticsDialog(QDialog):
 
-    def __init__(self):
+    def __init__(self, session_stats=()):
         QDialog.__init__(self)
 
         self.setWindowTitle('Dev Statistics')
@@ -411,6 +412,12 @@ class StatisticsDialog(QDialog):
         self.setWindowIcon(QtGui.QIcon(Utils.get_local_file_path('icon.png')))
 
         stats_items = list(Globals.config['stats'].items()) + [ ('invert_run_pause_button', Globals.config['options']['boomer_compatibility']['invert_run_pause_button']) ]
+        # contatori della sessione corrente, non salvati
+        stats_items += [
+            ('style_property_changes', Utils.style_invalidator.changes),
+            ('style_property_changes_skipped', Utils.style_invalidator.skipped),
+            ('style_repolishes', Utils.style_invalidator.repolished)
+        ] + list(session_stats)
 
         stats_text = '''
             <b>Dev Statistics</b>
@@ -447,6 +454,363 @@ class StatisticsDialog(QDialog):
         self.adjustSize()
 
 
+class ReportsDialog(QDialog):
+
+    # periodo -> funzione che dato il giorno corrente ritorna l'intervallo [inizio, fine) in secondi
+    periods = {
+        'This week': lambda today: TimeHistory.week_range(today),
+        'Last week': lambda today: TimeHistory.week_range(today - datetime.timedelta(days=7)),
+        'This month': lambda today: (TimeHistory.day_range(today.replace(day=1))[0], TimeHistory.day_range(today)[1]),
+        'Last 30 days': lambda today: (TimeHistory.day_range(today - datetime.timedelta(days=29))[0], TimeHistory.day_range(today)[1]),
+        'This year': lambda today: (TimeHistory.day_range(today.replace(month=1, day=1))[0], TimeHistory.day_range(today)[1]),
+    }
+
+    groupings = {
+        'By day': (Reports.DAY,),
+        'By ticket': (Reports.TICKET,),
+        'By color group': (Reports.COLOR_GROUP,),
+        'By week and ticket': (Reports.WEEK, Reports.TICKET),
+        'By week and color group': (Reports.WEEK, Reports.COLOR_GROUP),
+    }
+
+    def __init__(self, history):
+        QDialog.__init__(self)
+
+        self.history = history
+
+        self.setWindowTitle('Reports')
+        self.setStyleSheet(default_window_style + '''
+            QDialog, QScrollArea, QLabel { background-color: #232931 }
+            QComboBox { background-color: #444f5d; }
+            QPushButton { padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4; }
+        ''')
+
+        self.setWindowIcon(QtGui.QIcon(Utils.get_local_file_path('icon.png')))
+
+        # QWidget Layout
+        self.box = QGridLayout()
+
+        self.period = QComboBox()
+        self.period.addItems(list(self.periods))
+        self.period.currentIndexChanged.connect(self.update_report)
+        self.box.addWidget(self.period, 0, 0)
+
+        self.grouping = QComboBox()
+        self.grouping.addItems(list(self.groupings))
+        self.grouping.currentIndexChanged.connect(self.update_report)
+        self.box.addWidget(self.grouping, 0, 1)
+
+        self.text = QLabel()
+        self.text.setTextFormat(Qt.RichText)
+        self.text.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+
+        self.scroll = QScrollArea()
+        self.scroll.setWidgetResizable(True)
+        self.scroll.setWidget(self.text)
+        self.box.addWidget(self.scroll, 1, 0, 1, 2)
+
+        self.close_button = QPushButton('Close')
+        self.close_button.clicked.connect(lambda: self.accept())
+        self.close_button.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
+        self.box.addWidget(self.close_button, 2, 0, 1, 2, alignment=Qt.AlignCenter)
+
+        self.setLayout(self.box)
+        self.resize(520, 480)
+
+        self.update_report()
+
+    def update_report(self):
+        since, until = self.periods[self.period.currentText()](datetime.date.today())
+        keys = self.groupings[self.grouping.currentText()]
+
+        report = Reports.Report(self.history, since, until)
+        totals = report.totals(*keys)
+
+        rows = []
+        for key in sorted(totals, key=lambda k: tuple(str(v) for v in k)):
+            cells = ''.join('<td>{}</td>'.format(self._label(k, v)) for k, v in zip(keys, key))
+            rows.append('<tr>{}<td align="right">{}</td></tr>'.format(cells, self._format_time(totals[key])))
+
+        self.text.setText('''
+            <b>Total: {}</b>
+            <table cellspacing="4">
+                {}
+            </table>
+        '''.format(self._format_time(report.total()), ''.join(rows) if len(rows) > 0 else '<tr><td>No time tracked in this period</td></tr>'))
+
+    @staticmethod
+    def _label(key, value):
+        if key == Reports.DAY:
+            return value.strftime('%a %d/%m/%Y')
+        elif key == Reports.WEEK:
+            return 'Week of {}'.format(value.strftime('%d/%m/%Y'))
+        elif key == Reports.TICKET:
+            return '#{}'.format(value) if value != '' else 'No ticket'
+        elif key == Reports.COLOR_GROUP:
+            return '<span style="color: {}">&#9632;</span> {}'.format(Palette.group_colors.get(value, 'transparent'), value)
+
+        return value
+
+    @staticmethod
+    def _format_time(seconds):
+        # i totali possono essere negativi se nel periodo è stato solo tolto tempo
+        return ('-' if seconds < 0 else '') + Utils.format_time(abs(seconds))
+
+
+class ExportDialog(QDialog):
+
+    sources = {
+        'Tasks': Export.TASKS,
+        'Time history': Export.HISTORY,
+    }
+
+    formats = {
+        'CSV': Export.CSV,
+        'JSON lines': Export.JSONL,
+    }
+
+    def __init__(self):
+        QDialog.__init__(self)
+
+        self.setWindowTitle('Export')
+        self.setStyleSheet(default_window_style + '''
+            QDialog { background-color: #232931 }
+            QLineEdit, QComboBox { background-color: #444f5d; }
+            QPushButton, QLabel { padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4; }
+            QLineEdit:disabled { background-color: #323942; color: grey; }
+        ''')
+
+        self.setWindowIcon(QtGui.QIcon(Utils.get_local_file_path('icon.png')))
+
+        # QWidget Layout
+        self.box = QGridLayout()
+
+        self.source = QComboBox()
+        self.source.addItems(list(self.sources))
+        self.source.currentIndexChanged.connect(self.update_ctrls_status)
+        self.box.addWidget(QLabel('Export:'), 0, 0)
+        self.box.addWidget(self.source, 0, 1)
+
+        self.format = QComboBox()
+        self.format.addItems(list(self.formats))
+        self.box.addWidget(QLabel('Format:'), 1, 0)
+        self.box.addWidget(self.format, 1, 1)
+
+        self.since = QLineEdit()
+        self.since.setPlaceholderText('YYYY-MM-DD')
+        self.box.addWidget(QLabel('From day:'), 2, 0)
+        self.box.addWidget(self.since, 2, 1)
+
+        self.until = QLineEdit()
+        self.until.setPlaceholderText('YYYY-MM-DD')
+        self.box.addWidget(QLabel('To day:'), 3, 0)
+        self.box.addWidget(self.until, 3, 1)
+
+        self.ticket_number = QLineEdit()
+        self.box.addWidget(QLabel('Ticket:'), 4, 0)
+        self.box.addWidget(self.ticket_number, 4, 1)
+
+        self.color_group = QComboBox()
+        self.color_group.addItems(['Any'] + list(Palette.group_colors))
+        self.box.addWidget(QLabel('Color group:'), 5, 0)
+        self.box.addWidget(self.color_group, 5, 1)
+
+        self.error_label = QLabel()
+        self.error_label.setStyleSheet('color: #fa7161')
+        self.box.addWidget(self.error_label, 6, 0, 1, 2)
+
+        self.ok_button = QPushButton('Export')
+        self.ok_button.clicked.connect(self.check_data)
+        self.ok_button.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
+        self.box.addWidget(self.ok_button, 7, 0, 1, 2, alignment=Qt.AlignCenter)
+
+        self.setLayout(self.box)
+
+        self.update_ctrls_status()
+
+    def update_ctrls_status(self):
+        # l'intervallo di giorni si applica solo allo storico
+        history = self.sources[self.source.currentText()] == Export.HISTORY
+
+        self.since.setEnabled(history)
+        self.until.setEnabled(history)
+
+    def get_options(self):
+        # parametri per Export.export (a parte output e sorgenti dei dati)
+        return {
+            'what': self.sources[self.source.currentText()],
+            'fmt': self.formats[self.format.currentText()],
+            'since': self._date(self.since),
+            'until': self._date(self.until),
+            'ticket': self.ticket_number.text().strip(' \n\t#') or None,
+            'color_group': None if self.color_group.currentIndex() == 0 else self.color_group.currentText(),
+        }
+
+    def check_data(self):
+        for widget in (self.since, self.until):
+            try:
+                self._date(widget)
+                self.clear_error(widget)
+            except ValueError:
+                self.show_error('The day must be in the format YYYY-MM-DD', widget)
+                return
+
+        success, error_msg = Utils.integer_number_validator(self.ticket_number.text())
+        if not success:
+            self.show_error(error_msg, self.ticket_number)
+            return
+        else:
+            self.clear_error(self.ticket_number)
+
+        self.accept()
+
+    def show_error(self, message, widget):
+        widget.setStyleSheet('background-color: #fa7161')
+        self.error_label.setText(message)
+
+    def clear_error(self, widget):
+        widget.setStyleSheet('')
+
+    @staticmethod
+    def _date(widget):
+        text = widget.text().strip()
+
+        if text == '' or not widget.isEnabled():
+            return None
+
+        return datetime.date.fromisoformat(text)
+
+
+class ArchiveTasksDialog(QDialog):
+
+    def __init__(self):
+        QDialog.__init__(self)
+
+        self.setWindowTitle('Archive tasks')
+        self.setStyleSheet(default_window_style + '''
+            QDialog { background-color: #232931 }
+            QLineEdit { background-color: #444f5d; }
+            QPushButton, QLabel { padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4; }
+            QLineEdit:disabled { background-color: #323942; color: grey; }
+        ''')
+
+        self.setWindowIcon(QtGui.QIcon(Utils.get_local_file_path('icon.png')))
+
+        # QWidget Layout
+        self.box = QGridLayout()
+
+        self.box.addWidget(QLabel('Archived tasks are removed from the list, they can be restored from <i>Actions > Archived tasks</i>'), 0, 0, 1, 2)
+
+        self.zero_time = QCheckBox('Archive tasks with no time')
+        self.box.addWidget(self.zero_time, 1, 0, 1, 2)
+
+        self.inactive = QCheckBox('Archive tasks without time tracked in the last days:')
+        self.inactive.stateChanged.connect(self.update_ctrls_status)
+        self.box.addWidget(self.inactive, 2, 0)
+
+        self.inactive_days = QLineEdit('30')
+        self.box.addWidget(self.inactive_days, 2, 1)
+
+        self.error_label = QLabel()
+        self.error_label.setStyleSheet('color: #fa7161')
+        self.box.addWidget(self.error_label, 3, 0, 1, 2)
+
+        self.ok_button = QPushButton('Archive')
+        self.ok_button.clicked.connect(self.check_data)
+        self.ok_button.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
+        self.box.addWidget(self.ok_button, 4, 0, 1, 2, alignment=Qt.AlignCenter)
+
+        self.setLayout(self.box)
+
+        self.update_ctrls_status()
+
+    def update_ctrls_status(self):
+        self.inactive_days.setEnabled(self.inactive.isChecked())
+
+    def get_inactive_days(self):
+        # None se il criterio non è stato scelto
+        return int(self.inactive_days.text().strip()) if self.inactive.isChecked() else None
+
+    def check_data(self):
+        if not self.zero_time.isChecked() and not self.inactive.isChecked():
+            self.error_label.setText('Choose which tasks to archive')
+            return
+
+        if self.inactive.isChecked():
+            success, error_msg = Utils.integer_number_validator(self.inactive_days.text())
+            if not success or self.inactive_days.text().strip() == '':
+                self.show_error(error_msg or 'The number of days cannot be empty', self.inactive_days)
+                return
+            else:
+                self.clear_error(self.inactive_days)
+
+        self.accept()
+
+    def show_error(self, message, widget):
+        widget.setStyleSheet('background-color: #fa7161')
+        self.error_label.setText(message)
+
+    def clear_error(self, widget):
+        widget.setStyleSheet('')
+
+
+class ArchivedTasksDialog(QDialog):
+
+    def __init__(self, archive):
+        QDialog.__init__(self)
+
+        self.archive = archive
+        # l'archivio viene letto una sola volta, le ricerche vengono fatte in memoria
+        self._archived = archive.tasks()
+
+        self.setWindowTitle('Archived tasks')
+        self.resize(560, 420)
+        self.setStyleSheet(default_window_style + '''
+            QDialog, QListWidget { background-color: #232931 }
+            QLineEdit { background-color: #444f5d; }
+            QListWidget::item:selected { background-color: #4d1f48; }
+            QPushButton, QLabel { padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4; }
+        ''')
+
+        self.setWindowIcon(QtGui.QIcon(Utils.get_local_file_path('icon.png')))
+
+        # QWidget Layout
+        self.box = QGridLayout()
+
+        self.search = QLineEdit()
+        self.search.setPlaceholderText('Search by name, ticket or notes')
+        self.search.textChanged.connect(self.update_list)
+        self.box.addWidget(self.search, 0, 0)
+
+        self.list = QListWidget()
+        self.list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.box.addWidget(self.list, 1, 0)
+
+        self.restore_button = QPushButton('Restore selected')
+        self.restore_button.clicked.connect(self.accept)
+        self.restore_button.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
+        self.box.addWidget(self.restore_button, 2, 0, alignment=Qt.AlignCenter)
+
+        self.setLayout(self.box)
+
+        self.update_list()
+
+    def update_list(self):
+        self.list.clear()
+
+        for task_id, archived_at, task in self.archive.search(self.search.text(), self._archived):
+            text = '{}{} - {} (archived {})'.format('#{} '.format(task['ticket']) if task['ticket'] != '' else '', task['name'],
+                                                  Utils.format_time(task['elapsed_time']),
+                                                  datetime.datetime.fromtimestamp(archived_at).strftime('%d/%m/%Y'))
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, task_id)
+            self.list.addItem(item)
+
+    def get_selected(self):
+        # coppie (id, dizionario del task) dei task da ripristinare
+        return [(i.data(Qt.UserRole), self._archived[i.data(Qt.UserRole)][1]) for i in self.list.selectedItems()]
+
+
 class ConfigurationDialog(QDialog):
 
     def __init__(self, current_config):
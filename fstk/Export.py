@@ -0,0 +1,151 @@
+import argparse
+import csv
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import sys
+
+from . import Globals, TimeHistory
+from .NotesStore import NotesStore
+from .SaveFiles import SaveFile
+from .TaskArchive import TaskArchive
+
+# l'export è una catena di generatori (sorgente -> filtri -> scrittura), in modo che una riga alla volta sia in memoria
+# indipendentemente dalla dimensione dello storico
+
+TASKS = 'tasks'
+HISTORY = 'history'
+
+CSV = 'csv'
+JSONL = 'jsonl'
+
+task_fields = ('id', 'name', 'ticket', 'elapsed_time', 'color_group', 'ticket_title', 'notes')
+segment_fields = ('start', 'seconds', 'kind', 'task_id', 'task_name', 'ticket', 'color_group')
+
+
+# sorgenti
+
+def task_rows(tasks, notes_store=None):
+    # tasks: coppie (id, dizionario del task). Il testo delle note viene letto dal notes store, senza il notes store
+    # viene esportata l'anteprima
+    for task_id, task in tasks:
+        row = {'id': task_id}
+        row.update((f, task.get(f, '')) for f in task_fields[1:-1])
+        row['notes'] = notes_store.get(task.get('notes_ref', '')) if notes_store is not None else task.get('notes_preview', '')
+
+        yield row
+
+
+def segment_rows(history, since, until, ticket=None, task_names=None):
+    # il filtro per ticket viene fatto dallo storico, che legge solo i giorni in cui il ticket compare
+    task_names = {} if task_names is None else task_names
+
+    for s in history.segments(since, until, ticket=ticket):
+        yield {
+            'start': datetime.datetime.fromtimestamp(s.start).isoformat(),
+            'seconds': s.seconds,
+            'kind': s.kind,
+            'task_id': s.task_id,
+            'task_name': task_names.get(s.task_id, ''),
+            'ticket': s.ticket,
+            'color_group': s.color_group
+        }
+
+
+# filtri
+
+def filter_rows(rows, ticket=None, color_group=None):
+    for row in rows:
+        if ticket is not None and row['ticket'] != ticket:
+            continue
+        if color_group is not None and row['color_group'] != color_group:
+            continue
+
+        yield row
+
+
+# scrittura, ritornano il numero di righe scritte
+
+def write_csv(rows, out, fields):
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+
+    return count
+
+
+def write_jsonl(rows, out, fields=None):
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False) + '\n')
+        count += 1
+
+    return count
+
+
+writers = {
+    CSV: write_csv,
+    JSONL: write_jsonl
+}
+
+
+def export(what, fmt, out, tasks=None, history=None, since=None, until=None, ticket=None, color_group=None, notes_store=None):
+    # since e until (date, comprese) limitano solo i segmenti dello storico, i task non hanno una data
+    if what == TASKS:
+        rows, fields = task_rows(tasks, notes_store), task_fields
+    elif what == HISTORY:
+        since = 0 if since is None else TimeHistory.day_range(since)[0]
+        until = TimeHistory.day_range(datetime.date.today() if until is None else until)[1]
+        task_names = {task_id: task['name'] for task_id, task in tasks} if tasks is not None else None
+
+        rows, fields = segment_rows(history, since, until, ticket, task_names), segment_fields
+    else:
+        raise ValueError('Unknown export source ({})'.format(what))
+
+    return writers[fmt](filter_rows(rows, ticket, color_group), out, fields)
+
+
+def main(argv):
+    # entry point senza interfaccia grafica: python -m fstk export ...
+    parser = argparse.ArgumentParser(prog='python -m fstk export', description='Export tasks or time history to CSV or JSON lines.')
+    parser.add_argument('what', choices=(TASKS, HISTORY))
+    parser.add_argument('-f', '--format', choices=tuple(writers), default=CSV)
+    parser.add_argument('-o', '--output', help='output file (default: standard output)')
+    parser.add_argument('--since', type=datetime.date.fromisoformat, help='first day (YYYY-MM-DD) of the exported history')
+    parser.add_argument('--until', type=datetime.date.fromisoformat, help='last day (YYYY-MM-DD) of the exported history')
+    parser.add_argument('--ticket')
+    parser.add_argument('--color-group')
+    args = parser.parse_args(argv)
+
+    # i file vengono aperti in sola lettura, l'export può essere fatto anche mentre il software è in esecuzione
+    # le note migrate da un file dei task non ancora aggiornato rimangono in memoria
+    notes_store = NotesStore(os.path.join(Globals.config_folder, Globals.notes_folder_name), read_only=True)
+
+    try:
+        saved = SaveFile(os.path.join(Globals.config_folder, Globals.tasks_file_name), filetype='tasks', default={'current_tasks': {}, 'version': Globals.tasks_file_version}, journal=True, backend=Globals.storage_backend, read_only=True,
+                         migration_resources={'notes_store': notes_store, 'task_archive': TaskArchive(os.path.join(Globals.config_folder, Globals.archive_folder_name))})
+        tasks = [(int(k), t) for k, t in saved['current_tasks'].items()]
+        history = TimeHistory.TimeHistory(TimeHistory.open_store(read_only=True)) if args.what == HISTORY else None
+    except (OSError, sqlite3.Error) as e:
+        logging.critical('Unable to open save files for export: {}'.format(e))
+        return 1
+
+    out = sys.stdout if args.output is None else open(args.output, 'w', newline='')
+
+    try:
+        count = export(args.what, args.format, out, tasks, history, args.since, args.until, args.ticket, args.color_group, notes_store)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if history is not None:
+            history.store.close()
+
+    logging.info('Exported {} rows'.format(count))
+
+    return 0
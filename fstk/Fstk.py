@@ -1,23 +1,36 @@
+import datetime
 import json
 import logging
 import os
+import shutil
 import sys
+import time
+from contextlib import contextmanager
 
 import requests
 import webbrowser
 from PySide2 import QtGui, QtCore
-from PySide2.QtCore import Qt, Slot, QPoint, QEvent, QTimer, Signal, QThread
-from PySide2.QtGui import QFont, QDrag, QPixmap, QPainter, QCursor
+from PySide2.QtCore import Qt, Slot, QPoint, QEvent, QTimer, Signal, QThread, QRect, QSize, QModelIndex, QPersistentModelIndex
+from PySide2.QtGui import QFont, QDrag, QPixmap, QPainter, QCursor, QColor
 from PySide2.QtWidgets import (QAction, QApplication, QHBoxLayout, QLabel, QMainWindow, QPushButton, QWidget,
-                               QListWidget, QListWidgetItem, QGridLayout,
-                               QSizePolicy, QAbstractItemView, QListView, QMenu)
+                               QGridLayout, QSizePolicy, QAbstractItemView, QListView, QMenu, QStyledItemDelegate,
+                               QStyle, QFileDialog)
 
 from .Dialogs import (AskForTextDialog, ConfirmDialog, NewTaskDialog, HelpDialog, InformationDialog, ChangelogDialog,
-                      StatisticsDialog, ConfigurationDialog, ShowNotesDialog, EditNotesDialog)
+                      StatisticsDialog, ConfigurationDialog, ShowNotesDialog, EditNotesDialog, ReportsDialog,
+                      ExportDialog, ArchiveTasksDialog, ArchivedTasksDialog)
 
 from .SaveFiles import SaveFile
-from . import Globals, Utils, Palette, Redmine
+from . import Globals, Utils, Palette, Redmine, Styles
+from .TimeTracking import TimeAggregates, TimeAccounting
+from . import TimeHistory
+from .Tasks import Task, TaskListModel
+from .TaskArchive import TaskArchive
+from .NotesStore import NotesStore
+from .Snapshots import Snapshots
+from .RenderScheduler import RenderScheduler
 from . import Updater
+from . import Export
 
 
 class QLabelClickable(QLabel):
@@ -62,35 +75,27 @@ class QPushButtonDoubleClickable(QPushButton):
             self.timer.start(250)
 
 class TaskElement(QWidget):
-    _seconds = 0
-    _color_group = 'No color'
+    # editor della riga selezionata della lista dei task. Le altre righe non hanno widget, vengono disegnate da TaskDelegate
 
-    _saved = False
-    _main_widget = None
-    _list = None
-    _list_item = None
-
-    _notes = ''
+    # lo stile dei widget è definito da Styles.task_row_style, nello stylesheet dell'applicazione
 
-    type = 'task'
+    _task = None
+    _main_widget = None
 
-    def __init__(self, options, main_widget, list_, list_item):
-        super().__init__()
+    def __init__(self, main_widget, parent=None):
+        super().__init__(parent)
         self._main_widget = main_widget
-        self._list = list_
-        self._list_item = list_item
 
-        # inizializzato in un metodo sotto
-        self._notes_dialog = None
-        self._notes = options.get('notes', '')
-
-        fa5 = QFont('Font Awesome 5 Pro')
+        fa5 = Styles.font(Styles.ICONS)
 
         self.box = QGridLayout()
+        # i margini devono coincidere con quelli usati da TaskDelegate per disegnare le righe
+        self.box.setContentsMargins(TaskDelegate.color_group_border + TaskDelegate.margin, TaskDelegate.margin, TaskDelegate.margin, TaskDelegate.margin)
+        self.box.setSpacing(TaskDelegate.spacing)
 
-        self.name = QLabelClickable(options['name'])
+        self.name = QLabelClickable()
         self.name.setWordWrap(True)
-        self.name.clicked.connect(self.edit_name)
+        self.name.clicked.connect(lambda: self._main_widget.edit_task_name(self._task))
 
         self.name.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Minimum)
 
@@ -99,74 +104,54 @@ class TaskElement(QWidget):
 
         self.redmine_elements = QGridLayout()
 
-        self.ticket_number = QPushButtonDoubleClickable(options['ticket_number'])
-        self.ticket_number.setStyleSheet('''
-            QPushButton { background-color: transparent; border: 0; padding: 0px }
-            QPushButton[duplicated=true]  { border: 1px solid #fae661; padding: 2px }
-        ''')
+        self.ticket_number = QPushButtonDoubleClickable()
+        self.ticket_number.setObjectName('ticketNumber')
 
-        self.ticket_number.singleClicked.connect(self.edit_ticket_number)
-        self.ticket_number.doubleClicked.connect(self.open_ticket_main_webpage)
+        self.ticket_number.singleClicked.connect(lambda: self._main_widget.edit_task_ticket(self._task))
+        self.ticket_number.doubleClicked.connect(lambda: self._main_widget.open_ticket_main_webpage(self._task))
         self.redmine_elements.addWidget(self.ticket_number, 0, 0)
 
-        title = options.get('ticket_title')
-        self.ticket_title = QLabel(title if title is not None else 'Unable to find the specified ticket')
+        self.ticket_title = QLabel()
         self.ticket_title.setWordWrap(True)
         self.ticket_title.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Minimum)
-        self.ticket_title.setFont(QFont('Mono', 9, italic=True))
-        self.ticket_title.setProperty('invalid', title is None)
-        self.ticket_title.setStyleSheet('''
-            QLabel[counting=true] { color: #61ccfa; } 
-            QLabel[counting=false] { color: #6e6e6e; }
-            QLabel[invalid=true] { color: #fa7161; } 
-        ''')
+        self.ticket_title.setObjectName('ticketTitle')
+        self.ticket_title.setFont(Styles.font(Styles.TICKET_TITLE))
         self.redmine_elements.addWidget(self.ticket_title, 0, 1)
         self.redmine_elements.setColumnStretch(1, 7)
 
-        # self.save_to_redmine = QPushButton('Save')
-        # self.save_to_redmine.setStyleSheet('padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4;')
-        # self.redmine_elements.addWidget(self.save_to_redmine, alignment=Qt.AlignLeft)
-
         self.box.addLayout(self.redmine_elements, 1, 0)
 
         self.spent_time = QLabelClickable('00:00:00')
-        self.spent_time.setFont(QFont('Mono', 16))
-        self.spent_time.clicked.connect(self.open_ticket_new_time_webpage)
+        self.spent_time.setFont(Styles.font(Styles.TIME))
+        self.spent_time.clicked.connect(lambda: self._main_widget.open_ticket_new_time_webpage(self._task))
 
         self.box.addWidget(self.spent_time, 0, 1)
         self.box.setColumnStretch(1, 2)
 
         self.time_buttons = QHBoxLayout()
 
+        button_w, button_h = Styles.button_size(self.name.font())
+
         self.add_time = QPushButton('plus')
         self.add_time.setFont(fa5)
-        self.add_time.clicked.connect(self.add_time_f)
-        self.add_time.setStyleSheet('padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4;')
-        self.add_time.setMaximumWidth(self.get_button_size()[0])
-        self.add_time.setMinimumWidth(self.get_button_size()[0])
-        self.add_time.setMinimumHeight(self.get_button_size()[1])
+        self.add_time.clicked.connect(lambda: self._main_widget.add_task_time(self._task))
+        self.add_time.setFixedWidth(button_w)
+        self.add_time.setMinimumHeight(button_h)
 
         self.notes = QPushButtonHoverable('sticky-note')
         self.notes.setFont(fa5)
-        self.notes.mouse_entered.connect(self.show_notes)
-        self.notes.mouse_leaved.connect(self.hide_notes)
-        self.notes.clicked.connect(self.edit_notes)
-        self.notes.setProperty('full', self._notes != '')
-        self.notes.setStyleSheet('''
-            QPushButton { padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4; }
-            QPushButton[full=true] { border: 1px solid #fae661;  }
-        ''')
-        self.notes.setMaximumWidth(self.get_button_size()[0])
-        self.notes.setMinimumWidth(self.get_button_size()[0])
-        self.notes.setMinimumHeight(self.get_button_size()[1])
+        self.notes.mouse_entered.connect(lambda pos: self._main_widget.show_task_notes(self._task, pos))
+        self.notes.mouse_leaved.connect(self._main_widget.hide_task_notes)
+        self.notes.clicked.connect(lambda: self._main_widget.edit_task_notes(self._task))
+        self.notes.setObjectName('notes')
+        self.notes.setFixedWidth(button_w)
+        self.notes.setMinimumHeight(button_h)
 
         self.sub_time = QPushButton('minus')
         self.sub_time.setFont(fa5)
-        self.sub_time.clicked.connect(self.sub_time_f)
-        self.sub_time.setStyleSheet('padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4;')
-        self.sub_time.setMaximumWidth(self.get_button_size()[0])
-        self.sub_time.setMinimumWidth(self.get_button_size()[0])
-        self.sub_time.setMinimumHeight(self.get_button_size()[1])
+        self.sub_time.clicked.connect(lambda: self._main_widget.sub_task_time(self._task))
+        self.sub_time.setFixedWidth(button_w)
+        self.sub_time.setMinimumHeight(button_h)
 
         self.time_buttons.addWidget(self.notes)
         self.time_buttons.addWidget(self.sub_time)
@@ -176,21 +161,17 @@ class TaskElement(QWidget):
 
         self.del_record = QPushButton('trash')
         self.del_record.setFont(fa5)
-        self.del_record.setStyleSheet('padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4;')
-        self.del_record.setMaximumWidth(self.get_button_size()[0])
-        self.del_record.setMinimumWidth(self.get_button_size()[0])
-        self.del_record.setMinimumHeight(self.get_button_size()[1])
-        self.del_record.clicked.connect(self.del_task)
+        self.del_record.setFixedWidth(button_w)
+        self.del_record.setMinimumHeight(button_h)
+        self.del_record.clicked.connect(lambda: self._main_widget.delete_task(self._task))
 
         self.box.addWidget(self.del_record, 0, 2)
 
         self.clear_record_time = QPushButton('broom')
         self.clear_record_time.setFont(fa5)
-        self.clear_record_time.setStyleSheet('padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4;')
-        self.clear_record_time.setMaximumWidth(self.get_button_size()[0])
-        self.clear_record_time.setMinimumWidth(self.get_button_size()[0])
-        self.clear_record_time.setMinimumHeight(self.get_button_size()[1])
-        self.clear_record_time.clicked.connect(self.clear_time)
+        self.clear_record_time.setFixedWidth(button_w)
+        self.clear_record_time.setMinimumHeight(button_h)
+        self.clear_record_time.clicked.connect(lambda: self._main_widget.clear_task_time(self._task))
 
         self.box.addWidget(self.clear_record_time, 1, 2)
 
@@ -198,273 +179,477 @@ class TaskElement(QWidget):
 
         self.setLayout(self.box)
 
-        # aggiorna il label in modo da mostrare il tempo memorizzato
-        self.set_time(options['elapsed_time'])
-
         # imposta flag per i visualizzare correttamente i gruppi colore
         self.setAutoFillBackground(True)
         self.setAttribute(Qt.WA_StyledBackground, True)
-        self.setStyleSheet('TaskElement { border: solid ' + Palette.group_colors[options['color_group']] + '; border-width: 0px 0px 0px 5px; }')
-        self._color_group = options['color_group']
 
     def contextMenuEvent(self, event):
-        contex_menu = QMenu(self)
+        self._main_widget.choose_task_color_group(self._task, self.mapToGlobal(event.pos()))
 
-        ris = {}
+    # Metodi chiamati esternamente
 
-        for name, color in Palette.group_colors.items():
-            ris[contex_menu.addAction(name)] = (name, color)
+    def get_task(self):
+        return self._task
 
-        action = contex_menu.exec_(self.mapToGlobal(event.pos()))
+    def set_task(self, task):
+        # None quando l'editor viene conservato in TaskElementPool, in attesa di essere assegnato ad un altro task
+        self._task = task
 
-        if action is not None:
-            self.setStyleSheet('TaskElement { border: solid ' + ris[action][1] + '; border-width: 0px 0px 0px 5px; }')
-            self._color_group = ris[action][0]
-            Globals.config['stats']['task_color_set'] += 1
+        if task is not None:
+            self.refresh()
 
-    def mousePressEvent(self, event):
-        # ignora i click con il tasto destro per selezionare come attivo un widget
-        if event.button() != Qt.RightButton:
-            super().mousePressEvent(event)
+    def refresh(self):
+        # aggiorna gli elementi grafici con i dati del task, le proprietà di stile vengono applicate da Utils.style_invalidator
+        task = self._task
+
+        self.name.setText(task.name)
+        self.ticket_number.setText('#' + task.ticket)
+        self.ticket_title.setText(task.ticket_title if task.ticket_title is not None else 'Unable to find the specified ticket')
+        self.spent_time.setText(Utils.format_time(task.elapsed_time))
+
+        elements = [self.spent_time, self.add_time, self.sub_time, self.del_record, self.clear_record_time, self.ticket_number, self.name, self.ticket_title, self.notes]
+        for x in elements:
+            self._set_prop(x, 'counting', task.elapsed_time != 0)
+
+        self._set_prop(self.ticket_title, 'invalid', task.ticket_title is None)
+        self._set_prop(self.ticket_number, 'duplicated', self._main_widget.task_model.registry.is_duplicated(task))
+        # marco come piene o vuote le note per mostrare il giusto stato nella UI
+        self._set_prop(self.notes, 'full', task.notes_ref != '')
+        self._set_prop(self, 'colorGroup', task.color_group)
+
+    @staticmethod
+    def _set_prop(widget, prop, value):
+        Utils.style_invalidator.set_property(widget, prop, value)
+
+
+class TaskElementPool(object):
+    # editor delle righe (TaskElement) riutilizzabili: un editor chiuso viene nascosto e conservato, e assegnato al
+    # prossimo task selezionato invece di creare (e distruggere) ogni volta tutti i suoi widget
+
+    max_size = 4
+
+    def __init__(self, main_widget):
+        self._main_widget = main_widget
+        self._free = []
+
+        # contatori della sessione corrente, mostrati nelle statistiche
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
 
-            # se l'utente ha abilitato il reminder per switchare task lo resetto, poichè lui ha appena switchato tutto
-            if Globals.config['options']['switch_reminder']['enabled']:
-                self._main_widget._main_window.task_switch_timer.stop()
-                self._main_widget._main_window.task_switch_timer.start(Globals.config['options']['switch_reminder']['interval'] * 60 * 1000)  # converto da minuti a millisecondi
+    def acquire(self, parent):
+        # gli editor conservati sono figli della vista, possono essere riutilizzati solo con lo stesso parent
+        while len(self._free) > 0:
+            editor = self._free.pop()
 
+            if editor.parent() is parent:
+                self.hits += 1
+                return editor
+
+            editor.deleteLater()
+
+        self.misses += 1
+
+        return TaskElement(self._main_widget, parent)
+
+    def release(self, editor):
+        editor.set_task(None)
+
+        if len(self._free) < self.max_size:
+            self._free.append(editor)
         else:
-            event.accept()
+            self.discarded += 1
+            editor.deleteLater()
+
+    def stats(self):
+        return [
+            ('task_editor_pool_hits', self.hits),
+            ('task_editor_pool_misses', self.misses),
+            ('task_editor_pool_discarded', self.discarded)
+        ]
+
+
+class TaskDelegate(QStyledItemDelegate):
+    # disegna le righe della lista dei task senza creare nessun widget, e gestisce i click sui loro elementi.
+    # Solo la riga selezionata riceve un editor (TaskElement), aperto dalla TaskListView
+
+    margin = 6
+    spacing = 6
+    color_group_border = 5
+
+    # bottoni presenti in ogni riga, con l'icona (ligature Font Awesome) mostrata
+    buttons = {
+        'notes': 'sticky-note',
+        'sub_time': 'minus',
+        'add_time': 'plus',
+        'del_record': 'trash',
+        'clear_record_time': 'broom'
+    }
+
+    def __init__(self, main_widget, view):
+        super().__init__(view)
+        self._main_widget = main_widget
+        self._view = view
+
+        self._fa5 = Styles.font(Styles.ICONS)
+        self._time_font = Styles.font(Styles.TIME)
+        self._title_font = Styles.font(Styles.TICKET_TITLE)
+
+        self.editor_pool = TaskElementPool(main_widget)
+
+        # timer per distinguere il click singolo dal doppio click sul numero ticket (come QPushButtonDoubleClickable)
+        self._ticket_click_timer = QTimer()
+        self._ticket_click_timer.setSingleShot(True)
+        self._ticket_click_timer.timeout.connect(self._ticket_single_clicked)
+        self._ticket_clicked_task = None
+
+    def layout(self, rect, task, font):
+        # calcola la posizione degli elementi di una riga, usata sia per disegnarla che per capire cosa è stato cliccato
+        fm = Styles.metrics(font)
+        time_fm = Styles.metrics(self._time_font)
+        title_fm = Styles.metrics(self._title_font)
+
+        button_w, button_h = Styles.button_size(font)
+
+        left = rect.left() + self.color_group_border + self.margin
+        top = rect.top() + self.margin
+        right = rect.left() + rect.width() - self.margin
+
+        time_text = Utils.format_time(task.elapsed_time)
+        time_size = time_fm.boundingRect(time_text).size()
+
+        time_buttons_w = 3 * button_w + 2 * self.spacing
+        col2_x = right - button_w
+        col1_w = max(time_size.width(), time_buttons_w)
+        col1_x = col2_x - self.spacing - col1_w
+        col0_w = max(col1_x - self.spacing - left, 1)
+
+        ticket_text = '#' + task.ticket
+        ticket_size = fm.boundingRect(ticket_text).size() + QSize(6, 6)
+        title_text = task.ticket_title if task.ticket_title is not None else 'Unable to find the specified ticket'
+        title_w = max(col0_w - ticket_size.width() - self.spacing, 1)
+
+        name_size = fm.boundingRect(QRect(0, 0, col0_w, 100000), Qt.TextWordWrap, task.name).size()
+        title_size = title_fm.boundingRect(QRect(0, 0, title_w, 100000), Qt.TextWordWrap, title_text).size() if title_text != '' else QSize(0, 0)
+
+        row0_h = max(name_size.height(), time_size.height(), button_h)
+        row1_h = max(ticket_size.height(), title_size.height(), button_h)
+        row1_y = top + row0_h + self.spacing
+
+        def v_center(y, row_h, w, h, x):
+            return QRect(x, y + (row_h - h) // 2, w, h)
+
+        rects = {
+            'name': v_center(top, row0_h, name_size.width(), name_size.height(), left),
+            'ticket': v_center(row1_y, row1_h, ticket_size.width(), ticket_size.height(), left),
+            'title': v_center(row1_y, row1_h, title_w, title_size.height(), left + ticket_size.width() + self.spacing),
+            'time': v_center(top, row0_h, time_size.width(), time_size.height(), col1_x),
+            'del_record': v_center(top, row0_h, button_w, button_h, col2_x),
+            'clear_record_time': v_center(row1_y, row1_h, button_w, button_h, col2_x),
+        }
 
-    # Azioni eseguite dall'interfaccia grafica
+        for i, b in enumerate(('notes', 'sub_time', 'add_time')):
+            rects[b] = v_center(row1_y, row1_h, button_w, button_h, col1_x + i * (button_w + self.spacing))
 
-    @Slot()
-    def add_time_f(self):
-        self.update_time(+5 * 60)
-        Globals.config['stats']['task_time_increased'] += 1
+        height = row1_y + row1_h + self.margin - rect.top()
 
-    @Slot()
-    def sub_time_f(self):
-        self.update_time(-5 * 60)
-        Globals.config['stats']['task_time_decreased'] += 1
+        return rects, height
 
-    @Slot()
-    def open_ticket_new_time_webpage(self):
-        n = self.ticket_number.text().strip('#')
-        if n == '':
-            return
+    def hit_test(self, rect, task, font, pos):
+        rects, _ = self.layout(rect, task, font)
 
-        if not Globals.config['options']['redmine']['enabled']:
-            InformationDialog('Open redmine ticket page in browser',
-                              'If you want to open the redmine ticket page in the browser when double clicking on the task timer enable redmine integration '
-                              'under<br><span style="font-style: italic">Options > Configuration > Enable redmine integration</span>',
-                              min_width=550,
-                              html=True).exec()
-            return
+        for element, r in rects.items():
+            if r.contains(pos):
+                return element, r
 
-        # se è abilitata la funzionalità di copia del tempo passato nel task
-        if Globals.config['options']['redmine']['copy_time_to_clipboard']['enabled']:
-            formatted_time = Redmine.seconds_to_time_entry_format(seconds=self.get_time(),
-                                                                  rounding=Globals.config['options']['redmine']['copy_time_to_clipboard']['rounding'] * 60)
-            QApplication.clipboard().setText(formatted_time)
+        return None, None
 
-        url = '{}/issues/{}/time_entries/new'.format(Globals.config['options']['redmine']['host'], n)
+    # interfaccia QStyledItemDelegate
 
-        try:
-            webbrowser.open(url)
-        except webbrowser.Error as e:
-            logging.error('An error occurred trying to open the redmine web browser page for the url "{}": {}'.format(url, e))
+    def sizeHint(self, option, index):
+        task = index.data(TaskListModel.TaskRole)
+        width = self._view.viewport().width()
 
-    @Slot()
-    def open_ticket_main_webpage(self):
-        n = self.ticket_number.text().strip('#')
-        if n == '':
-            return
+        _, height = self.layout(QRect(0, 0, width, 0), task, option.font)
 
-        if not Globals.config['options']['redmine']['enabled']:
-            InformationDialog('Open redmine ticket page in browser',
-                              'If you want to open the redmine ticket page in the browser when double clicking on the ticket number enable redmine integration under<br><span style="font-style: italic">Options > Configuration > Enable redmine integration</span>',
-                              min_width=550,
-                              html=True).exec()
-            return
+        return QSize(width, height)
 
-        url = '{}/issues/{}'.format(Globals.config['options']['redmine']['host'], n)
+    def paint(self, painter, option, index):
+        task = index.data(TaskListModel.TaskRole)
+        rect = option.rect
+        rects, _ = self.layout(rect, task, option.font)
 
-        try:
-            webbrowser.open(url)
-        except webbrowser.Error as e:
-            logging.error('An error occurred trying to open the redmine web browser page for the url "{}": {}'.format(url, e))
+        counting = task.elapsed_time != 0
+        text_color = QColor('#4ecca3' if counting else '#6e6e6e')
+        hover_element = self._view.get_hover_element(index.row())
 
+        painter.save()
 
-    @Slot()
-    def edit_ticket_number(self):
-        dialog = AskForTextDialog(window_title='Set redmine ticket number',
-                                  initial_text=self.ticket_number.text().strip('#'), length=250,
-                                  validator=Utils.integer_number_validator)
+        painter.fillRect(rect, QColor(Styles.ROW_SELECTED_BACKGROUND if option.state & QStyle.State_Selected else Styles.ROW_BACKGROUND))
 
-        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
-            return
+        if task.color_group != 'No color':
+            painter.fillRect(QRect(rect.left(), rect.top(), self.color_group_border, rect.height()), QColor(Palette.group_colors[task.color_group]))
 
-        n = dialog.line.text().strip('# \t\n')
+        painter.setPen(text_color)
+        painter.setFont(option.font)
+        painter.drawText(rects['name'], Qt.TextWordWrap, task.name)
+        painter.drawText(rects['ticket'], Qt.AlignCenter, '#' + task.ticket)
 
-        self.ticket_number.setText('#' + n)
+        if self._main_widget.task_model.registry.is_duplicated(task):
+            painter.setPen(QColor('#fae661'))
+            painter.drawRect(rects['ticket'].adjusted(0, 0, -1, -1))
 
-        if n == '':
-            self.ticket_title.setText('')
+        if task.ticket_title is None:
+            painter.setPen(QColor('#fa7161'))
         else:
-            # aggiorno lo stato dei marker che indicano i task con numero ticket duplicato
-            self._main_widget.update_duplicated_tickets_marker()
+            painter.setPen(QColor('#61ccfa') if counting else text_color)
+        painter.setFont(self._title_font)
+        painter.drawText(rects['title'], Qt.TextWordWrap | Qt.AlignVCenter,
+                         task.ticket_title if task.ticket_title is not None else 'Unable to find the specified ticket')
+
+        painter.setPen(text_color)
+        painter.setFont(self._time_font)
+        painter.drawText(rects['time'], Qt.AlignCenter, Utils.format_time(task.elapsed_time))
+
+        painter.setFont(self._fa5)
+        for button, icon in self.buttons.items():
+            r = rects[button]
+            painter.fillRect(r, QColor('#585c65' if hover_element == button else '#444f5d'))
+            painter.setPen(QColor('#fae661') if button == 'notes' and task.notes_ref != '' else QColor('#232931'))
+            painter.drawRect(r.adjusted(0, 0, -1, -1))
+            painter.setPen(text_color)
+            painter.drawText(r, Qt.AlignCenter, icon)
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick):
+            return False
+
+        if event.button() != Qt.LeftButton:
+            return False
+
+        task = index.data(TaskListModel.TaskRole)
+        element, rect = self.hit_test(option.rect, task, option.font, event.pos())
+
+        if element is None:
+            return False
+
+        if element in ('name', 'time'):
+            # come QLabelClickable l'azione parte alla pressione del tasto
+            if event.type() == QEvent.MouseButtonPress:
+                if element == 'name':
+                    self._main_widget.edit_task_name(task)
+                else:
+                    self._main_widget.open_ticket_new_time_webpage(task)
+            return True
+
+        if element == 'title':
+            return False
+
+        # gli altri elementi sono bottoni, l'azione parte al rilascio del tasto
+        if event.type() == QEvent.MouseButtonRelease:
+            if element == 'ticket':
+                self._ticket_clicked(task)
+            elif element == 'notes':
+                self._main_widget.hide_task_notes()
+                self._main_widget.edit_task_notes(task)
+            elif element == 'sub_time':
+                self._main_widget.sub_task_time(task)
+            elif element == 'add_time':
+                self._main_widget.add_task_time(task)
+            elif element == 'del_record':
+                self._main_widget.delete_task(task)
+            elif element == 'clear_record_time':
+                self._main_widget.clear_task_time(task)
+
+        return True
+
+    def createEditor(self, parent, option, index):
+        return self.editor_pool.acquire(parent)
+
+    def destroyEditor(self, editor, index):
+        # l'editor è già stato nascosto dalla vista, viene conservato per la prossima riga selezionata
+        self.editor_pool.release(editor)
+
+    def setEditorData(self, editor, index):
+        editor.set_task(index.data(TaskListModel.TaskRole))
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+    def _ticket_clicked(self, task):
+        if self._ticket_click_timer.isActive() and self._ticket_clicked_task is task:
+            self._ticket_click_timer.stop()
+            self._main_widget.open_ticket_main_webpage(task)
+        else:
+            self._ticket_clicked_task = task
+            self._ticket_click_timer.start(250)
 
-            if Globals.config['options']['redmine']['enabled']:
-                self._main_widget.update_ticket_title(self.ticket_title, n)
+    @Slot()
+    def _ticket_single_clicked(self):
+        self._main_widget.edit_task_ticket(self._ticket_clicked_task)
 
-        Globals.config['stats']['task_ticket_n_edited'] += 1
 
-    @Slot()
-    def edit_name(self):
-        dialog = AskForTextDialog(window_title='Set task name',
-                                  initial_text=self.name.text(), length=600,
-                                  validator=Utils.not_empty_validator)
-        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
-            return
+class TaskListView(QListView):
+    _pixmap = None
 
-        t = dialog.line.text().strip()
+    def __init__(self, main_widget):
+        super().__init__()
+        self._main_widget = main_widget
 
-        self.name.setText(t)
-        self._list_item.setSizeHint(self.minimumSizeHint())
-        Globals.config['stats']['task_name_edited'] += 1
+        # indice della riga che ha l'editor aperto
+        self._editor_index = QPersistentModelIndex()
+        # elemento della riga sotto il puntatore del mouse, usato per evidenziare i bottoni e mostrare le note
+        self._hover = (None, None)
 
-    @Slot()
-    def del_task(self):
-        if self._notes == '':
-            text = 'The task will be deleted, are you sure?'
-        else:
-            text = 'The task will be deleted, are you sure?\n--- THE TASK CONTAINS NOTES ---'
+        self.setMouseTracking(True)
 
-        dialog = ConfirmDialog(window_title='Confirm task deletion', text=text)
+    def startDrag(self, supported_actions):
+        Globals.config['stats']['task_reordered'] += 1
 
-        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+        drag = QDrag(self)
+        drag.setMimeData(self.model().mimeData(self.selectedIndexes()))
+        self._pixmap = QPixmap(self.viewport().visibleRegion().boundingRect().size())
+        self._pixmap.fill(Qt.transparent)
+        painter = QPainter(self._pixmap)
+
+        for i in self.selectedIndexes():
+            painter.drawPixmap(self.visualRect(i), self.viewport().grab(self.visualRect(i)))
+
+        painter.end()
+
+        drag.setPixmap(self._pixmap)
+        drag.setHotSpot(self.viewport().mapFromGlobal(QCursor.pos()))
+        drag.exec_(supported_actions, Qt.MoveAction)
+
+    def dropEvent(self, event):
+        # il riordino viene fatto spostando la riga nel modello, senza rimuovere e reinserire il task
+        selected = self.selectedIndexes()
+
+        if event.source() is not self or len(selected) == 0:
+            event.ignore()
             return
 
-        self._list.takeItem(self._list.row(self._list_item))
+        index = self.indexAt(event.pos())
 
-        self._main_widget.update_total_time()
-        # aggiorno lo stato dei marker che indicano i task con numero ticket duplicato
-        self._main_widget.update_duplicated_tickets_marker()
+        if index.isValid():
+            destination = index.row()
+            if event.pos().y() > self.visualRect(index).center().y():
+                destination += 1
+        else:
+            destination = self.model().rowCount()
 
-        Globals.config['stats']['task_deleted'] += 1
+        self.model().move(selected[0].row(), destination)
 
-    @Slot()
-    def clear_time(self):
-        dialog = ConfirmDialog(window_title='Confirm time deletion',
-                               # text='The time has not been reported yet, are you sure?')
-                               text='The time will be cleared, are you sure?')
-        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+        event.setDropAction(Qt.MoveAction)
+        event.accept()
+        self.setState(QAbstractItemView.NoState)
+        self.viewport().update()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Delete:
+            task = self._main_widget.get_selected_task()
+            if task is not None:
+                self._main_widget.delete_task(task)
+        else:
+            super().keyPressEvent(event)
+
+    def mousePressEvent(self, event):
+        # ignora i click con il tasto destro per selezionare come attivo un task
+        if event.button() == Qt.RightButton:
+            event.accept()
             return
 
-        self.set_time(0)
+        super().mousePressEvent(event)
 
-        Globals.config['stats']['task_time_cleared'] += 1
+        # se l'utente ha abilitato il reminder per switchare task lo resetto, poichè lui ha appena switchato tutto
+        self._main_widget.reset_task_switch_reminder()
 
-    @Slot()
-    def show_notes(self, pos):
-        if self._notes_dialog is None and self._notes != '':
-            self._notes_dialog = ShowNotesDialog(pos, self._notes)
-            self._notes_dialog.show()
+    def mouseMoveEvent(self, event):
+        if event.buttons() == Qt.NoButton:
+            self._update_hover(event.pos())
 
-            Globals.config['stats']['task_notes_viewed'] += 1
+        super().mouseMoveEvent(event)
 
-    @Slot()
-    def hide_notes(self):
-        if self._notes_dialog is not None:
-            self._notes_dialog.accept()
-            self._notes_dialog = None
+    def leaveEvent(self, event):
+        self._update_hover(None)
 
-    @Slot()
-    def edit_notes(self):
-        dialog = EditNotesDialog(self._notes)
+        super().leaveEvent(event)
 
-        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
-            return
+    def contextMenuEvent(self, event):
+        index = self.indexAt(event.pos())
 
-        self._notes = dialog.text.toPlainText().strip()
-        # marco come piene o vuote le note per mostrare il giusto stato nella UI
-        Utils.set_prop_and_refresh(self.notes, 'full', self._notes != '')
+        if index.isValid():
+            self._main_widget.choose_task_color_group(index.data(TaskListModel.TaskRole), event.globalPos())
 
-        Globals.config['stats']['task_notes_edited'] += 1
+    def selectionChanged(self, selected, deselected):
+        super().selectionChanged(selected, deselected)
 
-    # Metodi chiamati esternamente
+        self._update_editor()
+        self._main_widget.update_active_task()
 
-    def update_time(self, seconds):
-        self.set_time(self.get_time()+seconds)
+    def dataChanged(self, top_left, bottom_right, roles=()):
+        super().dataChanged(top_left, bottom_right, roles)
 
-    def get_time(self):
-        return self._seconds
+        # gli editor persistenti non vengono aggiornati da Qt, lo faccio io
+        editor = self.get_editor()
+        if editor is not None and top_left.row() <= self._editor_index.row() <= bottom_right.row():
+            editor.refresh()
 
-    def set_time(self, seconds):
-        old_seconds = self._seconds
-        self._seconds = seconds
+    def get_editor(self):
+        if not self._editor_index.isValid():
+            return None
 
-        if self._seconds < 0:
-            self._seconds = 0
+        return self.indexWidget(QModelIndex(self._editor_index))
 
-        self.spent_time.setText(Utils.format_time(self._seconds))
+    def get_hover_element(self, row):
+        if self._hover[0] != row:
+            return None
 
-        elements = [self.spent_time, self.add_time, self.sub_time, self.del_record, self.clear_record_time, self.ticket_number, self.name, self.ticket_title, self.notes]
-        # valuta se è possibile che sia avvenuta un condizione che provocherebbe il cambio di colore degli elementi
-        # se non può essere avvenuta skippa il codice di set dello style
-        if (old_seconds == 0 and self._seconds != 0) or (old_seconds != 0 and self._seconds == 0) or (old_seconds == self._seconds == 0):
-            for x in elements:
-                Utils.set_prop_and_refresh(x, 'counting', self._seconds != 0)
-
-        self._main_widget.update_total_time()
-
-    def to_dict(self):
-        return {
-            'name': self.name.text(),
-            'ticket': self.ticket_number.text().strip('#'),
-            'elapsed_time': self._seconds,
-            'color_group': self._color_group,
-            'ticket_title': None if self.ticket_title.property('invalid') else self.ticket_title.text(),
-            'notes': self._notes
-        }
+        return self._hover[1]
 
-    # funzione per la formattazione degli elementi grafici
-    def get_button_size(self):
-        metric = self.name.fontMetrics().boundingRect('+5')
-        width = metric.width() + 14
-        height = metric.height() + 4
+    def _update_editor(self):
+        # solo la riga selezionata ha un widget (TaskElement), le altre vengono disegnate dal delegate
+        selected = self.selectedIndexes()
+        index = selected[0] if len(selected) > 0 else QModelIndex()
 
-        return width, height
+        if self._editor_index.isValid():
+            if index.isValid() and index.row() == self._editor_index.row():
+                return
 
+            self.closePersistentEditor(QModelIndex(self._editor_index))
 
-class ListWidget(QListWidget):
-    _pixmap = None
+        self._editor_index = QPersistentModelIndex(index)
 
-    def __init__(self):
-        super().__init__()
+        if index.isValid():
+            self.openPersistentEditor(index)
 
-    def startDrag(self, supported_actions):
-        Globals.config['stats']['task_reordered'] += 1
+    def _update_hover(self, pos):
+        row, element, rect = None, None, None
 
-        drag = QDrag(self)
-        drag.setMimeData(self.model().mimeData(self.selectedIndexes()))
-        self._pixmap = QPixmap(self.viewport().visibleRegion().boundingRect().size())
-        self._pixmap.fill(Qt.transparent)
-        painter = QPainter(self._pixmap)
+        if pos is not None:
+            index = self.indexAt(pos)
+            if index.isValid() and index.row() != self._editor_index.row():
+                row = index.row()
+                option = self.viewOptions()
+                option.rect = self.visualRect(index)
+                element, rect = self.itemDelegate().hit_test(option.rect, index.data(TaskListModel.TaskRole), option.font, pos)
 
-        for i in self.selectedIndexes():
-            painter.drawPixmap(self.visualRect(i), self.viewport().grab(self.visualRect(i)))
+        if (row, element) == self._hover:
+            return
 
-        drag.setPixmap(self._pixmap)
-        drag.setHotSpot(self.viewport().mapFromGlobal(QCursor.pos()))
-        drag.exec_(supported_actions, Qt.MoveAction)
+        old_row = self._hover[0]
+        self._hover = (row, element)
 
-    def keyPressEvent(self, event):
-        if event.key() == Qt.Key_Delete:
-            for s in self.selectedItems():
-                self.itemWidget(s).del_task()
+        for r in (old_row, row):
+            if r is not None:
+                self.viewport().update(self.visualRect(self.model().index(r, 0)))
+
+        if element == 'notes':
+            self._main_widget.show_task_notes(self.model().task(row), self.viewport().mapToGlobal(rect.topLeft() + QPoint(rect.height(), rect.width())))
         else:
-            super().keyPressEvent(event)
+            self._main_widget.hide_task_notes()
 
 
 class UpdateTicketTitleWorker(QThread):
@@ -488,13 +673,51 @@ class CheckRedmineCredsWorker(QThread):
 class MainWidget(QWidget):
 
     _main_window = None
+    # storico dei segmenti di tempo dei task, creato dalla finestra principale insieme ai file di salvataggio
+    time_history = None
+    # archivio dei task rimossi dalla lista, letto solo quando vengono cercati o ripristinati
+    task_archive = None
+    # testo delle note dei task, i task contengono solo il riferimento e l'anteprima
+    notes_store = None
+
+    # modifiche raggruppate in corso (vedi batch): task di cui ricalcolare l'altezza e se aggiornare il tempo totale
+    _batch_depth = 0
+    _batch_relayout = False
+    _batch_total_time = False
 
     def __init__(self):
         QWidget.__init__(self)
 
+        # flag che indica se il timer sta scorrendo o è in pausa
+        self.running = True
+
+        # totali del tempo tracciato, aggiornati in modo incrementale dai task
+        self.time_aggregates = TimeAggregates()
+
+        # dialog che mostra le note del task sotto il puntatore del mouse
+        self._notes_dialog = None
+
+        # il tempo viene contabilizzato a partire da timestamp monotonic, non contando i tick di un timer
+        self.time_accounting = TimeAccounting(credit=self.count_task_time)
+
+        # timer che accredita il tempo trascorso, attivo solo mentre un task sta contando.
+        # è di tipo coarse in modo che il sistema possa accorparne i risvegli con quelli degli altri timer
+        self.render_timer = QTimer()
+        self.render_timer.setTimerType(Qt.CoarseTimer)
+        self.render_timer.timeout.connect(self.render)
+
         # Create the list
-        self.task_list = ListWidget()
+        self.task_model = TaskListModel()
+        self.task_list = TaskListView(self)
+        self.task_list.setModel(self.task_model)
+        self.task_delegate = TaskDelegate(self, self.task_list)
+        self.task_list.setItemDelegate(self.task_delegate)
         self.task_list.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.task_list.setResizeMode(QListView.Adjust)
+        # l'altezza delle righe viene calcolata a blocchi durante l'event loop: le prime righe vengono mostrate subito,
+        # le altre vengono disposte dopo, senza ritardare la prima visualizzazione della finestra
+        self.task_list.setLayoutMode(QListView.Batched)
+        self.task_list.setBatchSize(50)
         self.task_list.setMovement(QListView.Snap)
         self.task_list.setDefaultDropAction(Qt.MoveAction)
         self.task_list.setDragEnabled(True)
@@ -502,8 +725,14 @@ class MainWidget(QWidget):
         self.task_list.setDropIndicatorShown(True)
         self.task_list.setDragDropMode(QAbstractItemView.InternalMove)
 
-        # flag che indica se il timer sta scorrendo o è in pausa
-        self.running = True
+        # gli aggiornamenti dell'interfaccia vengono fatti solo per ciò che è visibile, quelli rimandati vengono
+        # recuperati quando la finestra o le righe tornano visibili. La finestra viene registrata da MainWindow
+        self.render_scheduler = RenderScheduler(self.task_list)
+        self.render_scheduler.exposedChanged.connect(self.exposed_changed)
+        self.render_scheduler.visibleRowsChanged.connect(self.catch_up)
+        # task la cui riga non è stata ridisegnata perchè non visibile: id -> task
+        self._stale_tasks = {}
+        self._stale_total_time = False
 
         # QWidget Layout
         self.layout = QGridLayout()
@@ -517,12 +746,6 @@ class MainWidget(QWidget):
         self.setLayout(self.layout)
         self.setContentsMargins(0, 0, 0, 0)
 
-        # prepara il timer per contare il tempo
-        self.tasks_timer = QTimer()
-        self.tasks_timer.setTimerType(Qt.PreciseTimer)
-        self.tasks_timer.timeout.connect(self.count_time)
-        self.tasks_timer.start(1000)
-
     @Slot()
     def create_task(self):
         dialog = NewTaskDialog()
@@ -532,93 +755,408 @@ class MainWidget(QWidget):
         name = dialog.name.toPlainText()
         ticket_number = dialog.ticket_number.text()
 
-        row = self.insert_task_in_list(name, '#' + ticket_number)
+        task = self.insert_task_in_list(Task(name, ticket_number))
         Globals.config['stats']['task_created'] += 1
 
         if ticket_number != '':
-            # aggiorno lo stato dei marker che indicano i task con numero ticket duplicato
-            self.update_duplicated_tickets_marker()
-
             # se abilitato redmine lancio un thread per ottenere il titolo del ticket
             if Globals.config['options']['redmine']['enabled'] :
-                self.update_ticket_title(row.ticket_title, ticket_number)
+                self.update_ticket_title(task, ticket_number)
         else:
             Globals.config['stats']['task_created_without_ticket_number'] += 1
 
-    def update_ticket_title(self, title_widget, ticket_number):
-        title_widget.setText('...')
+    def update_ticket_title(self, task, ticket_number):
+        task.ticket_title = '...'
+        self.refresh_task(task, relayout=True)
+
+        task_id = task.id
 
         def func(result):
+            # il task potrebbe essere stato eliminato mentre la richiesta era in corso
+            task = self.task_model.registry.get(task_id)
+            if task is None:
+                return
+
             if result is not None:
                 text = result.get(ticket_number)
                 if text is not None:
-                    title_widget.setText(text)
-                    Utils.set_prop_and_refresh(title_widget, 'invalid', False)
+                    task.ticket_title = text
                 else:
-                    title_widget.setText('Unable to find the specified ticket')
-                    Utils.set_prop_and_refresh(title_widget, 'invalid', True)
+                    task.ticket_title = None
                     logging.debug('Redmine api call returned dict not containing ticket title')
             else:
-                Utils.set_prop_and_refresh(title_widget, 'invalid', True)
+                task.ticket_title = None
                 logging.warning('Redmine api call returned empty dict searching for ticket title')
 
+            self.refresh_task(task, relayout=True)
+
         Utils.launch_thread(UpdateTicketTitleWorker, [ticket_number], [('finished', func)])
 
+    def set_tasks(self, tasks, next_id=0):
+        self.task_model.set_tasks(tasks, next_id)
 
-    def insert_task_in_list(self, name, ticket_number='', elapsed_time=0, color_group='No color', ticket_title='', notes=''):
-        # Add to list a new item (item is simply an entry in your list)
-        item = QListWidgetItem()
+        self.time_aggregates.clear()
+        for task in self.task_model.tasks():
+            self.time_aggregates.add(task.elapsed_time, task.color_group, task.ticket)
 
-        # Instanciate a custom widget
-        row = TaskElement({
-            'name': name,
-            'ticket_number': ticket_number,
-            'elapsed_time': elapsed_time,
-            'color_group': color_group,
-            'ticket_title': ticket_title,
-            'notes': notes
-        }, self, self.task_list, item)
-        item.setSizeHint(row.minimumSizeHint())
+        self.update_total_time()
 
-        # Associate the custom widget to the list entry
-        self.task_list.addItem(item)
-        self.task_list.setItemWidget(item, row)
+    def insert_task_in_list(self, task):
+        self.task_model.append(task)
+        self.time_aggregates.add(task.elapsed_time, task.color_group, task.ticket)
 
-        return row
+        return task
 
-    def count_time(self):
-        if self.running:
-            for s in self.task_list.selectedItems():
-                self.task_list.itemWidget(s).update_time(+1)
+    def get_selected_task(self):
+        for index in self.task_list.selectedIndexes():
+            return index.data(TaskListModel.TaskRole)
 
+        return None
 
-    def update_total_time(self):
-        total = 0
-        for t in widgets_of_type(list_=self.task_list, type_='task'):
-            total += t.get_time()
+    @contextmanager
+    def batch(self):
+        # raggruppa più modifiche ai task: il ridisegno delle righe (e dei marcatori dei ticket duplicati), il ricalcolo
+        # dell'altezza delle righe e del tempo totale vengono eseguiti una sola volta al termine, con gli aggiornamenti
+        # della lista sospesi. I batch possono essere annidati
+        self._batch_depth += 1
+        self.task_model.begin_batch()
 
-        self.total_time.setText('Total time: {}'.format(Utils.format_time(total)))
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+
+            if self._batch_depth == 0:
+                self.task_list.setUpdatesEnabled(False)
+                try:
+                    self.task_model.end_batch()
+
+                    if self._batch_relayout:
+                        self.task_list.scheduleDelayedItemsLayout()
+                    if self._batch_total_time:
+                        self.update_total_time()
+                finally:
+                    self._batch_relayout = self._batch_total_time = False
+                    self.task_list.setUpdatesEnabled(True)
+            else:
+                self.task_model.end_batch()
 
-    def update_duplicated_tickets_marker(self):
-        tickets = {}
+    def refresh_task(self, task, relayout=False):
+        # ridisegna la riga del task, ricalcolandone l'altezza se è cambiato del testo che può andare a capo
+        row = self.task_model.row_of(task)
 
-        for widget in widgets_of_type(list_=self.task_list, type_='task'):
-            ticket_number = widget.ticket_number.text().strip('#')
+        if not relayout and self._batch_depth == 0 and row is not None and not self.render_scheduler.is_row_visible(row):
+            # la riga non è visibile e viene ridisegnata quando torna visibile, il file dei task viene aggiornato subito
+            self._stale_tasks[task.id] = task
+            self._main_window.mark_tasks_dirty([task])
+            return
 
-            if ticket_number != '':
-                if ticket_number not in tickets:
-                    tickets[ticket_number] = []
+        self.task_model.task_updated(task)
 
-                tickets[ticket_number].append(widget)
+        if relayout and self._batch_depth > 0:
+            self._batch_relayout = True
+        elif relayout:
+            index = self.task_model.index_of(task)
+            if index.isValid():
+                self.task_delegate.sizeHintChanged.emit(index)
 
-        for widgets in tickets.values():
-            if len(widgets) > 1:
-                # setto il colore di warning
-                for w in widgets:
-                    Utils.set_prop_and_refresh(w.ticket_number, 'duplicated', True)
-            else:
-                # rimuovo il colore di warning
-                Utils.set_prop_and_refresh(widgets[0].ticket_number, 'duplicated', False)
+    def refresh_all_tasks(self, relayout=False):
+        self.task_model.all_updated()
+
+        if relayout and self._batch_depth > 0:
+            self._batch_relayout = True
+        elif relayout:
+            self.task_list.scheduleDelayedItemsLayout()
+
+    # Azioni sui task, chiamate sia dal delegate che dall'editor della riga selezionata
+
+    def set_task_time(self, task, seconds, kind=TimeHistory.SET):
+        old_seconds = task.elapsed_time
+        task.elapsed_time = max(seconds, 0)
+
+        # applico solo la differenza ai totali aggregati, senza riscorrere tutti i task
+        self.time_aggregates.update_time(task.elapsed_time - old_seconds, task.color_group, task.ticket)
+        self.refresh_task(task)
+        self.update_total_time()
+
+        if self.time_history is not None:
+            self.time_history.record(task, task.elapsed_time - old_seconds, kind)
+
+    def update_task_time(self, task, seconds, kind=TimeHistory.SET):
+        self.set_task_time(task, task.elapsed_time + seconds, kind)
+
+    def count_task_time(self, task, seconds):
+        # tempo contato dal task attivo, accreditato da TimeAccounting
+        self.update_task_time(task, seconds, TimeHistory.COUNT)
+
+    def add_task_time(self, task):
+        self.update_task_time(task, +5 * 60, TimeHistory.ADD)
+        Globals.config['stats']['task_time_increased'] += 1
+
+    def sub_task_time(self, task):
+        self.update_task_time(task, -5 * 60, TimeHistory.SUB)
+        Globals.config['stats']['task_time_decreased'] += 1
+
+    def clear_task_time(self, task):
+        dialog = ConfirmDialog(window_title='Confirm time deletion',
+                               # text='The time has not been reported yet, are you sure?')
+                               text='The time will be cleared, are you sure?')
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        self.time_accounting.reset(task)
+        self.set_task_time(task, 0, TimeHistory.CLEAR)
+
+        Globals.config['stats']['task_time_cleared'] += 1
+
+    def delete_task(self, task):
+        if task.notes_ref == '':
+            text = 'The task will be deleted, are you sure?'
+        else:
+            text = 'The task will be deleted, are you sure?\n--- THE TASK CONTAINS NOTES ---'
+
+        dialog = ConfirmDialog(window_title='Confirm task deletion', text=text)
+
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        # il task non deve più ricevere tempo, va fatto prima di rimuoverlo poichè la rimozione cambia la selezione
+        self.time_accounting.forget(task)
+        self.task_model.remove(task)
+
+        self.time_aggregates.remove(task.elapsed_time, task.color_group, task.ticket)
+        self.update_total_time()
+
+        Globals.config['stats']['task_deleted'] += 1
+
+    def archive_tasks(self, tasks):
+        # i task vengono scritti nell'archivio prima di essere rimossi dalla lista (e quindi dal file dei task)
+        tasks = list(tasks)
+        self.task_archive.archive((t.id, t.to_dict()) for t in tasks)
+
+        with self.batch():
+            for task in tasks:
+                self.time_accounting.forget(task)
+                self.time_aggregates.remove(task.elapsed_time, task.color_group, task.ticket)
+
+            self.task_model.remove_tasks(tasks)
+            self.update_total_time()
+
+        Globals.config['stats']['task_archived'] += len(tasks)
+
+    def restore_tasks(self, tasks):
+        # tasks: coppie (id, dizionario del task) lette dall'archivio
+        task_ids = []
+
+        with self.batch():
+            for task_id, d in tasks:
+                if 'notes' in d:
+                    # task archiviato prima che le note venissero spostate nel notes store
+                    d = dict(d, notes_ref=self.notes_store.put(d['notes']), notes_preview=NotesStore.preview(d['notes']))
+                    del d['notes']
+
+                # l'id potrebbe essere stato assegnato ad un nuovo task dopo l'archiviazione
+                task = Task.from_dict(d, task_id if self.task_model.registry.get(task_id) is None else None)
+                self.insert_task_in_list(task)
+                task_ids.append(task_id)
+
+            self.update_total_time()
+
+        self.task_archive.restore(task_ids)
+
+        Globals.config['stats']['task_restored'] += len(task_ids)
+
+    def edit_task_name(self, task):
+        dialog = AskForTextDialog(window_title='Set task name',
+                                  initial_text=task.name, length=600,
+                                  validator=Utils.not_empty_validator)
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        task.name = dialog.line.text().strip()
+        self.refresh_task(task, relayout=True)
+
+        Globals.config['stats']['task_name_edited'] += 1
+
+    def edit_task_ticket(self, task):
+        dialog = AskForTextDialog(window_title='Set redmine ticket number',
+                                  initial_text=task.ticket, length=250,
+                                  validator=Utils.integer_number_validator)
+
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        n = dialog.line.text().strip('# \t\n')
+
+        self.time_aggregates.move_ticket(task.elapsed_time, task.ticket, n)
+        self.task_model.set_ticket(task, n)
+
+        if n == '':
+            task.ticket_title = ''
+
+        if n != '' and Globals.config['options']['redmine']['enabled']:
+            self.update_ticket_title(task, n)
+        else:
+            self.refresh_task(task, relayout=True)
+
+        Globals.config['stats']['task_ticket_n_edited'] += 1
+
+    def choose_task_color_group(self, task, pos):
+        contex_menu = QMenu(self)
+
+        ris = {}
+
+        for name in Palette.group_colors:
+            ris[contex_menu.addAction(name)] = name
+
+        contex_menu.addSeparator()
+        archive_action = contex_menu.addAction('Archive task')
+
+        action = contex_menu.exec_(pos)
+
+        if action is archive_action:
+            self.archive_tasks([task])
+        elif action is not None:
+            self.time_aggregates.move_color_group(task.elapsed_time, task.color_group, ris[action])
+            self.task_model.set_color_group(task, ris[action])
+            Globals.config['stats']['task_color_set'] += 1
+
+    def show_task_notes(self, task, pos):
+        if self._notes_dialog is None and task.notes_ref != '':
+            self._notes_dialog = ShowNotesDialog(pos, self.notes_store.get(task.notes_ref))
+            self._notes_dialog.show()
+
+            Globals.config['stats']['task_notes_viewed'] += 1
+
+    @Slot()
+    def hide_task_notes(self):
+        if self._notes_dialog is not None:
+            self._notes_dialog.accept()
+            self._notes_dialog = None
+
+    def edit_task_notes(self, task):
+        dialog = EditNotesDialog(self.notes_store.get(task.notes_ref))
+
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        notes = dialog.text.toPlainText().strip()
+        # il testo viene scritto nel notes store prima che il riferimento venga salvato nel file dei task
+        task.notes_ref = self.notes_store.put(notes)
+        task.notes_preview = NotesStore.preview(notes)
+        self.refresh_task(task)
+
+        Globals.config['stats']['task_notes_edited'] += 1
+
+    def open_ticket_new_time_webpage(self, task):
+        n = task.ticket
+        if n == '':
+            return
+
+        if not Globals.config['options']['redmine']['enabled']:
+            InformationDialog('Open redmine ticket page in browser',
+                              'If you want to open the redmine ticket page in the browser when double clicking on the task timer enable redmine integration '
+                              'under<br><span style="font-style: italic">Options > Configuration > Enable redmine integration</span>',
+                              min_width=550,
+                              html=True).exec()
+            return
+
+        # se è abilitata la funzionalità di copia del tempo passato nel task
+        if Globals.config['options']['redmine']['copy_time_to_clipboard']['enabled']:
+            formatted_time = Redmine.seconds_to_time_entry_format(seconds=task.elapsed_time,
+                                                                  rounding=Globals.config['options']['redmine']['copy_time_to_clipboard']['rounding'] * 60)
+            QApplication.clipboard().setText(formatted_time)
+
+        url = '{}/issues/{}/time_entries/new'.format(Globals.config['options']['redmine']['host'], n)
+
+        try:
+            webbrowser.open(url)
+        except webbrowser.Error as e:
+            logging.error('An error occurred trying to open the redmine web browser page for the url "{}": {}'.format(url, e))
+
+    def open_ticket_main_webpage(self, task):
+        n = task.ticket
+        if n == '':
+            return
+
+        if not Globals.config['options']['redmine']['enabled']:
+            InformationDialog('Open redmine ticket page in browser',
+                              'If you want to open the redmine ticket page in the browser when double clicking on the ticket number enable redmine integration under<br><span style="font-style: italic">Options > Configuration > Enable redmine integration</span>',
+                              min_width=550,
+                              html=True).exec()
+            return
+
+        url = '{}/issues/{}'.format(Globals.config['options']['redmine']['host'], n)
+
+        try:
+            webbrowser.open(url)
+        except webbrowser.Error as e:
+            logging.error('An error occurred trying to open the redmine web browser page for the url "{}": {}'.format(url, e))
+
+    def reset_task_switch_reminder(self):
+        # se l'utente ha abilitato il reminder per switchare task lo resetto
+        if Globals.config['options']['switch_reminder']['enabled']:
+            self._main_window.task_switch_timer.stop()
+            self._main_window.task_switch_timer.start(Globals.config['options']['switch_reminder']['interval'] * 60 * 1000)  # converto da minuti a millisecondi
+
+    @Slot()
+    def update_active_task(self):
+        # il task attivo è quello selezionato, ma solo se il tempo non è in pausa
+        active = self.get_selected_task() if self.running else None
+
+        self.time_accounting.start(active)
+
+        # il tempo viene accreditato (e il file dei task segnato come modificato) ogni secondo anche con la finestra non
+        # visibile, in modo da non perderlo in caso di interruzione: è solo il ridisegno ad essere rimandato (vedi
+        # refresh_task e update_total_time)
+        if self.time_accounting.is_counting():
+            if not self.render_timer.isActive():
+                self.render_timer.start(1000)
+        else:
+            self.render_timer.stop()
+
+    @Slot()
+    def render(self):
+        # accredita al task attivo i secondi trascorsi, aggiornando di conseguenza i label
+        self.time_accounting.commit()
+
+    @Slot(bool)
+    def exposed_changed(self, exposed):
+        if exposed:
+            # ridisegna quello che è cambiato mentre la finestra non era visibile
+            self.catch_up()
+
+    @Slot()
+    def catch_up(self):
+        # aggiorna quello che è stato rimandato e ora è visibile
+        if not self.render_scheduler.is_exposed():
+            return
+
+        if self._stale_total_time:
+            self._stale_total_time = False
+            self.update_total_time()
+
+        for task in list(self._stale_tasks.values()):
+            row = self.task_model.row_of(task)
+
+            if row is None:
+                # il task è stato rimosso dalla lista
+                del self._stale_tasks[task.id]
+            elif self.render_scheduler.is_row_visible(row):
+                del self._stale_tasks[task.id]
+                self.task_model.task_updated(task)
+
+
+    def update_total_time(self):
+        if self._batch_depth > 0:
+            self._batch_total_time = True
+            return
+
+        if not self.render_scheduler.is_exposed():
+            self._stale_total_time = True
+            return
+
+        self.total_time.setText('Total time: {}'.format(Utils.format_time(self.time_aggregates.total)))
 
 
 
@@ -652,17 +1190,15 @@ class CheckUpdateWorker(QThread):
         logging.info('Latest available version: {}'.format(resp['info']['version'].strip()))
         self.finished.emit((True, None, resp['info']['version'].strip()))
 
-def widgets_of_type(list_, type_):
-    for i in range(list_.count()):
-        w = list_.itemWidget(list_.item(i))
-        if w.type == type_:
-            yield w
-
 class MainWindow(QMainWindow):
     # dizionario che contiene le informaizoni riguardo ai tempi tracciati
     tasks = None
     # timer che gestisce l'autosave
     tasks_autosave_timer = None
+    # timer che scrive nel journal le modifiche ai task, al massimo una volta al secondo
+    tasks_journal_timer = None
+    # id dei task modificati e non ancora scritti nel journal
+    _dirty_task_ids = None
     # thread che cerca aggiornamenti per il software in background
     update_thread = None
 
@@ -671,9 +1207,15 @@ class MainWindow(QMainWindow):
 
         self.widget = widget
         self.widget._main_window = self
+        self.widget.render_scheduler.watch_window(self)
 
         self.oldPos = self.pos()
 
+        # snapshot dei file di salvataggio, usati per ripristinare i file danneggiati al caricamento
+        self.snapshots = Snapshots(os.path.join(Globals.config_folder, Globals.snapshots_folder_name), Globals.config_folder)
+        self._last_snapshot = time.monotonic()
+        self._load_failed = False
+
         # carica il file di configurazione e applica alla finestra/applicazione le config salvate
         self.load_config()
         # carica gli elementi dell'interfaccia grafica
@@ -686,8 +1228,20 @@ class MainWindow(QMainWindow):
 
         self.set_run_pause(Globals.config['time_running'])
 
+        # notes store e archivio vengono aperti prima dei task, sono usati dalle migrazioni del file dei task
+        self.load_notes()
+        self.load_archive()
         # carica il file dei task esistenti e li visualizza nell'interfaccia grafica
         self.load_tasks()
+        # apre lo storico dei segmenti di tempo
+        self.load_history()
+
+        # snapshot dei file appena caricati, se non sono stati sostituiti dai default perchè danneggiati
+        if not self._load_failed:
+            self.snapshots.take_in_background()
+
+        # misuro il tempo necessario a mostrare la lista dei task la prima volta
+        self.widget.task_list.viewport().installEventFilter(self)
 
         # mostro la finestra principale
         self.show()
@@ -719,7 +1273,7 @@ class MainWindow(QMainWindow):
         self.setWindowFlag(Qt.FramelessWindowHint)
         self.resize(460, 520)
 
-        fa5 = QFont('Font Awesome 5 Pro')
+        fa5 = Styles.font(Styles.ICONS)
 
         # Menu
         menu_bar = self.menuBar()
@@ -749,9 +1303,20 @@ class MainWindow(QMainWindow):
         self.clear_all_tasks_times_action = actions_menu.addAction("Clear all tasks times")
         self.clear_all_tasks_times_action.triggered.connect(self.clear_all_tasks_times)
 
+        export_action = actions_menu.addAction("Export...")
+        export_action.triggered.connect(self.export_data)
+
+        archive_action = actions_menu.addAction("Archive tasks...")
+        archive_action.triggered.connect(self.archive_old_tasks)
+
+        archived_action = actions_menu.addAction("Archived tasks...")
+        archived_action.triggered.connect(self.show_archived_tasks)
+
         statistics_menu = menu_bar.addMenu("Statistics")
         usage_action = statistics_menu.addAction("Dev statistics")
-        usage_action.triggered.connect(lambda: StatisticsDialog().exec())
+        usage_action.triggered.connect(lambda: StatisticsDialog(self.widget.task_delegate.editor_pool.stats()).exec())
+        reports_action = statistics_menu.addAction("Reports")
+        reports_action.triggered.connect(lambda: ReportsDialog(self.widget.time_history).exec())
 
         other_menu = menu_bar.addMenu("Other")
         help_action = other_menu.addAction("Help")
@@ -806,38 +1371,152 @@ class MainWindow(QMainWindow):
 
     def load_config(self):
         # apre i file di salvataggio delle config
-        Globals.config = SaveFile(os.path.join(Globals.config_folder, Globals.config_file_name), filetype='config', default=Globals.default_config)
+        Globals.config = self.open_save_file(os.path.join(Globals.config_folder, Globals.config_file_name), filetype='config', default=Globals.default_config)
+
+    def open_save_file(self, filename, **kwargs):
+        # se il file esiste ma non è valido (es. json danneggiato) viene conservata una copia del file danneggiato e
+        # proposto il ripristino dall'ultimo snapshot che lo contiene, altrimenti vengono usati i dati di default
+        save_file = SaveFile(filename, backend=Globals.storage_backend, **kwargs)
+
+        if save_file.load_error is None:
+            return save_file
+
+        self._load_failed = True
+
+        # il file danneggiato può essere quello json da cui importare i dati (nel file binario o nel database)
+        damaged = save_file.load_error_filename
+        damaged_path = os.path.join(os.path.dirname(damaged), 'damaged-' + os.path.basename(damaged))
+        shutil.copyfile(damaged, damaged_path)
+        logging.error('Save file ({}) is damaged, copy saved as {}'.format(damaged, damaged_path))
+
+        name = self.snapshots.latest(damaged)
+        if name is None:
+            return save_file
+
+        dialog = ConfirmDialog(window_title='Damaged save file',
+                               text='The save file {} is damaged and cannot be loaded ({}).\n'
+                                    'Do you want to restore it from the snapshot of {}?\n'
+                                    'Otherwise default values will be used.'.format(damaged, save_file.load_error, self.snapshots.date(name).strftime('%d/%m/%Y %H:%M')),
+                               positive_button='Restore',
+                               negative_button='Use defaults')
+
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return save_file
+
+        save_file.close()
+        self.snapshots.restore(name, damaged)
+
+        return SaveFile(filename, backend=Globals.storage_backend, **kwargs)
 
     def load_tasks(self):
-        self.tasks = SaveFile(os.path.join(Globals.config_folder, Globals.tasks_file_name), filetype='tasks', default=Globals.default_tasks)
+        self.tasks = self.open_save_file(os.path.join(Globals.config_folder, Globals.tasks_file_name), filetype='tasks', default=Globals.default_tasks, journal=True,
+                                         migration_resources={'notes_store': self.widget.notes_store, 'task_archive': self.widget.task_archive})
+
+        if self.tasks.default_loaded:
+            # il task di esempio si riferisce alle sue note, che devono essere nel notes store
+            self.widget.notes_store.put(Globals.default_task_notes)
 
-        # carico i task dal file di salvataggio all'interfaccia utente
-        for t in self.tasks['current_tasks'].values():
+        # carico i task dal file di salvataggio all'interfaccia utente, le righe vengono disegnate solo quando visibili.
+        # La chiave di ogni task nel file di salvataggio è il suo id
+        self.widget.set_tasks((Task.from_dict(t, int(k)) for k, t in self.tasks['current_tasks'].items()), self.tasks['next_task_id'])
 
-            self.widget.insert_task_in_list(t['name'],
-                                            '#' + t['ticket'],
-                                            t['elapsed_time'],
-                                            t['color_group'],
-                                            t['ticket_title'],
-                                            t['notes'])
+        logging.info('Loaded {} tasks ({:.1f} ms since startup)'.format(self.widget.task_model.rowCount(), (time.monotonic() - Globals.start_time) * 1000))
 
-        self.widget.update_total_time()
-        # aggiorno lo stato dei marker che indicano i task con numero ticket duplicato
-        self.widget.update_duplicated_tickets_marker()
+        # ogni modifica alla lista dei task viene registrata nel journal del file di salvataggio
+        self._dirty_task_ids = set()
+
+        self.tasks_journal_timer = QTimer()
+        self.tasks_journal_timer.setSingleShot(True)
+        self.tasks_journal_timer.timeout.connect(self.sync_tasks_journal)
+
+        model = self.widget.task_model
+        model.dataChanged.connect(lambda top, bottom, _roles=None: self.mark_tasks_dirty(model.task(r) for r in range(top.row(), bottom.row() + 1)))
+        model.rowsInserted.connect(lambda _parent, first, last: self.mark_tasks_dirty(model.task(r) for r in range(first, last + 1)))
+        model.rowsAboutToBeRemoved.connect(lambda _parent, first, last: self.journal_removed_tasks(model.task(r) for r in range(first, last + 1)))
+        model.rowsMoved.connect(self.journal_tasks_order)
 
         # lancio il timer per l'autosalvataggio dei tempi/task ogni minuto
         self.tasks_autosave_timer = QTimer()
         self.tasks_autosave_timer.timeout.connect(self.flush_tasks_to_savefile)
         self.tasks_autosave_timer.start(60 * 1000)
 
-    def flush_tasks_to_savefile(self):
+    def load_history(self):
+        self.widget.time_history = TimeHistory.TimeHistory(TimeHistory.open_store())
+
+    def load_archive(self):
+        self.widget.task_archive = TaskArchive(os.path.join(Globals.config_folder, Globals.archive_folder_name))
+
+    def load_notes(self):
+        self.widget.notes_store = NotesStore(os.path.join(Globals.config_folder, Globals.notes_folder_name))
+
+    def collect_notes(self):
+        # elimina dal notes store le note non più usate, nè dai task della lista nè da quelli archiviati. L'archivio
+        # viene letto solo se ci sono note non usate dai task della lista
+        referenced = {t.notes_ref for t in self.widget.task_model.tasks()}
+
+        if len(self.widget.notes_store.refs() - referenced) > 0:
+            referenced.update(task.get('notes_ref', '') for _, task in self.widget.task_archive.tasks().values())
+            self.widget.notes_store.collect(referenced)
+
+    def mark_tasks_dirty(self, tasks):
+        for t in tasks:
+            self._dirty_task_ids.add(t.id)
+
+        # le modifiche vengono raggruppate e scritte (con un solo fsync) entro un secondo
+        if not self.tasks_journal_timer.isActive():
+            self.tasks_journal_timer.start(1000)
+
+    def journal_removed_tasks(self, tasks):
+        for t in tasks:
+            self._dirty_task_ids.discard(t.id)
+            self.tasks.delete(('current_tasks', str(t.id)))
+
+        if not self.tasks_journal_timer.isActive():
+            self.tasks_journal_timer.start(1000)
+
+    def journal_tasks_order(self):
+        self.tasks.reorder(('current_tasks',), [str(t.id) for t in self.widget.task_model.tasks()])
+
+        if not self.tasks_journal_timer.isActive():
+            self.tasks_journal_timer.start(1000)
+
+    def sync_tasks_journal(self):
+        registry = self.widget.task_model.registry
+        # il dizionario del file di salvataggio contiene sempre lo stato già scritto su disco (file principale + journal)
+        persisted = self.tasks['current_tasks']
+
+        for task_id in self._dirty_task_ids:
+            t = registry.get(task_id)
+            if t is None:
+                continue
+
+            # molte notifiche di modifica sono solo ridisegni (es. ticket duplicati), scrivo solo i task effettivamente cambiati
+            d = t.to_dict()
+            if persisted.get(str(task_id)) != d:
+                self.tasks.set(('current_tasks', str(task_id)), d)
+
+        self._dirty_task_ids.clear()
+        self.tasks_journal_timer.stop()
+
+        # l'id del prossimo task viene scritto insieme ai nuovi task
+        if self.tasks['next_task_id'] != registry.next_id:
+            self.tasks.set(('next_task_id',), registry.next_id)
+
+        self.tasks.sync_journal()
+
+    def flush_tasks_to_savefile(self, compact=False):
         logging.info("Autoflushing tasks to file...")
-        self.tasks['current_tasks'].clear()
-        i = 0
-        for t in widgets_of_type(list_=self.widget.task_list, type_='task'):
-            self.tasks['current_tasks'][str(i)] = t.to_dict()
-            i += 1
-        self.tasks.save()
+        # accredito il tempo trascorso fino ad ora, in modo da salvare il tempo aggiornato
+        self.widget.time_accounting.commit()
+        self.widget.time_history.flush()
+        self.sync_tasks_journal()
+        # il file principale viene riscritto solo se il journal è diventato troppo grande
+        self.tasks.save(compact=compact)
+
+        # snapshot periodico dei file di salvataggio, vengono copiati solo i file modificati dall'ultimo snapshot
+        if time.monotonic() - self._last_snapshot >= Snapshots.interval:
+            self._last_snapshot = time.monotonic()
+            self.snapshots.take_in_background()
 
     def search_for_updates(self, show_errors):
         def func(result):
@@ -962,25 +1641,25 @@ class MainWindow(QMainWindow):
     def refresh_ticket_titles(self):
         Globals.config['stats']['ticket_titles_refreshed'] += 1
 
-        tickets = []
-        for t in widgets_of_type(list_=self.widget.task_list, type_='task'):
-            # solo se il task ha un ticket number
-            if t.ticket_number.text().strip('# ') != '':
-                tickets.append(t.ticket_number.text().strip('# '))
-                t.ticket_title.setText('...')
+        registry = self.widget.task_model.registry
+
+        # solo i task che hanno un ticket number
+        tickets = list(registry.tickets())
+        with self.widget.batch():
+            for t in registry.tasks_with_ticket():
+                t.ticket_title = '...'
+
+            self.widget.refresh_all_tasks(relayout=True)
 
         def func(result):
             if result is not None:
-                for t in widgets_of_type(list_=self.widget.task_list, type_='task'):
-                    # solo se il task ha un ticket number
-                    if t.ticket_number.text().strip('# ') != '':
-                        text = result.get(t.ticket_number.text().strip('# '))
-                        if text is not None:
-                            t.ticket_title.setText(text)
-                            Utils.set_prop_and_refresh(t.ticket_title, 'invalid', False)
-                        else:
-                            t.ticket_title.setText('Unable to find the specified ticket')
-                            Utils.set_prop_and_refresh(t.ticket_title, 'invalid', True)
+                with self.widget.batch():
+                    for ticket in registry.tickets():
+                        title = result.get(ticket)
+                        for t in registry.tasks_with_ticket(ticket):
+                            t.ticket_title = title
+
+                    self.widget.refresh_all_tasks(relayout=True)
             else:
                 logging.warning('Redmine api call returned empty dict searching for ticket title')
 
@@ -988,17 +1667,88 @@ class MainWindow(QMainWindow):
         Utils.launch_thread(UpdateTicketTitleWorker, [tickets], [('finished', func)])
 
     def clear_all_tasks_times(self):
-        for t in widgets_of_type(list_=self.widget.task_list, type_='task'):
-            t.set_time(0)
+        with self.widget.batch():
+            for t in self.widget.task_model.tasks():
+                self.widget.time_accounting.reset(t)
+                self.widget.set_task_time(t, 0, TimeHistory.CLEAR)
 
 
+    def export_data(self):
+        dialog = ExportDialog()
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        options = dialog.get_options()
+        extension = '.csv' if options['fmt'] == Export.CSV else '.jsonl'
+
+        filename, _ = QFileDialog.getSaveFileName(self, 'Export', os.path.expanduser('~/fstk-{}{}'.format(options['what'], extension)))
+        if filename == '':
+            return
+
+        # i task vengono esportati dallo stato corrente della lista, non dal file di salvataggio
+        tasks = [(t.id, t.to_dict()) for t in self.widget.task_model.tasks()]
+
+        try:
+            with open(filename, 'w', newline='') as out:
+                count = Export.export(out=out, tasks=tasks, history=self.widget.time_history, notes_store=self.widget.notes_store, **options)
+        except OSError as e:
+            logging.error('An error occurred exporting to {}: {}'.format(filename, e))
+            InformationDialog('Export failed', 'An error occurred exporting to {}: {}'.format(filename, e)).exec()
+            return
+
+        logging.info('Exported {} rows to {}'.format(count, filename))
+
+    def archive_old_tasks(self):
+        dialog = ArchiveTasksDialog()
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        tasks = list(self.widget.task_model.tasks())
+        selected = set()
+
+        if dialog.zero_time.isChecked():
+            selected.update(t.id for t in tasks if t.elapsed_time == 0)
+
+        days = dialog.get_inactive_days()
+        if days is not None:
+            since = datetime.date.today() - datetime.timedelta(days=days)
+            history_days = self.widget.time_history.store.days()
+
+            # senza storico per tutto il periodo non è possibile sapere quali task sono inattivi
+            if len(history_days) == 0 or history_days[0] > since.isoformat():
+                InformationDialog('Archive tasks', 'The time history does not cover the last {} days yet, tasks cannot be archived by inactivity.'.format(days)).exec()
+                return
+
+            active = {s.task_id for s in self.widget.time_history.segments(TimeHistory.day_range(since)[0], TimeHistory.day_range(datetime.date.today())[1])}
+            selected.update(t.id for t in tasks if t.id not in active)
+
+        if len(selected) == 0:
+            InformationDialog('Archive tasks', 'There are no tasks to archive.').exec()
+            return
+
+        dialog = ConfirmDialog(window_title='Confirm tasks archiving', text='{} tasks will be archived, are you sure?'.format(len(selected)))
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        self.widget.archive_tasks(t for t in tasks if t.id in selected)
+
+    def show_archived_tasks(self):
+        dialog = ArchivedTasksDialog(self.widget.task_archive)
+        if not dialog.exec():  # se l'utente non ha cliccato su ok non procediamo
+            return
+
+        self.widget.restore_tasks(dialog.get_selected())
+
     def clear_ticket_titles(self):
-        for t in widgets_of_type(list_=self.widget.task_list, type_='task'):
-            t.ticket_title.setText('')
-            t.ticket_title.setProperty('invalid', False)
+        with self.widget.batch():
+            for t in self.widget.task_model.registry.tasks_with_ticket():
+                t.ticket_title = ''
+
+            self.widget.refresh_all_tasks(relayout=True)
 
     def set_run_pause(self, state):
         self.widget.running = state
+        self.widget.update_active_task()
 
         if self.widget.running:
             self.run_pause_button.setStyleSheet('background-color: {}'.format('#630f31' if Globals.config['options']['boomer_compatibility']['invert_run_pause_button'] else '#42630f'))
@@ -1013,10 +1763,10 @@ class MainWindow(QMainWindow):
         Globals.config['stats']['time_run_toggled'] += 1
 
     def remind_task_switch(self):
-        if len(self.widget.task_list.selectedItems()) > 0:
-            selected_task = self.widget.task_list.itemWidget(self.widget.task_list.selectedItems()[0])
-            name = selected_task.name.text()
-            ticket_number = selected_task.ticket_number.text()
+        selected_task = self.widget.get_selected_task()
+        if selected_task is not None:
+            name = selected_task.name
+            ticket_number = '#' + selected_task.ticket if selected_task.ticket != '' else ''
             InformationDialog('Remeber to switch active task', 'Are you still working on task "{}" {}?'.format(name, '(ticket: {})'.format(ticket_number) if ticket_number else ''), max_width=1000).show()
         else:
             InformationDialog('Remeber to switch active task', 'Have you started working on a task? (no task is currently selected)', max_width=1000).show()
@@ -1030,6 +1780,13 @@ class MainWindow(QMainWindow):
     #     print('Toggled: ', not bool(self.windowFlags() & Qt.WindowStaysOnTopHint))
 
     def eventFilter(self, source, event):
+        if source is self.widget.task_list.viewport():
+            if event.type() == QEvent.Type.Paint:
+                logging.info('Time to first paint: {:.1f} ms ({} tasks)'.format((time.monotonic() - Globals.start_time) * 1000, self.widget.task_model.rowCount()))
+                source.removeEventFilter(self)
+
+            return super().eventFilter(source, event)
+
         if event.type() == QEvent.Type.MouseMove:
             if event.buttons() & Qt.LeftButton:
                 delta = QPoint(event.globalPos() - self.oldPos)
@@ -1053,8 +1810,27 @@ class MainWindow(QMainWindow):
         # salva su disco le config
         Globals.config.save()
 
-        # salva su disco i task/tempi
-        self.flush_tasks_to_savefile()
+        # salva su disco i task/tempi, svuotando il journal
+        self.flush_tasks_to_savefile(compact=True)
+        self.widget.time_history.close()
+
+        # i file vengono scritti in background, attendo (per un tempo limitato) che le scritture siano terminate
+        written = True
+        for save_file in (Globals.config, self.tasks):
+            if not save_file.wait(timeout=5):
+                logging.warning('Timeout waiting for pending writes of save files, some changes may be lost')
+                written = False
+
+        # le note vengono eliminate solo dopo che il file dei task è stato scritto senza i loro riferimenti: se la
+        # scrittura non è terminata, il file potrebbe ancora riferirsi a note non più usate
+        if written:
+            self.collect_notes()
+        else:
+            logging.warning('Skipping collection of unused notes, the tasks file may not be up to date')
+
+        self.snapshots.take_in_background()
+        if not self.snapshots.wait(timeout=5):
+            logging.warning('Timeout waiting for the snapshot of save files')
 
         logging.debug('Cleaning lock file for the current execution')
         # rilascio il file di lock per questa esecuzione
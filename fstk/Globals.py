@@ -1,4 +1,5 @@
 from . import __version__
+from .NotesStore import NotesStore
 
 default_window_style = '''
         * { color: #4ecca3; }
@@ -11,8 +12,15 @@ default_window_style = '''
 
 config = None
 
-config_file_version = 7
-tasks_file_version = 4
+# backend dei file di salvataggio: 'json', 'sqlite' oppure 'binary' (solo per i task, configurabile con la variabile
+# d'ambiente FSTK_STORAGE_BACKEND)
+storage_backend = 'json'
+
+# istante (time.monotonic) di avvio del software, usato per misurare i tempi di avvio
+start_time = None
+
+config_file_version = 8
+tasks_file_version = 6
 
 default_config = {
     'window': {
@@ -38,6 +46,8 @@ default_config = {
         'task_notes_edited': 0,
         'task_notes_viewed': 0,
         'task_reordered': 0,
+        'task_archived': 0,
+        'task_restored': 0,
 
         'ticket_titles_refreshed': 0,
         'time_run_toggled': 0,
@@ -67,6 +77,9 @@ default_config = {
     'version': config_file_version
 }
 
+# note del task di esempio, salvate nel notes store quando vengono usati i task di default (vedi MainWindow.load_tasks)
+default_task_notes = 'This is your first task. You can save notes here.'
+
 default_tasks = {
     'current_tasks': {
         '0': {
@@ -75,15 +88,22 @@ default_tasks = {
             'elapsed_time': 4632,
             'color_group': 'Blue',
             'ticket_title': '',
-            'notes': 'This is your first task. You can save notes here.'
+            'notes_ref': NotesStore.ref(default_task_notes),
+            'notes_preview': NotesStore.preview(default_task_notes)
         }
     },
+    'next_task_id': 1,
     'version': tasks_file_version
 }
 
 config_folder = '~/.config/fstk'
 config_file_name = 'config.json'
 tasks_file_name = 'tasks.json'
+sqlite_file_name = 'fstk.sqlite3'
+history_folder_name = 'history'
+archive_folder_name = 'archive'
+notes_folder_name = 'notes'
+snapshots_folder_name = 'snapshots'
 lock_file_name = 'lock.pid'
 
 desktop_folder = '~/.local/share/applications'
@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+
+class NotesStore(object):
+    # note dei task salvate fuori dal file dei task, in una cartella con un file per ogni testo, chiamato con l'hash
+    # (sha256) del contenuto. I task contengono solo il riferimento (l'hash, '' se il task non ha note) e un'anteprima;
+    # il testo completo viene letto solo quando le note vengono mostrate o modificate, con una piccola cache LRU.
+    # I file non sono mai modificati: un testo diverso è un file diverso, quelli non più usati vengono eliminati da collect.
+    # In sola lettura (es. export o simulazione delle migrazioni) i testi salvati con put rimangono solo in memoria
+
+    cache_size = 16
+    preview_length = 80
+
+    def __init__(self, folder, read_only=False):
+        self.folder = folder
+        self.read_only = read_only
+        self._cache = OrderedDict()
+        # testi salvati in sola lettura, non vengono mai eliminati dalla cache
+        self._unsaved = {}
+
+    def read_only_view(self):
+        # notes store sulla stessa cartella che non modifica nessun file
+        return self if self.read_only else NotesStore(self.folder, read_only=True)
+
+    @classmethod
+    def preview(cls, text):
+        # prima riga del testo, troncata a preview_length caratteri
+        line = text.split('\n', 1)[0]
+
+        return line if len(line) <= cls.preview_length else line[:cls.preview_length - 1] + '…'
+
+    @staticmethod
+    def ref(text):
+        # riferimento (hash del contenuto) con cui il testo viene salvato, '' per un testo vuoto
+        if text == '':
+            return ''
+
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def put(self, text):
+        if text == '':
+            return ''
+
+        content = text.encode('utf-8')
+        ref = self.ref(text)
+        path = self._path(ref)
+
+        if self.read_only:
+            if not os.path.exists(path):
+                self._unsaved[ref] = text
+        # lo stesso testo è già salvato
+        elif not os.path.exists(path):
+            self._write_blob(path, content)
+
+        self._remember(ref, text)
+
+        return ref
+
+    def get(self, ref):
+        if ref == '':
+            return ''
+
+        text = self._cache.get(ref, self._unsaved.get(ref))
+
+        if text is None:
+            try:
+                with open(self._path(ref), 'rb') as f:
+                    text = f.read().decode('utf-8')
+            except FileNotFoundError:
+                logging.error('Notes not found in notes store ({})'.format(self._path(ref)))
+                return ''
+
+        self._remember(ref, text)
+
+        return text
+
+    def refs(self):
+        if not os.path.isdir(self.folder):
+            return set()
+
+        return {name for name in os.listdir(self.folder) if not name.endswith('.tmp')}
+
+    def collect(self, referenced):
+        # elimina i testi non più referenziati, ritorna il numero di file eliminati
+        if self.read_only:
+            raise ValueError('The notes store ({}) has been opened read only'.format(self.folder))
+
+        removed = 0
+
+        for ref in self.refs() - set(referenced):
+            os.remove(self._path(ref))
+            self._cache.pop(ref, None)
+            removed += 1
+
+        if removed > 0:
+            logging.info('Removed {} unreferenced notes from notes store ({})'.format(removed, self.folder))
+
+        return removed
+
+    def _path(self, ref):
+        return os.path.join(self.folder, ref)
+
+    def _remember(self, ref, text):
+        self._cache[ref] = text
+        self._cache.move_to_end(ref)
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _write_blob(self, path, content):
+        # il file compare con il suo nome solo quando è completo, il contenuto corrisponde sempre all'hash
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'wb') as o:
+            o.write(content)
+            o.flush()
+            os.fsync(o.fileno())
+
+        os.replace(tmp_path, path)
+
+        dir_fd = os.open(self.folder, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
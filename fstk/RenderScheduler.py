@@ -0,0 +1,62 @@
+from PySide2.QtCore import QObject, QEvent, Signal
+
+
+class RenderScheduler(QObject):
+    # tiene traccia di cosa è effettivamente visibile: la finestra (non minimizzata nè nascosta) e le righe della lista
+    # dei task che intersecano la vista. Chi aggiorna l'interfaccia può così rimandare gli aggiornamenti di ciò che non
+    # si vede, e recuperarli in una sola volta quando torna visibile (vedi i segnali)
+
+    # la finestra è diventata visibile (True) o non visibile (False)
+    exposedChanged = Signal(bool)
+    # le righe visibili possono essere cambiate (scroll, ridimensionamento, modifiche alla lista)
+    visibleRowsChanged = Signal()
+
+    _window = None
+    _exposed = True
+
+    def __init__(self, view):
+        super().__init__(view)
+        self._view = view
+
+        view.verticalScrollBar().valueChanged.connect(self._rows_changed)
+        view.viewport().installEventFilter(self)
+
+        model = view.model()
+        model.rowsInserted.connect(self._rows_changed)
+        model.rowsRemoved.connect(self._rows_changed)
+        model.rowsMoved.connect(self._rows_changed)
+        model.modelReset.connect(self._rows_changed)
+        model.layoutChanged.connect(self._rows_changed)
+
+    def watch_window(self, window):
+        self._window = window
+        self._exposed = self._is_window_exposed()
+        window.installEventFilter(self)
+
+    def is_exposed(self):
+        return self._exposed
+
+    def is_row_visible(self, row):
+        if not self._exposed:
+            return False
+
+        return self._view.visualRect(self._view.model().index(row)).intersects(self._view.viewport().rect())
+
+    def eventFilter(self, source, event):
+        if source is self._window and event.type() in (QEvent.WindowStateChange, QEvent.Show, QEvent.Hide):
+            exposed = self._is_window_exposed()
+
+            if exposed != self._exposed:
+                self._exposed = exposed
+                self.exposedChanged.emit(exposed)
+        elif source is not self._window and event.type() == QEvent.Resize:
+            # ridimensionamento della vista della lista
+            self._rows_changed()
+
+        return False
+
+    def _is_window_exposed(self):
+        return self._window.isVisible() and not self._window.isMinimized()
+
+    def _rows_changed(self, *_):
+        self.visibleRowsChanged.emit()
@@ -0,0 +1,142 @@
+import array
+import bisect
+import datetime
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import TimeHistory
+
+
+# chiavi di raggruppamento dei report
+DAY = 'day'
+WEEK = 'week'
+TICKET = 'ticket'
+COLOR_GROUP = 'color_group'
+TASK = 'task'
+
+# gli azzeramenti tolgono dal task tempo già rendicontato, non lavoro: non vengono conteggiati nei report
+_excluded_kind = TimeHistory.kinds.index(TimeHistory.CLEAR)
+
+if numpy is not None:
+    # stessa disposizione di TimeHistory.segment_record
+    _dtype = numpy.dtype([
+        ('start', '<i8'),
+        ('seconds', '<i4'),
+        ('task_id', '<u4'),
+        ('ticket', '<u4'),
+        ('color_group', '<u4'),
+        ('kind', 'u1'),
+        ('padding', 'V3')
+    ])
+
+
+class Report(object):
+    # segmenti dello storico di un intervallo [since, until) caricati per colonne (array di NumPy se installato,
+    # altrimenti array della libreria standard), su cui vengono calcolati i totali raggruppati per giorno, settimana,
+    # ticket, gruppo colore o task. Con NumPy i raggruppamenti sono operazioni vettoriali sulle colonne
+
+    def __init__(self, history, since, until):
+        self.since = since
+        self.until = until
+
+        buffer, self._strings = history.record_buffer(since, until)
+
+        if numpy is not None:
+            records = numpy.frombuffer(buffer, dtype=_dtype)
+            records = records[(records['start'] >= since) & (records['start'] < until) & (records['kind'] != _excluded_kind) &
+                              (records['ticket'] < len(self._strings)) & (records['color_group'] < len(self._strings))]
+
+            self.start = records['start']
+            self.seconds = records['seconds'].astype(numpy.int64)
+            self.task_id = records['task_id']
+            self.ticket = records['ticket']
+            self.color_group = records['color_group']
+        else:
+            # i record che si riferiscono a stringhe sconosciute (perse da un'interruzione) vengono scartati
+            rows = [r for r in TimeHistory.segment_record.iter_unpack(buffer)
+                    if since <= r[0] < until and r[5] != _excluded_kind and r[3] < len(self._strings) and r[4] < len(self._strings)]
+            columns = list(zip(*rows)) if len(rows) > 0 else [()] * 5
+
+            self.start = array.array('q', columns[0])
+            self.seconds = array.array('q', columns[1])
+            self.task_id = array.array('L', columns[2])
+            self.ticket = array.array('L', columns[3])
+            self.color_group = array.array('L', columns[4])
+
+        # inizio di ogni giorno dell'intervallo (ora locale), per ricavare il giorno dei segmenti anche nei cambi d'ora
+        first = datetime.date.fromtimestamp(since)
+        self._days = [first + datetime.timedelta(days=i) for i in range((datetime.date.fromtimestamp(until - 1) - first).days + 1)]
+        self._day_starts = [TimeHistory.day_range(d)[0] for d in self._days]
+
+    def __len__(self):
+        return len(self.start)
+
+    def total(self):
+        return int(sum(self.seconds)) if numpy is None else int(self.seconds.sum())
+
+    def totals(self, *keys):
+        # secondi totali per ogni combinazione delle chiavi indicate: {(valore chiave 1, valore chiave 2, ...): secondi}
+        codes, labels = zip(*(self._codes(k) for k in keys))
+
+        if numpy is None:
+            sums = {}
+            for code, seconds in zip(zip(*codes), self.seconds):
+                sums[code] = sums.get(code, 0) + seconds
+
+            items = sums.items()
+        else:
+            # le chiavi vengono combinate in un unico codice, raggruppato con unique + bincount
+            combined = numpy.zeros(len(self), dtype=numpy.int64)
+            for c, l in zip(codes, labels):
+                combined = combined * len(l) + c
+
+            unique, inverse = numpy.unique(combined, return_inverse=True)
+            sums = numpy.bincount(inverse, weights=self.seconds, minlength=len(unique))
+
+            # separo di nuovo i codici delle singole chiavi
+            split = []
+            for l in reversed(labels):
+                unique, c = numpy.divmod(unique, len(l))
+                split.append(c.tolist())
+
+            items = zip(zip(*reversed(split)), sums.astype(numpy.int64).tolist())
+
+        return {tuple(l[c] for c, l in zip(code, labels)): seconds for code, seconds in items if seconds != 0}
+
+    def _codes(self, key):
+        # colonna dei codici della chiave e lista delle etichette corrispondenti ai codici
+        if key == DAY:
+            return self._day_codes(), self._days
+        elif key == WEEK:
+            mondays = [d - datetime.timedelta(days=d.weekday()) for d in self._days]
+            weeks = sorted(set(mondays))
+            week_of_day = [weeks.index(m) for m in mondays]
+
+            day_codes = self._day_codes()
+            if numpy is None:
+                return array.array('L', (week_of_day[c] for c in day_codes)), weeks
+
+            return numpy.array(week_of_day, dtype=numpy.int64)[day_codes], weeks
+        elif key == TICKET:
+            return self.ticket, self._strings
+        elif key == COLOR_GROUP:
+            return self.color_group, self._strings
+        elif key == TASK:
+            if numpy is None:
+                tasks = sorted(set(self.task_id))
+                index = {t: i for i, t in enumerate(tasks)}
+                return array.array('L', (index[t] for t in self.task_id)), tasks
+
+            tasks, inverse = numpy.unique(self.task_id, return_inverse=True)
+            return inverse, tasks.tolist()
+
+        raise ValueError('Unknown report key ({})'.format(key))
+
+    def _day_codes(self):
+        if numpy is None:
+            return array.array('L', (bisect.bisect_right(self._day_starts, s) - 1 for s in self.start))
+
+        return numpy.searchsorted(numpy.array(self._day_starts, dtype=numpy.int64), self.start, side='right') - 1
@@ -1,34 +1,140 @@
+import copy
 import json
 import logging
+import os
+import threading
 
-from fstk import SavefilesMigrations, Globals
+try:
+    # parser json più veloce, se installato
+    import orjson
+except ImportError:
+    orjson = None
+
+from fstk import SavefilesMigrations, SavefilesSqlite, SavefilesBinary, Globals
+
+
+def json_loads(content):
+    # accetta sia str che bytes
+    if orjson is not None:
+        return orjson.loads(content)
+
+    return json.loads(content)
+
+
+def ordered_items(d, keys):
+    # elementi del dizionario nell'ordine indicato da keys, quelli non presenti in keys vengono mantenuti in fondo
+    ordered = set(keys)
+    return [(k, d[k]) for k in keys if k in d] + [(k, v) for k, v in d.items() if k not in ordered]
 
 
 class FlushFlagDict(dict):
+    # dizionario che registra nel ChangeTracker condiviso il percorso (tupla di chiavi a partire dalla radice del file)
+    # di ogni chiave modificata. Le scritture che non cambiano il valore non vengono registrate.
+    # I dizionari annidati vengono convertiti solo quando letti tramite [] o get(), che vanno quindi usati per
+    # modificarli; items() e values() ritornano i valori così come sono memorizzati
 
-    _flushed = None
+    _tracker = None
+    _path = ()
 
-    def __init__(self, flush_flag):
-        super(FlushFlagDict, self).__init__(self)
+    def __init__(self, tracker, path=()):
+        super(FlushFlagDict, self).__init__()
 
-        self._flushed = flush_flag
+        self._tracker = tracker
+        self._path = path
+
+    @classmethod
+    def wrap(cls, d, tracker, path=()):
+        # converte solo il primo livello di un dizionario, senza registrare modifiche (es. durante il caricamento da file)
+        ffd = cls(tracker, path)
+        dict.update(ffd, d)
+
+        return ffd
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+
+        return default
 
     def update(self, *args, **kwargs):
-        self._flushed[0] = False
-        return super(FlushFlagDict, self).update(*args, **kwargs)
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            self._tracker.mark(self._path + (key,))
+
+        return super(FlushFlagDict, self).pop(key, *default)
+
+    def clear(self):
+        if len(self) > 0:
+            self._tracker.mark(self._path)
+
+        super(FlushFlagDict, self).clear()
+
+    def reorder(self, keys):
+        # riordina le chiavi, quelle non presenti in keys vengono mantenute in fondo. Viene registrata una sola modifica
+        # (sul dizionario stesso) invece di una per chiave
+        items = ordered_items(dict(self), keys)
+
+        if [k for k, _ in items] == list(self.keys()):
+            return
+
+        super(FlushFlagDict, self).clear()
+        super(FlushFlagDict, self).update(items)
+        self._tracker.mark(self._path)
+
+    def __getitem__(self, key):
+        value = super(FlushFlagDict, self).__getitem__(key)
+
+        if isinstance(value, dict) and not self._is_child(key, value):
+            # conversione alla prima lettura, il dizionario convertito sostituisce quello originale
+            value = FlushFlagDict.wrap(value, self._tracker, self._path + (key,))
+            super(FlushFlagDict, self).__setitem__(key, value)
+
+        return value
 
     def __setitem__(self, key, value):
-        super(FlushFlagDict, self).__setitem__(key, (self.__transparent_obj_conversion(value)))
-        self._flushed[0] = False
+        if key in self:
+            old = dict.__getitem__(self, key)
+            # il confronto sul tipo evita di considerare uguali valori che vengono serializzati in modo diverso (es. 1 e True)
+            if old is value or (type(old) is type(value) or isinstance(old, dict) and isinstance(value, dict)) and old == value:
+                return
+
+        super(FlushFlagDict, self).__setitem__(key, self.__transparent_obj_conversion(key, value))
+        self._tracker.mark(self._path + (key,))
+
+    def __delitem__(self, key):
+        super(FlushFlagDict, self).__delitem__(key)
+        self._tracker.mark(self._path + (key,))
+
+    def __deepcopy__(self, memo):
+        # la copia (es. quella fatta dalle migrazioni) condivide il ChangeTracker ma non registra modifiche
+        ffd = FlushFlagDict(self._tracker, self._path)
+        for k, v in self.items():
+            dict.__setitem__(ffd, k, copy.deepcopy(v, memo))
+
+        return ffd
 
     def __repr__(self):
-        return "<FlushFlagDict ({}) {}>".format('Flushed' if self._flushed[0] else 'Not flushed', super(FlushFlagDict, self).__repr__())
+        return "<FlushFlagDict ({}) {}>".format('Flushed' if self._tracker.is_clean() else 'Not flushed', super(FlushFlagDict, self).__repr__())
 
-    def __transparent_obj_conversion(self, e):
-        if isinstance(e, dict):
-            ffd = FlushFlagDict(flush_flag=self._flushed)
-            ffd.update(e)
-            return ffd
+    def _is_child(self, key, e):
+        # vero se e è già convertito e nella posizione corretta
+        return type(e) is FlushFlagDict and e._tracker is self._tracker and e._path == self._path + (key,)
+
+    def __transparent_obj_conversion(self, key, e):
+        if self._is_child(key, e):
+            # già convertito e nella posizione corretta, non serve convertirlo di nuovo
+            return e
+        elif isinstance(e, dict):
+            return FlushFlagDict.wrap(e, self._tracker, self._path + (key,))
         # elif isinstance(e, list):
         #     ffl = FlushFlagList(flush_flag=self.__flushed)
         #     ffl += e
@@ -80,9 +186,31 @@ class FlushFlagDict(dict):
 #         else:
 #             return e
 
-class UncopiableList(list):
-    # lista che overrida __copy__ e __deepcopy__ in modo da evitare che una copy() o deepcopy() possa generarne un duplicato,
-    # che provoca una perdita di referenza per chi manteneva una referenza all'oggetto orignale
+class ChangeTracker(object):
+    # insieme dei percorsi (tuple di chiavi) modificati dall'ultimo salvataggio, condiviso da tutti i dizionari di un file
+    # di salvataggio. Overrida __copy__ e __deepcopy__ in modo da evitare che una copy() o deepcopy() dei dizionari
+    # possa generarne un duplicato, che provoca una perdita di referenza per chi manteneva una referenza all'oggetto orignale
+
+    def __init__(self):
+        self.paths = set()
+
+    def mark(self, path):
+        self.paths.add(path)
+
+    def clear(self):
+        self.paths.clear()
+
+    def is_clean(self):
+        return len(self.paths) == 0
+
+    def is_dirty(self, prefix=()):
+        # vero se è stato modificato il percorso indicato, un elemento al suo interno o un dizionario che lo contiene
+        n = len(prefix)
+        return any(p[:n] == prefix or prefix[:len(p)] == p for p in self.paths)
+
+    def sections(self):
+        # chiavi di primo livello che contengono modifiche, '' se è stato modificato l'intero file
+        return {p[0] if len(p) > 0 else '' for p in self.paths}
 
     def __copy__(self):
         return self
@@ -90,82 +218,563 @@ class UncopiableList(list):
     def __deepcopy__(self, memo):
         return self
 
+def snapshot(e):
+    # copia dei dati con dizionari e liste semplici, che può essere serializzata da un altro thread mentre l'originale
+    # continua ad essere modificato
+    if isinstance(e, dict):
+        return {k: snapshot(v) for k, v in e.items()}
+    elif isinstance(e, list):
+        return [snapshot(v) for v in e]
+
+    return e
+
+
+def write_atomic(filename, content):
+    # scrive il contenuto (str o bytes) in un file temporaneo e lo sostituisce al file originale solo dopo averlo scritto
+    # su disco, in modo che un'interruzione lasci sempre un file valido
+    tmp_path = filename + '.tmp'
+
+    with open(tmp_path, 'wb' if isinstance(content, bytes) else 'w') as o:
+        o.write(content)
+        o.flush()
+        os.fsync(o.fileno())
+
+    os.replace(tmp_path, filename)
+
+    # rende persistente anche la rinomina
+    dir_fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class SaveWorker(object):
+    # thread che esegue le scritture dei file di salvataggio, in modo da non bloccare l'interfaccia grafica. Viene
+    # mantenuta una sola scrittura in attesa: una nuova richiesta sostituisce quella non ancora iniziata
+
+    _thread = None
+    _pending = None
+    _busy = False
+
+    def __init__(self, name):
+        self._name = name
+        self._condition = threading.Condition()
+
+    def submit(self, job):
+        with self._condition:
+            if self._pending is not None:
+                logging.debug('Coalescing pending write of save file ({})'.format(self._name))
+
+            self._pending = job
+
+            if self._thread is None:
+                # il thread è daemon, l'attesa delle scritture in corso alla chiusura è a carico di wait()
+                self._thread = threading.Thread(target=self._run, name='SaveWorker {}'.format(self._name), daemon=True)
+                self._thread.start()
+
+            self._condition.notify_all()
+
+    def is_idle(self):
+        with self._condition:
+            return self._pending is None and not self._busy
+
+    def wait(self, timeout=None):
+        # attende la fine delle scritture richieste, ritorna False se il timeout scade prima
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None)
+                job = self._pending
+                self._pending = None
+                self._busy = True
+
+            try:
+                job()
+            except Exception as e:
+                logging.error('Exception occurred writing save file ({}): {}'.format(self._name, e))
+
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+
+class JsonBackend(object):
+    # salvataggio su file json, riscritto interamente ad ogni salvataggio. Opzionalmente le modifiche vengono registrate
+    # in un journal, compattato nel file principale quando supera journal_compaction_size
+
+    journal_compaction_size = 256 * 1024
+    # attesa massima (secondi) della scrittura in corso prima di una compattazione richiesta esplicitamente
+    compaction_wait_timeout = 5
+
+    _journal = None
+    _journal_buffer = None
+
+    # errore di lettura del file principale, se esiste ma non è valido (es. json danneggiato), e file non valido
+    load_error = None
+    load_error_filename = None
+
+    def __init__(self, filename, journal=False, read_only=False):
+        self.filename = filename
+        self._journal_path = filename + '.journal' if journal else None
+        # in sola lettura (es. export mentre il software è in esecuzione) nessun file viene creato o modificato
+        self._read_only = read_only
+        self._worker = SaveWorker(os.path.basename(filename))
+
+    def load(self):
+        # ritorna i dati caricati (None se il file non esiste o non è valido) e se il file principale non è aggiornato
+        try:
+            data = self._read_file()
+        except ValueError as e:
+            logging.warning('Exception occurred loading config file ({}): {}. Using default.'.format(self.filename, e))
+            data = None
+            self.load_error = e
+            self.load_error_filename = self.filename
+
+        if data is None and self.load_error is None:
+            # file non ancora creato (es. primo avvio) o vuoto, non è un errore
+            logging.info('Save file ({}) not found or empty. Using default.'.format(self.filename))
+
+        stale = False
+
+        if self._journal_path is not None:
+            # il journal va riapplicato prima delle migrazioni, poichè è stato scritto dalla stessa versione del software
+            # che ha scritto il file principale
+            if data is not None:
+                # il journal messo da parte da una compattazione non completata precede quello corrente
+                stale = self._replay_journal(data, self._compacting_journal_path())
+                stale = self._replay_journal(data, self._journal_path) or stale
+            if not self._read_only:
+                self._journal = open(self._journal_path, 'a')
+                self._journal_buffer = []
+
+        return data, stale
+
+    def record(self, record):
+        if self._journal is None:
+            raise ValueError("The save file ({}) has not been opened in journal mode".format(self.filename))
+
+        self._journal_buffer.append(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def sync(self, data, tracker):
+        # scrive su disco in una sola volta (con un solo fsync) tutte le modifiche registrate dall'ultima chiamata
+        if self._journal is None or len(self._journal_buffer) == 0:
+            return
+
+        self._journal.write(''.join(self._journal_buffer))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+        logging.debug("Written {} records to journal ({})".format(len(self._journal_buffer), self._journal_path))
+        self._journal_buffer = []
+
+    def save(self, data, tracker, compact=False):
+        if self._journal is not None:
+            # le modifiche sono già state scritte nel journal, il file principale viene riscritto solo quando
+            # il journal è diventato troppo grande (o se richiesto esplicitamente, ad esempio alla chiusura)
+            self.sync(data, tracker)
+
+            if tracker.is_clean():
+                logging.info("Save file ({}) nothing to flush.".format(self.filename))
+            elif compact or self._journal.tell() >= self.journal_compaction_size:
+                self._compact(data, tracker, wait=compact)
+            else:
+                logging.info("Save file ({}) changes already in journal.".format(self.filename))
+
+            return
+
+        if not tracker.is_clean():
+            logging.info("Flushing save file ({}), changed: {}...".format(self.filename, ', '.join(sorted(tracker.sections()))))
+            # la copia viene fatta qui, la serializzazione e la scrittura dal thread di salvataggio
+            data_copy = snapshot(data)
+            tracker.clear()
+            self._worker.submit(lambda: self._write(data_copy, tracker))
+        else:
+            logging.info("Save file ({}) nothing to flush.".format(self.filename))
+
+    def wait(self, timeout=None):
+        return self._worker.wait(timeout)
+
+    def close(self):
+        # chiude il journal senza salvare, le modifiche non ancora scritte vengono perse
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _replay_journal(self, data, journal_path):
+        try:
+            with open(journal_path, 'rb') as o:
+                lines = o.readlines()
+        except FileNotFoundError:
+            return False
+
+        replayed = 0
+        valid_size = 0
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except (json.decoder.JSONDecodeError, UnicodeDecodeError) as e:
+                # l'ultimo record può essere incompleto se il software è stato interrotto durante la scrittura: lo elimino,
+                # altrimenti i record scritti successivamente verrebbero accodati alla riga incompleta
+                logging.warning('Truncated record found replaying journal ({}): {}. Ignoring the rest of the journal.'.format(journal_path, e))
+                if not self._read_only:
+                    os.truncate(journal_path, valid_size)
+                break
+
+            valid_size += len(line)
+
+            try:
+                self._apply(data, record)
+                replayed += 1
+            except (KeyError, TypeError) as e:
+                logging.warning('Invalid record found replaying journal ({}): {}. Skipping it.'.format(journal_path, e))
+
+        if replayed > 0:
+            logging.info('Replayed {} records from journal ({})'.format(replayed, journal_path))
+
+        # il file principale non contiene le modifiche riapplicate
+        return replayed > 0
+
+    @staticmethod
+    def _apply(data, record):
+        path = record['path']
+
+        node = data
+        for key in path[:-1]:
+            node = node[key]
+
+        if record['op'] == 'set':
+            node[path[-1]] = record['value']
+        elif record['op'] == 'delete':
+            node.pop(path[-1], None)
+        elif record['op'] == 'reorder':
+            node = node[path[-1]]
+            items = ordered_items(node, record['keys'])
+            node.clear()
+            node.update(items)
+        else:
+            raise KeyError(record['op'])
+
+    def _read_file(self):
+        # None se il file non esiste o è vuoto, il file non viene mai creato dalla lettura
+        try:
+            with open(self.filename, 'rb') as o:
+                content = o.read()
+        except FileNotFoundError:
+            return None
+
+        if len(content) == 0:
+            return None
+
+        return json_loads(content)
+
+    def _serialize(self, data):
+        return json.dumps(data, indent=4)
+
+    def _write(self, data, tracker):
+        try:
+            # la serializzazione avviene nel thread di salvataggio
+            write_atomic(self.filename, self._serialize(data))
+        except OSError:
+            # il file non è stato scritto, verrà riscritto interamente al prossimo salvataggio
+            tracker.mark(())
+            raise
+
+        logging.debug("Written save file ({})".format(self.filename))
+
+    def _compact(self, data, tracker, wait=False):
+        # riscrive il file principale con lo stato corrente e svuota il journal. Il journal corrente viene messo da parte e
+        # ne viene iniziato uno nuovo, in modo che le modifiche successive alla copia dei dati non vengano perse; quello
+        # messo da parte viene eliminato solo dopo che il nuovo file principale è stato scritto. I record del journal sono
+        # idempotenti, quindi se l'interruzione avviene prima della sua eliminazione riapplicarli non causa problemi
+        if not self._worker.is_idle():
+            if not wait:
+                logging.info("Save file ({}) compaction already in progress.".format(self.filename))
+                return
+
+            if not self._worker.wait(self.compaction_wait_timeout):
+                # la scrittura precedente è bloccata (es. disco lento): le modifiche restano nel journal, che verrà
+                # compattato alla prossima occasione
+                logging.warning("Timeout waiting for save file ({}) previous write, compaction skipped.".format(self.filename))
+                return
+
+        compacting_path = self._compacting_journal_path()
+
+        self._journal.close()
+        if os.path.exists(compacting_path):
+            # una compattazione precedente non è stata completata, accodo il journal corrente a quello messo da parte
+            with open(self._journal_path, 'rb') as src, open(compacting_path, 'ab') as dst:
+                dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+        else:
+            os.replace(self._journal_path, compacting_path)
+        self._journal = open(self._journal_path, 'w')
+
+        data_copy = snapshot(data)
+        tracker.clear()
+
+        def job():
+            self._write(data_copy, tracker)
+            os.remove(compacting_path)
+            logging.info("Compacted journal into save file ({})...".format(self.filename))
+
+        self._worker.submit(job)
+
+    def _compacting_journal_path(self):
+        return self._journal_path + '.compacting'
+
+
+class BinaryBackend(JsonBackend):
+    # salvataggio dei task nel formato binario di SavefilesBinary, letto tramite mmap. Journal, compattazione e
+    # scrittura in background sono gli stessi del backend json; se il file binario non esiste ancora i dati vengono
+    # importati (una sola volta) dal file json
+
+    def __init__(self, filename, journal, import_from, read_only=False):
+        super().__init__(filename, journal, read_only)
+        self._import_from = import_from
+
+    def load(self):
+        importing = not os.path.exists(self.filename)
+        data, stale = super().load()
+
+        if self.load_error is not None and importing:
+            # il file danneggiato è quello json da cui importare i dati
+            self.load_error_filename = self._import_from.filename
+
+        # i dati importati vanno scritti nel file binario al prossimo salvataggio
+        return data, stale or (importing and data is not None)
+
+    def _read_file(self):
+        if not os.path.exists(self.filename):
+            logging.info('Importing savefile ({}) into binary savefile ({})'.format(self._import_from.filename, self.filename))
+            data, _ = self._import_from.load()
+
+            # il file json non esiste o è vuoto, vengono usati i dati di default
+            if data is None and self._import_from.load_error is not None:
+                raise ValueError('invalid savefile to import ({})'.format(self._import_from.filename))
+
+            return data
+
+        with SavefilesBinary.TasksFileReader(self.filename) as reader:
+            return reader.to_dict()
+
+    def _serialize(self, data):
+        return SavefilesBinary.encode(data)
+
+
+def binary_filename(filename):
+    # file binario dei task corrispondente al file json
+    return os.path.splitext(filename)[0] + SavefilesBinary.file_extension
+
+
+def export_binary_savefile(filename, journal):
+    # tornando al backend json dopo aver usato quello binario, il file json dei task viene riscritto con i dati del file
+    # binario (e del suo journal), altrimenti verrebbe caricato il file json non più aggiornato. Il file binario viene
+    # poi messo da parte, in modo che tornando al backend binario i dati vengano importati di nuovo dal file json
+    binary = binary_filename(filename)
+
+    # il file binario viene scritto alla prima compattazione, fino ad allora le modifiche sono solo nel suo journal
+    if not os.path.exists(binary) and not os.path.exists(binary + '.journal'):
+        return
+
+    backend = BinaryBackend(binary, journal, JsonBackend(filename, journal, read_only=True), read_only=True)
+    data, _ = backend.load()
+
+    if data is None:
+        logging.error('Unable to export binary savefile ({}) to json, the json savefile ({}) may be out of date: {}'.format(binary, filename, backend.load_error))
+        return
+
+    # il journal json è già compreso nei dati del file binario, e riapplicato al nuovo file annullerebbe le modifiche
+    # successive: viene eliminato prima della scrittura (se questa non viene completata, l'esportazione viene ripetuta)
+    for path in (filename + '.journal', filename + '.journal.compacting'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    write_atomic(filename, json.dumps(data, indent=4))
+
+    for path in (binary + '.journal', binary + '.journal.compacting'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    if os.path.exists(binary):
+        os.replace(binary, binary + '.exported')
+
+    logging.info('Exported binary savefile ({}) to json savefile ({})'.format(binary, filename))
+
+
 class SaveFile(object):
+    # file di salvataggio: i dati sono mantenuti in memoria come FlushFlagDict, che registrano i percorsi modificati, e
+    # vengono resi persistenti dal backend scelto (file json oppure database sqlite)
 
     _data = None
-    _file = None
-    _flushed = None
+    _tracker = None
+    _backend = None
+
+    _read_only = False
+
+    # report (vedi Migration.migrate) delle migrazioni simulate con dry_run, None se non è stata simulata nessuna migrazione
+    migration_report = None
+    # i dati sono quelli di default (file non ancora creato o non valido)
+    default_loaded = False
 
-    _filetypes_migrations = {
-        'config': (SavefilesMigrations.ConfigMigrations, Globals.config_file_version),
-        'tasks': (SavefilesMigrations.TasksMigrations, Globals.tasks_file_version)
-    }
+    def __init__(self, filename, filetype, default=None, journal=False, backend='json', read_only=False, migration_resources=None, dry_run=False):
+        # migration_resources: risorse esterne usate dalle migrazioni (es. il notes store), in sola lettura non vengono
+        # modificate. Con dry_run le migrazioni vengono solo simulate (il file viene aperto in sola lettura e i dati
+        # rimangono alla versione del file)
+        if dry_run:
+            read_only = True
 
-    def __init__(self, filename, filetype, default=None):
-        if filetype not in self._filetypes_migrations:
+        if filetype not in SavefilesMigrations.registry:
             raise ValueError("The specified filetype does not exist ({})".format(filetype))
 
-        self._file = open(filename, 'a+')
-        self._file.seek(0)
+        self._read_only = read_only
 
-        self._flushed = UncopiableList([True])
+        # i file json da cui importare i dati vengono solo letti (il loro journal viene riapplicato ma non aperto in scrittura)
+        if backend == 'json':
+            if filetype == 'tasks' and not read_only:
+                export_binary_savefile(filename, journal)
 
-        try:
-            self._data = json.loads(self._file.read(), object_hook=self._object_hook)
-            # resetta la flag, che potrebbe essere stata modificata durante il caricamento in memoria dei dati
-            self._flushed[0] = True
-            # applica le migrazioni al file, nel caso che una versione precedente del software stesse usando un versione precedente del file di salvataggio
-            mig = self._filetypes_migrations[filetype]
-            self._data = mig[0]().migrate(self._data['version'], mig[1], self._data)
-        except json.decoder.JSONDecodeError as e:
-            logging.warning('Exception occurred loading config file ({}): {}. Using default.'.format(self._file.name, e))
-
-            if default is None:
-                self._data = {}
-            else:
-                self._data = self._convert_default(default)
-
-            # setto a false la flag, poichè il file non era valido, in modo che venga scritto al prossimo salvataggio
-            self._flushed[0] = False
-
-    def save(self):
-        if not self._flushed[0]:
-            self._file.seek(0)
-            self._file.truncate()
-            self._file.write(json.dumps(self._data, indent=4))
-            self._file.flush()
-            self._flushed[0] = True
-            logging.info("Flushing save file ({})...".format(self._file.name))
+            self._backend = JsonBackend(filename, journal, read_only)
+        elif backend == 'binary' and filetype == 'tasks':
+            self._backend = BinaryBackend(binary_filename(filename), journal, JsonBackend(filename, journal, read_only=True), read_only)
+        elif backend == 'binary':
+            # il formato binario esiste solo per i task, gli altri file rimangono in json
+            self._backend = JsonBackend(filename, journal, read_only)
+        elif backend == 'sqlite':
+            # il file json viene importato nel database solo al primo avvio
+            self._backend = SavefilesSqlite.SqliteBackend(os.path.join(os.path.dirname(filename), Globals.sqlite_file_name), filetype, JsonBackend(filename, journal, read_only=True), read_only)
         else:
-            logging.info("Save file ({}) nothing to flush.".format(self._file.name))
+            raise ValueError("The specified backend does not exist ({})".format(backend))
+
+        self._tracker = ChangeTracker()
+
+        data, stale = self._backend.load()
+
+        if data is None:
+            # il file non era valido, viene scritto interamente al prossimo salvataggio
+            # i default non devono essere modificati (es. dalle migrazioni o dalle modifiche ai task di esempio)
+            data = {} if default is None else copy.deepcopy(default)
+            stale = True
+            self.default_loaded = True
+
+        mig = SavefilesMigrations.registry[filetype]
+        migrated = False
+
+        if migration_resources is not None and read_only:
+            migration_resources = {k: v.read_only_view() for k, v in migration_resources.items()}
+
+        if 'version' in data and data['version'] != mig.version:
+            # applica le migrazioni al file, nel caso che una versione precedente del software stesse usando un versione precedente del file di salvataggio.
+            # Le migrazioni lavorano sui dati non ancora convertiti in FlushFlagDict
+            if dry_run:
+                self.migration_report = mig.migrate(data['version'], mig.version, data, dry_run=True, resources=migration_resources)
+            else:
+                data = mig.migrate(data['version'], mig.version, data, resources=migration_resources)
+                stale = True
+                migrated = True
+
+        self._data = FlushFlagDict.wrap(data, self._tracker)
 
-    def _object_hook(self, e):
-        if isinstance(e, dict):
-            ffd = FlushFlagDict(flush_flag=self._flushed)
-            ffd.update(e)
-            return ffd
+        if stale:
+            # segno come modificato l'intero file, poichè non era valido o non era aggiornato, in modo che venga scritto
+            # al prossimo salvataggio
+            self._tracker.mark(())
+
+        if read_only:
+            return
+
+        if self.load_error is not None:
+            # i dati di default non sostituiscono il file danneggiato finchè non viene salvato (es. dopo la scelta di non
+            # ripristinarlo da uno snapshot), il file intero resta segnato come modificato
+            return
+
+        if migrated:
+            # i dati migrati vengono riscritti subito nel file principale: se i record scritti nel journal dopo la
+            # migrazione venissero riapplicati al file non migrato, la migrazione verrebbe ripetuta sopra di essi
+            self._backend.save(self._data, self._tracker, compact=True)
+            self._backend.wait()
         else:
-            raise ValueError("L'oggetto passato ({}) non è di un tipo permesso ({}).".format(e, type(e)))
+            # i backend che salvano le modifiche in modo incrementale rendono subito persistenti gli import
+            self._backend.sync(self._data, self._tracker)
 
-    def _convert_default(self, o):
-        if isinstance(o, dict):
-            ffd = FlushFlagDict(flush_flag=self._flushed)
-            ffd.update({k: self._convert_default(o[k]) for k in o})
-            return ffd
+    def save(self, compact=False):
+        if self._read_only:
+            raise ValueError("The save file has been opened read only")
 
-        # elif isinstance(o, list):
-        #     ffl = FlushFlagList(flush_flag=self.__flushed)
-        #     ffl += [self.__convert_default(e) for e in o]
-        #     return ffl
+        self._backend.save(self._data, self._tracker, compact)
+
+    def wait(self, timeout=None):
+        # attende che le scritture in corso siano terminate, ritorna False se il timeout scade prima
+        return self._backend.wait(timeout)
+
+    @property
+    def filename(self):
+        # file principale del backend (es. il database per il backend sqlite)
+        return self._backend.filename
+
+    @property
+    def load_error(self):
+        # errore che ha impedito di caricare il file esistente (i dati sono quindi quelli di default), None se caricato
+        return self._backend.load_error
+
+    @property
+    def load_error_filename(self):
+        # file che non è stato possibile caricare (es. il file json da importare nel database), da ripristinare
+        return self._backend.load_error_filename
+
+    def close(self):
+        self._backend.close()
 
-        return o
+    def dirty_paths(self):
+        # percorsi modificati e non ancora salvati
+        return set(self._tracker.paths)
+
+    def dirty_sections(self):
+        return self._tracker.sections()
+
+    def is_dirty(self, *path):
+        return self._tracker.is_dirty(path)
+
+    # modifiche registrate singolarmente (nel journal per il backend json, riga per riga per il backend sqlite)
+
+    def set(self, path, value):
+        self._node(path)[path[-1]] = value
+        self._backend.record({'op': 'set', 'path': list(path), 'value': value})
+
+    def delete(self, path):
+        self._node(path).pop(path[-1], None)
+        self._backend.record({'op': 'delete', 'path': list(path)})
+
+    def reorder(self, path, keys):
+        # riordina le chiavi di un dizionario, le chiavi non presenti in keys vengono mantenute in fondo
+        self._node(path + (None,)).reorder(keys)
+        self._backend.record({'op': 'reorder', 'path': list(path), 'keys': list(keys)})
+
+    def sync_journal(self):
+        # rende persistenti le modifiche registrate dall'ultima chiamata
+        self._backend.sync(self._data, self._tracker)
+
+    def _node(self, path):
+        # ritorna il dizionario che contiene l'ultimo elemento del percorso
+        node = self._data
+        for key in path[:-1]:
+            node = node[key]
+
+        return node
 
     def __getitem__(self, index):
         return self._data[index]
 
+    def __contains__(self, key):
+        return key in self._data
+
     def __setitem__(self, key, value):
         self._data[key] = value
-        self._flushed[0] = False
 
     def __repr__(self):
         return repr(self._data)
@@ -0,0 +1,246 @@
+import json
+import mmap
+import struct
+
+# formato binario del file dei task (tasks.bin):
+#
+#   header          vedi _header, contiene la versione del formato e gli offset delle sezioni successive
+#   task records    un record a larghezza fissa per ogni task (vedi _record), nell'ordine della lista
+#   string index    string_count + 1 offset (uint64) delle stringhe all'interno dei dati delle stringhe
+#   string data     stringhe utf-8 senza separatori, ogni stringa (nomi, ticket, gruppi, note...) compare una sola volta
+#   documents       json delle altre sezioni del file (es. version)
+#
+# I record fanno riferimento alle stringhe tramite il loro indice, le stringhe vengono decodificate solo quando lette
+
+file_extension = '.bin'
+
+magic = b'FSTKTSK\x00'
+# versione del formato del contenitore, indipendente dalla versione dei dati (tasks_file_version) salvata nei documents
+container_version = 2
+
+_header = struct.Struct('<8sHHII4Q')
+# record per ogni versione del formato
+_records = {
+    # id, name, ticket, elapsed_time, color_group, ticket_title, notes, extra (json dei campi senza colonna dedicata)
+    1: struct.Struct('<IIIqIIII'),
+    # id, name, ticket, elapsed_time, color_group, ticket_title, notes_ref, notes_preview, extra
+    2: struct.Struct('<IIIqIIIII')
+}
+_record = _records[container_version]
+_offset = struct.Struct('<Q')
+
+# indice di stringa che rappresenta None
+_none = 0xFFFFFFFF
+
+_tasks_section = 'current_tasks'
+_task_fields = ('name', 'ticket', 'elapsed_time', 'color_group', 'ticket_title', 'notes_ref', 'notes_preview')
+
+
+class BinaryFormatError(ValueError):
+    pass
+
+
+def encode(data):
+    strings = []
+    string_ids = {}
+
+    def string_id(s):
+        if s is None:
+            return _none
+
+        if s not in string_ids:
+            string_ids[s] = len(strings)
+            strings.append(s)
+
+        return string_ids[s]
+
+    records = bytearray()
+    tasks = data.get(_tasks_section, {})
+
+    for key, task in tasks.items():
+        extra = {k: v for k, v in task.items() if k not in _task_fields}
+
+        records += _record.pack(
+            int(key),
+            string_id(task['name']),
+            string_id(task['ticket']),
+            task['elapsed_time'],
+            string_id(task['color_group']),
+            string_id(task['ticket_title']),
+            string_id(task.get('notes_ref', '')),
+            string_id(task.get('notes_preview', '')),
+            string_id(json.dumps(extra) if len(extra) > 0 else None)
+        )
+
+    encoded = [s.encode('utf-8') for s in strings]
+
+    string_index = bytearray()
+    position = 0
+    for e in encoded + [b'']:
+        string_index += _offset.pack(position)
+        position += len(e)
+
+    records_offset = _header.size
+    string_index_offset = records_offset + len(records)
+    string_data_offset = string_index_offset + len(string_index)
+    documents_offset = string_data_offset + position
+
+    documents = json.dumps({k: v for k, v in data.items() if k != _tasks_section}).encode('utf-8')
+
+    header = _header.pack(magic, container_version, 0, len(tasks), len(strings), records_offset, string_index_offset, string_data_offset, documents_offset)
+
+    return b''.join([header, bytes(records), bytes(string_index)] + encoded + [documents])
+
+
+class TasksFileReader(object):
+    # lettura del file binario tramite mmap: i record e le stringhe vengono decodificati solo quando richiesti
+
+    _file = None
+    _map = None
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap di un file vuoto
+            self.close()
+            raise BinaryFormatError('Empty binary savefile ({})'.format(filename))
+
+        if len(self._map) < _header.size:
+            self.close()
+            raise BinaryFormatError('Truncated binary savefile ({})'.format(filename))
+
+        header = _header.unpack_from(self._map, 0)
+
+        if header[0] != magic:
+            self.close()
+            raise BinaryFormatError('Not a binary savefile ({})'.format(filename))
+
+        if header[1] not in self._decoders:
+            self.close()
+            raise BinaryFormatError('Unsupported binary savefile version {} ({})'.format(header[1], filename))
+
+        self.version = header[1]
+        self._record = _records[self.version]
+        self._task_count, self._string_count = header[3], header[4]
+        self._records_offset, self._string_index_offset, self._string_data_offset, self._documents_offset = header[5:9]
+        self._strings = {}
+
+    def __len__(self):
+        return self._task_count
+
+    def string(self, i):
+        if i == _none:
+            return None
+
+        s = self._strings.get(i)
+
+        if s is None:
+            start, end = struct.unpack_from('<QQ', self._map, self._string_index_offset + i * _offset.size)
+            s = self._map[self._string_data_offset + start:self._string_data_offset + end].decode('utf-8')
+            self._strings[i] = s
+
+        return s
+
+    def task(self, row):
+        # ritorna la chiave e il dizionario del task alla riga indicata
+        if not 0 <= row < self._task_count:
+            raise IndexError(row)
+
+        return self._decoders[self.version](self._record.unpack_from(self._map, self._records_offset + row * self._record.size), self.string)
+
+    def tasks(self):
+        for row in range(self._task_count):
+            yield self.task(row)
+
+    def documents(self):
+        return json.loads(self._map[self._documents_offset:].decode('utf-8'))
+
+    def to_dict(self):
+        # decodifica completa: le stringhe vengono decodificate tutte insieme e i record scorsi in blocco, invece di
+        # leggere ogni elemento singolarmente
+        offsets = struct.unpack_from('<{}Q'.format(self._string_count + 1), self._map, self._string_index_offset)
+        string_data = self._map[self._string_data_offset:self._documents_offset]
+        strings = [string_data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self._string_count)]
+
+        def string(i):
+            return None if i == _none else strings[i]
+
+        decode = self._decoders[self.version]
+        records = self._map[self._records_offset:self._records_offset + self._task_count * self._record.size]
+
+        data = self.documents()
+        data[_tasks_section] = dict(decode(record, string) for record in self._record.iter_unpack(records))
+
+        return data
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _decode_v1(record, string):
+        task_id, name, ticket, elapsed_time, color_group, ticket_title, notes, extra = record
+
+        task = {
+            'name': string(name),
+            'ticket': string(ticket),
+            'elapsed_time': elapsed_time,
+            'color_group': string(color_group),
+            'ticket_title': string(ticket_title),
+            'notes': string(notes)
+        }
+
+        if extra != _none:
+            task.update(json.loads(string(extra)))
+
+        return str(task_id), task
+
+    @staticmethod
+    def _decode_v2(record, string):
+        task_id, name, ticket, elapsed_time, color_group, ticket_title, notes_ref, notes_preview, extra = record
+
+        task = {
+            'name': string(name),
+            'ticket': string(ticket),
+            'elapsed_time': elapsed_time,
+            'color_group': string(color_group),
+            'ticket_title': string(ticket_title),
+            'notes_ref': string(notes_ref),
+            'notes_preview': string(notes_preview)
+        }
+
+        if extra != _none:
+            task.update(json.loads(string(extra)))
+
+        return str(task_id), task
+
+    # funzioni di decodifica dei record per ogni versione del formato
+    _decoders = {
+        1: _decode_v1.__func__,
+        2: _decode_v2.__func__
+    }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def to_json(filename, json_filename):
+    # esporta il file binario in json (es. per debug), senza il suo journal. I task vengono decodificati uno alla volta
+    with TasksFileReader(filename) as reader:
+        data = reader.documents()
+        data[_tasks_section] = dict(reader.tasks())
+
+    with open(json_filename, 'w') as o:
+        o.write(json.dumps(data, indent=4))
+
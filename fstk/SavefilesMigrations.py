@@ -1,47 +1,174 @@
-import copy
+import argparse
+import inspect
 import logging
+import os
+import re
+import time
+import tracemalloc
+from collections.abc import MutableMapping
+
+from fstk import Globals
+from fstk.NotesStore import NotesStore
+from fstk.TaskArchive import TaskArchive
 
 
 class MigrationError(Exception):
     pass
 
+class UndoLogDict(MutableMapping):
+    # vista su un dizionario che, prima di ogni modifica, registra nel log condiviso il valore sovrascritto. Le migrazioni
+    # modificano quindi i dati originali senza copiarli, e in caso di errore il log permette di annullare le modifiche.
+    # Le liste vengono copiate alla prima lettura, le modifiche a dizionari contenuti in liste non vengono registrate
+
+    def __init__(self, d, log):
+        self._d = d
+        self._log = log
+
+    def __getitem__(self, key):
+        value = self._d[key]
+
+        if isinstance(value, dict):
+            return UndoLogDict(value, self._log)
+        elif isinstance(value, list):
+            self._save(key)
+
+        return value
+
+    def __setitem__(self, key, value):
+        self._save(key)
+        self._d[key] = value._d if isinstance(value, UndoLogDict) else value
+
+    def __delitem__(self, key):
+        self._save(key)
+        del self._d[key]
+
+    def __iter__(self):
+        return iter(self._d)
+
+    def __len__(self):
+        return len(self._d)
+
+    def _save(self, key):
+        old = self._d.get(key)
+        self._log.append((self._d, key, key in self._d, list(old) if isinstance(old, list) else old))
+
+    @staticmethod
+    def rollback(log):
+        # ripristina i valori registrati, dal più recente al più vecchio
+        for d, key, existed, old in reversed(log):
+            if existed:
+                d[key] = old
+            else:
+                d.pop(key, None)
+
+        log.clear()
+
 class Migration(object):
-    # applica le funzioni di migrazione in sequenza, in modo da convertire i dati da un formato a quello successivo
-    def _migrate(self, filetype, from_, to, d):
+    # applica le funzioni di migrazione in sequenza, in modo da convertire i dati da un formato a quello successivo.
+    # Le funzioni di migrazione (_migrate_<i>_<i+1>) vengono raccolte e validate una sola volta, alla creazione del
+    # registro in fondo al modulo. Le funzioni che hanno bisogno di risorse esterne (es. il notes store) le dichiarano
+    # come parametri dopo i dati, e le ricevono dai resources passati a migrate
+
+    filetype = None
+
+    def __init__(self, version):
+        # versione corrente del file di salvataggio
+        self.version = version
+        # versione di partenza -> funzione di migrazione alla versione successiva
+        self._steps = {}
+        # versione di partenza -> nomi delle risorse richieste dalla funzione di migrazione
+        self._resources = {}
+
+        for name in dir(type(self)):
+            m = re.fullmatch(r'_migrate_(\d+)_(\d+)', name)
+            if m is None:
+                continue
+
+            i, j = int(m.group(1)), int(m.group(2))
+            if j != i + 1:
+                raise MigrationError("Invalid {} savefile migration {}: each migration must go to the next version".format(self.filetype, name))
+
+            self._steps[i] = getattr(type(self), name)
+            self._resources[i] = tuple(inspect.signature(self._steps[i]).parameters)[2:]
+
+        missing = [v for v in range(1, version) if v not in self._steps]
+        if len(missing) > 0:
+            raise MigrationError("Missing {} savefile migrations from versions {} (current version: {})".format(self.filetype, missing, version))
+
+        beyond = [v for v in self._steps if v >= version]
+        if len(beyond) > 0:
+            raise MigrationError("{} savefile migrations from versions {} go beyond the current version ({})".format(self.filetype, beyond, version))
+
+    def migrate(self, from_, to, d, dry_run=False, resources=None):
+        # applica le migrazioni direttamente su d. In caso di errore le modifiche vengono annullate, d rimane invariato e
+        # viene sollevata MigrationError. Con dry_run=True le modifiche vengono sempre annullate e viene ritornato un
+        # report con tempo e picco di memoria di ogni migrazione
         if to < from_:
-            logging.error("Tryed to migrate {} savefile from higher version ({}) to lower version ({})".format(filetype, from_, to))
-            raise MigrationError("Can't migrate {} savefile from higher version ({}) to lower version ({})".format(filetype, from_, to))
+            logging.error("Tryed to migrate {} savefile from higher version ({}) to lower version ({})".format(self.filetype, from_, to))
+            raise MigrationError("Can't migrate {} savefile from higher version ({}) to lower version ({})".format(self.filetype, from_, to))
+
+        if from_ not in self._steps and from_ != to:
+            raise MigrationError("Can't migrate {} savefile from unknown version {}".format(self.filetype, from_))
+
+        resources = {} if resources is None else resources
+
+        missing = {r for i in range(from_, to) for r in self._resources[i] if r not in resources}
+        if len(missing) > 0:
+            raise MigrationError("Can't migrate {} savefile from version {} to version {}: missing resources {}".format(self.filetype, from_, to, sorted(missing)))
+
+        if dry_run:
+            # l'undo log annulla solo le modifiche ai dati, le risorse non devono modificare nessun file
+            resources = {k: v.read_only_view() for k, v in resources.items()}
+
+        report = []
 
         # nulla da fare, siamo già alla versione corretta
         if from_ == to:
-            logging.debug("Nothing to migrate for {} savefile. Current version: {}".format(filetype, to))
-            return d
+            logging.debug("Nothing to migrate for {} savefile. Current version: {}".format(self.filetype, to))
+            return report if dry_run else d
 
-        tmp = copy.deepcopy(d)
-        for i, j in zip(range(from_, to+1), range(from_+1, to+1)):
-            # ottiene la funzione di migrazione
-            f = getattr(self, '_migrate_{}_{}'.format(i, j), None)
+        log = []
+        view = UndoLogDict(d, log)
 
-            if f is None:
-                logging.error("Missing {} savefile migrating version ({}) from version ({})".format(filetype, i, j))
-                raise MigrationError("Missing {} savefile migrating from version {} to version {}".format(filetype, i, j))
-            # applica la funzione di migrazione
-            success, message = f(tmp)
+        for i in range(from_, to):
+            if dry_run:
+                tracemalloc.start()
+
+            start = time.perf_counter()
+            try:
+                # applica la funzione di migrazione
+                success, message = self._steps[i](self, view, **{r: resources[r] for r in self._resources[i]})
+            except Exception as e:
+                success, message = False, '{}: {}'.format(type(e).__name__, e)
+            elapsed = time.perf_counter() - start
+
+            if dry_run:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                report.append((i, i + 1, elapsed, peak))
 
             if not success:
-                logging.error("Error migrating {} savefile from version {} to version {}: {}".format(filetype, i, j, message))
-                raise MigrationError("Error migrating {} savefile from version {} to version {}: {}".format(filetype, i, j, message))
+                UndoLogDict.rollback(log)
+                logging.error("Error migrating {} savefile from version {} to version {}: {}".format(self.filetype, i, i + 1, message))
+                raise MigrationError("Error migrating {} savefile from version {} to version {}: {}".format(self.filetype, i, i + 1, message))
             else:
-                logging.info("Successfully migrated {} savefile from version {} to version {}".format(filetype, i, j))
+                logging.info("Successfully migrated {} savefile from version {} to version {} ({:.1f} ms)".format(self.filetype, i, i + 1, elapsed * 1000))
+
+        if dry_run:
+            UndoLogDict.rollback(log)
+
+            for i, j, elapsed, peak in report:
+                logging.info("Dry run of {} savefile migration from version {} to version {}: {:.1f} ms, {:.1f} KiB peak memory".format(self.filetype, i, j, elapsed * 1000, peak / 1024))
+
+            return report
 
-        tmp['version'] = to
-        return tmp
+        d['version'] = to
+        return d
 
 
 class ConfigMigrations(Migration):
 
-    def migrate(self, from_, to, d):
-        return super()._migrate('config', from_, to, d)
+    filetype = 'config'
 
     def _migrate_1_2(self, d):
         d['window']['w'] = 460
@@ -110,11 +237,16 @@ class ConfigMigrations(Migration):
 
         return True, None
 
+    def _migrate_7_8(self, d):
+        d['stats']['task_archived'] = 0
+        d['stats']['task_restored'] = 0
+
+        return True, None
+
 
 class TasksMigrations(Migration):
 
-    def migrate(self, from_, to, d):
-        return super()._migrate('tasks', from_, to, d)
+    filetype = 'tasks'
 
     def _migrate_1_2(self, d):
         for t in d['current_tasks']:
@@ -134,3 +266,76 @@ class TasksMigrations(Migration):
 
         return True, None
 
+    def _migrate_4_5(self, d, notes_store):
+        # le note vengono spostate nel notes store, nel file dei task rimangono il riferimento e l'anteprima. La migrazione
+        # può essere applicata a task già migrati (es. riscritti dal journal sopra un file principale ancora alla
+        # versione 4): i loro riferimenti non vengono toccati
+        for t in d['current_tasks']:
+            task = d['current_tasks'][t]
+
+            if 'notes_ref' not in task:
+                notes = task.get('notes', '')
+
+                # il testo viene rimosso dal task solo dopo essere stato salvato nel notes store
+                task['notes_ref'] = notes_store.put(notes)
+                task['notes_preview'] = NotesStore.preview(notes)
+            elif 'notes_preview' not in task:
+                task['notes_preview'] = NotesStore.preview(notes_store.get(task['notes_ref']))
+
+            if 'notes' in task:
+                del task['notes']
+
+        return True, None
+
+    def _migrate_5_6(self, d, task_archive):
+        # id da assegnare al prossimo task, salvato in modo che gli id dei task eliminati non vengano riassegnati. Anche
+        # i task archiviati possono avere l'id più alto
+        ids = [int(t) for t in d['current_tasks']] + list(task_archive.tasks())
+        d['next_task_id'] = max(ids) + 1 if len(ids) > 0 else 0
+
+        return True, None
+
+
+# registro delle migrazioni per ogni tipo di file, creato (e validato) una sola volta all'import del modulo
+registry = {
+    'config': ConfigMigrations(Globals.config_file_version),
+    'tasks': TasksMigrations(Globals.tasks_file_version)
+}
+
+
+def main(argv):
+    # entry point senza interfaccia grafica: python -m fstk check-migrations. Simula le migrazioni dei file di
+    # salvataggio (con dry_run, quindi senza modificare nessun file) e stampa tempo e picco di memoria di ognuna
+    argparse.ArgumentParser(prog='python -m fstk check-migrations', description='Check that the save files can be migrated to the current version, without modifying them.').parse_args(argv)
+
+    # import qui per evitare un import circolare, SaveFiles usa il registro delle migrazioni
+    from fstk.SaveFiles import SaveFile
+
+    resources = {
+        'notes_store': NotesStore(os.path.join(Globals.config_folder, Globals.notes_folder_name), read_only=True),
+        'task_archive': TaskArchive(os.path.join(Globals.config_folder, Globals.archive_folder_name))
+    }
+    failed = False
+
+    for filetype, filename, journal in (('config', Globals.config_file_name, False), ('tasks', Globals.tasks_file_name, True)):
+        try:
+            saved = SaveFile(os.path.join(Globals.config_folder, filename), filetype=filetype, journal=journal, backend=Globals.storage_backend, migration_resources=resources, dry_run=True)
+        except MigrationError as e:
+            print('{}: {}'.format(filetype, e))
+            failed = True
+            continue
+
+        if saved.load_error is not None:
+            print('{}: unable to load the save file ({})'.format(filetype, saved.load_error))
+            failed = True
+        elif 'version' not in saved:
+            print('{}: save file not found'.format(filetype))
+        elif saved.migration_report is None:
+            print('{}: up to date (version {})'.format(filetype, saved['version']))
+        else:
+            for i, j, elapsed, peak in saved.migration_report:
+                print('{}: version {} -> {}: {:.1f} ms, {:.1f} KiB peak memory'.format(filetype, i, j, elapsed * 1000, peak / 1024))
+
+        saved.close()
+
+    return 1 if failed else 0
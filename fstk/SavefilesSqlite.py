@@ -0,0 +1,322 @@
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import time
+
+
+def connect_read_only(filename):
+    # connessione che non può modificare il database (nè crearlo se non esiste)
+    return sqlite3.connect(pathlib.Path(os.path.abspath(filename)).as_uri() + '?mode=ro', uri=True)
+
+
+def connect(filename):
+    # connessione in scrittura, crea il database (e le tabelle) se non esiste
+    db = sqlite3.connect(filename)
+
+    try:
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=FULL')
+        db.executescript(SqliteBackend._schema)
+    except sqlite3.DatabaseError:
+        db.close()
+        raise
+
+    return db
+
+
+def replace_damaged_database(filename, error):
+    # elimina il database danneggiato (insieme ai file del WAL) e ne crea uno nuovo. Va usato solo dopo che è stato
+    # possibile conservarne una copia o ripristinarlo da uno snapshot (vedi MainWindow.open_save_file)
+    logging.warning('Replacing damaged database ({}): {}'.format(filename, error))
+
+    for path in (filename, filename + '-wal', filename + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    return connect(filename)
+
+
+class SqliteBackend(object):
+    # salvataggio su database sqlite (in modalità WAL), condiviso da tutti i tipi di file di salvataggio. I task sono
+    # salvati come righe della tabella tasks (le note, prima del notes store, nella tabella notes), le altre sezioni come documenti json. Ad ogni
+    # sincronizzazione vengono scritte, in una sola transazione, solo le righe corrispondenti ai percorsi modificati
+
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS documents (
+            filetype TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (filetype, key)
+        );
+
+        CREATE TABLE IF NOT EXISTS imports (
+            filetype TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            imported_at REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            ticket TEXT NOT NULL,
+            elapsed_time INTEGER NOT NULL,
+            color_group TEXT NOT NULL,
+            ticket_title TEXT,
+            extra TEXT
+        );
+        CREATE INDEX IF NOT EXISTS tasks_position ON tasks (position);
+        CREATE INDEX IF NOT EXISTS tasks_ticket ON tasks (ticket);
+
+        CREATE TABLE IF NOT EXISTS notes (
+            task_id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS time_segments (
+            id INTEGER PRIMARY KEY,
+            task_id INTEGER NOT NULL,
+            ticket TEXT NOT NULL,
+            color_group TEXT NOT NULL,
+            start REAL NOT NULL,
+            seconds INTEGER NOT NULL,
+            kind TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS time_segments_start ON time_segments (start);
+        CREATE INDEX IF NOT EXISTS time_segments_ticket ON time_segments (ticket, start);
+        CREATE INDEX IF NOT EXISTS time_segments_task ON time_segments (task_id, start);
+    '''
+
+    # campi dei task salvati in colonne dedicate, tutti gli altri finiscono nella colonna extra (json)
+    _task_columns = ('name', 'ticket', 'elapsed_time', 'color_group', 'ticket_title')
+
+    # sezione del file dei task salvata nella tabella tasks
+    _tasks_section = 'current_tasks'
+
+    _db = None
+    _importing = False
+
+    # errore che ha impedito di caricare i dati (database danneggiato o file json da importare non valido), e file che
+    # non è stato possibile caricare
+    load_error = None
+    load_error_filename = None
+
+    def __init__(self, filename, filetype, import_from, read_only=False):
+        self.filename = filename
+        self._filetype = filetype
+        # backend da cui importare i dati se il database non li contiene ancora
+        self._import_from = import_from
+        self._read_only = read_only
+
+    def load(self):
+        try:
+            return self._load()
+        except sqlite3.DatabaseError as e:
+            # database danneggiato: vengono usati i dati di default, il database viene sostituito solo alla prima
+            # scrittura (vedi sync), dopo che è stato possibile conservarne una copia o ripristinarlo da uno snapshot
+            logging.error('Unable to load {} savefile from database ({}): {}. Using default.'.format(self._filetype, self.filename, e))
+            self.close()
+            self.load_error = e
+            self.load_error_filename = self.filename
+
+            return None, True
+
+    def _load(self):
+        if self._read_only:
+            if not os.path.exists(self.filename):
+                return self._import_from.load()
+
+            self._db = connect_read_only(self.filename)
+        else:
+            self._connect()
+
+        if not self._imported():
+            if self._read_only:
+                # i dati non sono ancora stati importati, li leggo direttamente dal file json
+                return self._import_from.load()
+
+            return self._import()
+
+        data = {}
+
+        for key, value in self._db.execute('SELECT key, value FROM documents WHERE filetype = ?', (self._filetype,)):
+            data[key] = json.loads(value)
+
+        if self._has_tasks():
+            data[self._tasks_section] = self._load_tasks()
+
+        logging.info('Loaded {} savefile from database ({})'.format(self._filetype, self.filename))
+
+        return data, False
+
+    def record(self, record):
+        # le modifiche vengono ricavate dai percorsi registrati nel ChangeTracker, non serve un journal
+        pass
+
+    def sync(self, data, tracker):
+        if tracker.is_clean():
+            return
+
+        if self._db is None:
+            self._reopen()
+
+        paths = tracker.paths
+        full = () in paths
+
+        with self._db:
+            for section in (set(data) | self._stored_sections()) if full else {p[0] for p in paths}:
+                if self._has_tasks() and section == self._tasks_section:
+                    tasks = data.get(section, {})
+
+                    if full or (section,) in paths:
+                        # l'intera lista è cambiata (es. riordinamento), riscrivo tutte le righe
+                        self._write_all_tasks(tasks)
+                    else:
+                        for key in {p[1] for p in paths if p[0] == section}:
+                            self._write_task(key, tasks.get(key))
+                elif section in data:
+                    self._db.execute('INSERT OR REPLACE INTO documents (filetype, key, value) VALUES (?, ?, ?)', (self._filetype, section, json.dumps(data[section])))
+                else:
+                    self._db.execute('DELETE FROM documents WHERE filetype = ? AND key = ?', (self._filetype, section))
+
+            if self._importing:
+                self._db.execute('INSERT INTO imports (filetype, source, imported_at) VALUES (?, ?, ?)', (self._filetype, self._import_from.filename, time.time()))
+                self._importing = False
+                logging.info('Imported {} savefile ({}) into database ({})'.format(self._filetype, self._import_from.filename, self.filename))
+
+        logging.debug('Written {} changed paths of {} savefile to database'.format(len(paths), self._filetype))
+        tracker.clear()
+
+    def save(self, data, tracker, compact=False):
+        self.sync(data, tracker)
+
+        if compact:
+            # riporta nel database le pagine del WAL e lo svuota
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def wait(self, timeout=None):
+        # le transazioni vengono completate in modo sincrono, non ci sono mai scritture in sospeso
+        return True
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _import(self):
+        # importazione (una sola volta) dal file json: le migrazioni vengono applicate da SaveFile dopo il caricamento,
+        # e i dati importati vengono scritti alla prima sincronizzazione
+        if not os.path.exists(self._import_from.filename):
+            self._importing = True
+            return None, True
+
+        logging.info('Importing {} savefile ({}) into database ({})'.format(self._filetype, self._import_from.filename, self.filename))
+        data, _ = self._import_from.load()
+
+        if self._import_from.load_error is not None:
+            # il file json non è valido: l'importazione non viene registrata, in modo che venga ripetuta (ad esempio dopo
+            # il ripristino del file da uno snapshot) invece di sostituire definitivamente i dati con quelli di default
+            self.load_error = self._import_from.load_error
+            self.load_error_filename = self._import_from.filename
+            return None, True
+
+        self._importing = True
+
+        return data, True
+
+    def _imported(self):
+        # dopo un'importazione non riuscita l'utente può aver scelto di usare i dati di default: una volta scritti nel
+        # database, sono questi i dati da caricare (il file json danneggiato non viene più importato)
+        if self._db.execute('SELECT 1 FROM imports WHERE filetype = ?', (self._filetype,)).fetchone() is not None:
+            return True
+
+        return self._db.execute('SELECT 1 FROM documents WHERE filetype = ? LIMIT 1', (self._filetype,)).fetchone() is not None
+
+    def _connect(self):
+        self._db = connect(self.filename)
+
+    def _reopen(self):
+        # riapre il database dopo un errore di caricamento: potrebbe essere stato ripristinato da uno snapshot o già
+        # sostituito (anche da un altro file di salvataggio che usa lo stesso database), altrimenti viene sostituito ora
+        try:
+            self._connect()
+        except sqlite3.DatabaseError as e:
+            self._db = replace_damaged_database(self.filename, e)
+
+    def _has_tasks(self):
+        return self._filetype == 'tasks'
+
+    def _stored_sections(self):
+        sections = {key for key, in self._db.execute('SELECT key FROM documents WHERE filetype = ?', (self._filetype,))}
+
+        if self._has_tasks():
+            sections.add(self._tasks_section)
+
+        return sections
+
+    def _load_tasks(self):
+        tasks = {}
+        query = '''
+            SELECT t.id, t.name, t.ticket, t.elapsed_time, t.color_group, t.ticket_title, t.extra, n.text
+            FROM tasks t LEFT JOIN notes n ON n.task_id = t.id
+            ORDER BY t.position
+        '''
+
+        for task_id, name, ticket, elapsed_time, color_group, ticket_title, extra, notes in self._db.execute(query):
+            task = {'name': name, 'ticket': ticket, 'elapsed_time': elapsed_time, 'color_group': color_group, 'ticket_title': ticket_title}
+            # le note sono nel notes store, la tabella contiene solo quelle dei file precedenti alla migrazione
+            if notes is not None:
+                task['notes'] = notes
+
+            if extra is not None:
+                task.update(json.loads(extra))
+
+            tasks[str(task_id)] = task
+
+        return tasks
+
+    def _task_row(self, task):
+        extra = {k: v for k, v in task.items() if k not in self._task_columns and k != 'notes'}
+
+        return tuple(task.get(c) for c in self._task_columns) + (json.dumps(extra) if len(extra) > 0 else None,)
+
+    def _write_notes(self, task_id, task):
+        if task.get('notes', '') != '':
+            self._db.execute('INSERT OR REPLACE INTO notes (task_id, text) VALUES (?, ?)', (task_id, task['notes']))
+        else:
+            self._db.execute('DELETE FROM notes WHERE task_id = ?', (task_id,))
+
+    def _write_all_tasks(self, tasks):
+        self._db.execute('DELETE FROM tasks')
+        self._db.execute('DELETE FROM notes')
+
+        self._db.executemany(
+            'INSERT INTO tasks (id, position, name, ticket, elapsed_time, color_group, ticket_title, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            ((int(key), position) + self._task_row(task) for position, (key, task) in enumerate(tasks.items()))
+        )
+        self._db.executemany(
+            'INSERT INTO notes (task_id, text) VALUES (?, ?)',
+            ((int(key), task['notes']) for key, task in tasks.items() if task.get('notes', '') != '')
+        )
+
+    def _write_task(self, key, task):
+        task_id = int(key)
+
+        if task is None:
+            self._db.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+            self._db.execute('DELETE FROM notes WHERE task_id = ?', (task_id,))
+            return
+
+        row = self._task_row(task)
+        cursor = self._db.execute('UPDATE tasks SET name = ?, ticket = ?, elapsed_time = ?, color_group = ?, ticket_title = ?, extra = ? WHERE id = ?', row + (task_id,))
+
+        if cursor.rowcount == 0:
+            # i nuovi task vengono sempre aggiunti in fondo alla lista
+            self._db.execute(
+                'INSERT INTO tasks (id, position, name, ticket, elapsed_time, color_group, ticket_title, extra) VALUES (?, (SELECT COALESCE(MAX(position) + 1, 0) FROM tasks), ?, ?, ?, ?, ?, ?)',
+                (task_id,) + row
+            )
+
+        self._write_notes(task_id, task)
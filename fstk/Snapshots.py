@@ -0,0 +1,194 @@
+import datetime
+import json
+import logging
+import os
+import shutil
+import sqlite3
+
+from . import Globals, SavefilesBinary
+from .SaveFiles import SaveWorker, write_atomic
+from .SavefilesSqlite import connect_read_only
+
+
+class Snapshots(object):
+    # copie dei file di salvataggio (config, task e relativi journal, storico, archivio e note) in momenti diversi, una
+    # cartella per ogni snapshot. Ogni snapshot contiene un manifest con dimensione e data di modifica dei file copiati:
+    # i file non modificati rispetto allo snapshot precedente sono hard link al file di quello snapshot, quindi solo i
+    # file modificati (es. il giorno corrente dello storico) vengono copiati. Le note non vengono mai modificate, sono
+    # hard link ai file del notes store. Vengono mantenuti gli ultimi keep snapshot
+
+    keep = 10
+    # intervallo minimo (in secondi) tra gli snapshot periodici
+    interval = 60 * 60
+
+    manifest_name = 'manifest.json'
+    name_format = '%Y%m%d-%H%M%S-%f'
+
+    def __init__(self, folder, source_folder):
+        self.folder = folder
+        self.source_folder = source_folder
+        self._worker = SaveWorker('snapshots')
+
+    def take_in_background(self):
+        self._worker.submit(self.take)
+
+    def wait(self, timeout=None):
+        return self._worker.wait(timeout)
+
+    def snapshots(self):
+        # nomi degli snapshot completi, dal più vecchio
+        if not os.path.isdir(self.folder):
+            return []
+
+        return sorted(name for name in os.listdir(self.folder) if os.path.isfile(os.path.join(self.folder, name, self.manifest_name)))
+
+    def latest(self, filename=None):
+        # snapshot più recente (che contiene il file indicato, se specificato), None se non ce ne sono
+        for name in reversed(self.snapshots()):
+            if filename is None or os.path.basename(filename) in self._manifest(name):
+                return name
+
+        return None
+
+    def date(self, name):
+        return datetime.datetime.strptime(name, self.name_format)
+
+    def take(self):
+        # ritorna il nome dello snapshot creato, None se nessun file è cambiato rispetto allo snapshot precedente
+        sources = self._sources()
+        latest = self.latest()
+        previous = self._manifest(latest) if latest is not None else {}
+
+        if sources == previous:
+            logging.debug('Nothing changed since last snapshot ({})'.format(latest))
+            return None
+
+        name = datetime.datetime.now().strftime(self.name_format)
+        tmp_path = os.path.join(self.folder, name + '.tmp')
+        manifest = {}
+        copied = 0
+
+        for rel, stat in sources.items():
+            src = os.path.join(self.source_folder, rel)
+            dst = os.path.join(tmp_path, rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+            try:
+                if previous.get(rel) == stat:
+                    self._link(os.path.join(self.folder, latest, rel), dst)
+                elif rel.startswith(Globals.notes_folder_name + os.sep):
+                    self._link(src, dst)
+                elif rel == Globals.sqlite_file_name:
+                    self._backup_database(src, dst)
+                    copied += 1
+                else:
+                    shutil.copyfile(src, dst)
+                    copied += 1
+            except FileNotFoundError:
+                # il file è stato eliminato dopo la lettura della cartella (es. il journal messo da parte dalla compattazione)
+                continue
+
+            # se il file viene modificato durante la copia la data di modifica non corrisponde, e al prossimo snapshot
+            # il file viene copiato di nuovo
+            manifest[rel] = stat
+
+        with open(os.path.join(tmp_path, self.manifest_name), 'w') as o:
+            json.dump(manifest, o)
+
+        # lo snapshot compare con il suo nome solo quando è completo
+        os.rename(tmp_path, os.path.join(self.folder, name))
+
+        logging.info('Snapshot {} taken, {} files copied, {} linked'.format(name, copied, len(manifest) - copied))
+
+        self._prune()
+
+        return name
+
+    def restore(self, name, filename):
+        # ripristina il file di salvataggio indicato (e i suoi journal) dallo snapshot, insieme alle note eliminate dal
+        # notes store dopo lo snapshot. I file vengono copiati: un hard link verrebbe modificato insieme al file ripristinato
+        base = os.path.basename(filename)
+        manifest = self._manifest(name)
+
+        for entry in os.listdir(self.source_folder):
+            if entry.startswith(base) and os.path.isfile(os.path.join(self.source_folder, entry)):
+                os.remove(os.path.join(self.source_folder, entry))
+
+        for rel in manifest:
+            src = os.path.join(self.folder, name, rel)
+            dst = os.path.join(self.source_folder, rel)
+
+            if rel.startswith(base):
+                with open(src, 'rb') as f:
+                    write_atomic(dst, f.read())
+            elif rel.startswith(Globals.notes_folder_name + os.sep) and not os.path.exists(dst):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                self._link(src, dst)
+
+        logging.info('Restored {} from snapshot {}'.format(base, name))
+
+    def _sources(self):
+        # file da salvare: percorso relativo alla cartella di configurazione -> [dimensione, data di modifica]
+        sources = {}
+        names = (Globals.config_file_name, Globals.tasks_file_name, os.path.splitext(Globals.tasks_file_name)[0] + SavefilesBinary.file_extension)
+
+        for entry in os.listdir(self.source_folder):
+            path = os.path.join(self.source_folder, entry)
+
+            if entry == Globals.sqlite_file_name:
+                # le modifiche al database possono essere solo nel file del WAL
+                sources[entry] = self._stat(path) + (self._stat(path + '-wal') if os.path.exists(path + '-wal') else [])
+            elif entry.startswith(names) and not entry.endswith('.tmp') and os.path.isfile(path):
+                sources[entry] = self._stat(path)
+
+        for folder in (Globals.history_folder_name, Globals.archive_folder_name, Globals.notes_folder_name):
+            if not os.path.isdir(os.path.join(self.source_folder, folder)):
+                continue
+
+            for entry in os.listdir(os.path.join(self.source_folder, folder)):
+                if not entry.endswith('.tmp'):
+                    sources[os.path.join(folder, entry)] = self._stat(os.path.join(self.source_folder, folder, entry))
+
+        return sources
+
+    def _manifest(self, name):
+        with open(os.path.join(self.folder, name, self.manifest_name)) as f:
+            return json.load(f)
+
+    def _prune(self):
+        for name in self.snapshots()[:-self.keep]:
+            shutil.rmtree(os.path.join(self.folder, name))
+            logging.info('Removed snapshot {}'.format(name))
+
+        # snapshot non completati
+        for entry in os.listdir(self.folder):
+            if entry.endswith('.tmp'):
+                shutil.rmtree(os.path.join(self.folder, entry))
+
+    @staticmethod
+    def _stat(path):
+        stat = os.stat(path)
+
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def _link(src, dst):
+        try:
+            os.link(src, dst)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # il filesystem non supporta gli hard link (o il file ne ha già troppi)
+            shutil.copyfile(src, dst)
+
+    @staticmethod
+    def _backup_database(src, dst):
+        # copia consistente del database, anche se in uso
+        source = connect_read_only(src)
+        target = sqlite3.connect(dst)
+
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
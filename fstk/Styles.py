@@ -0,0 +1,75 @@
+from PySide2.QtGui import QFont, QFontMetrics, QGuiApplication
+
+from . import Palette
+
+# sfondo delle righe della lista dei task, disegnate da TaskDelegate (lo stylesheet non si applica alle righe disegnate
+# dal delegate). La riga selezionata ha lo stesso sfondo del suo editor (TaskElement)
+ROW_BACKGROUND = '#353d48'
+ROW_SELECTED_BACKGROUND = '#4d1f48'
+
+# stylesheet delle righe dei task (TaskElement), aggiunto una sola volta allo stylesheet dell'applicazione: gli stati
+# delle righe sono proprietà dinamiche dei widget (colorGroup, counting, invalid, duplicated, full), modificate tramite
+# Utils.style_invalidator, in modo che la creazione di una riga non richieda il parsing di nessuno stylesheet
+task_row_style = '''
+    TaskElement {{ background-color: {}; border: solid transparent; border-width: 0px 0px 0px 5px; }}
+'''.format(ROW_SELECTED_BACKGROUND) + ''.join('''
+    TaskElement[colorGroup="{}"] {{ border-color: {}; }}'''.format(group, color) for group, color in Palette.group_colors.items()) + '''
+
+    TaskElement QPushButton { padding-top: 1; padding-bottom: 1; padding-left: 4; padding-right: 4; }
+    TaskElement QPushButton#notes[full=true] { border: 1px solid #fae661; }
+
+    TaskElement QPushButton#ticketNumber { background-color: transparent; border: 0; padding: 0px }
+    TaskElement QPushButton#ticketNumber[duplicated=true] { border: 1px solid #fae661; padding: 2px }
+
+    TaskElement QLabel#ticketTitle[counting=true] { color: #61ccfa; }
+    TaskElement QLabel#ticketTitle[counting=false] { color: #6e6e6e; }
+    TaskElement QLabel#ticketTitle[invalid=true] { color: #fa7161; }
+'''
+
+# font usati dalle righe dei task: famiglia, dimensione in punti (-1 per quella di default), corsivo
+ICONS = 'icons'
+TIME = 'time'
+TICKET_TITLE = 'ticket_title'
+
+_font_specs = {
+    ICONS: ('Font Awesome 5 Pro', -1, False),
+    TIME: ('Mono', 16, False),
+    TICKET_TITLE: ('Mono', 9, True)
+}
+
+_fonts = {}
+# metriche e dimensioni dei bottoni per (font, dpi), lo stesso font ha dimensioni diverse su schermi con dpi diversi
+_metrics = {}
+_button_sizes = {}
+
+
+def font(name):
+    if name not in _fonts:
+        family, size, italic = _font_specs[name]
+        _fonts[name] = QFont(family, size, italic=italic)
+
+    return _fonts[name]
+
+
+def _key(f):
+    return f.key(), QGuiApplication.primaryScreen().logicalDotsPerInch()
+
+
+def metrics(f):
+    key = _key(f)
+
+    if key not in _metrics:
+        _metrics[key] = QFontMetrics(f)
+
+    return _metrics[key]
+
+
+def button_size(f):
+    # dimensione dei bottoni delle righe, ricavata dal font del testo delle righe
+    key = _key(f)
+
+    if key not in _button_sizes:
+        metric = metrics(f).boundingRect('+5')
+        _button_sizes[key] = (metric.width() + 14, metric.height() + 4)
+
+    return _button_sizes[key]
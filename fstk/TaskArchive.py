@@ -0,0 +1,127 @@
+import gzip
+import json
+import logging
+import os
+import re
+import struct
+import time
+
+
+class TaskArchive(object):
+    # archivio dei task non più in uso, tenuto fuori dal file dei task in modo che non venga caricato nè riscritto ad
+    # ogni salvataggio. L'archivio è una serie di file (archive-00001.fstkarchive, archive-00002.fstkarchive, ...) a cui
+    # vengono solo aggiunti blocchi compressi con gzip, ognuno preceduto dalla sua lunghezza (vedi _frame): un blocco per
+    # ogni operazione, che contiene un record json per riga (archiviazione o ripristino di un task). I file non sono
+    # quindi leggibili con gunzip, da cui l'estensione dedicata. Quando un file supera segment_size ne viene iniziato uno
+    # nuovo. L'archivio viene letto solo per cercare o ripristinare i task
+
+    segment_size = 1024 * 1024
+
+    file_prefix = 'archive-'
+    file_extension = '.fstkarchive'
+
+    _frame = struct.Struct('<I')
+
+    # il file corrente è stato verificato (ed eventualmente troncato dopo l'ultimo blocco completo)
+    _checked = False
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def read_only_view(self):
+        # la lettura dell'archivio non modifica nessun file
+        return self
+
+    def archive(self, tasks):
+        # tasks: coppie (id, dizionario del task)
+        now = time.time()
+
+        self._append([{'op': 'archive', 'id': task_id, 'task': task, 'archived_at': now} for task_id, task in tasks])
+
+    def restore(self, task_ids):
+        # i task ripristinati vengono segnati come tali, il loro record di archiviazione rimane nel file
+        self._append([{'op': 'restore', 'id': task_id} for task_id in task_ids])
+
+    def tasks(self):
+        # task attualmente archiviati: id -> (istante di archiviazione, dizionario del task)
+        archived = {}
+
+        for record in self._records():
+            if record['op'] == 'archive':
+                archived[record['id']] = (record['archived_at'], record['task'])
+            elif record['op'] == 'restore':
+                archived.pop(record['id'], None)
+
+        return archived
+
+    def search(self, text='', archived=None):
+        # task archiviati il cui nome, ticket o anteprima delle note (o le note, se archiviati prima del notes store)
+        # contengono il testo (senza distinzione tra maiuscole e minuscole), dal più recente. archived è il risultato di tasks(), per non rileggere l'archivio ad ogni ricerca
+        pattern = re.compile(re.escape(text), re.IGNORECASE)
+        found = []
+
+        for task_id, (archived_at, task) in (self.tasks() if archived is None else archived).items():
+            if any(pattern.search(task.get(f) or '') for f in ('name', 'ticket', 'ticket_title', 'notes_preview', 'notes')):
+                found.append((task_id, archived_at, task))
+
+        return sorted(found, key=lambda t: t[1], reverse=True)
+
+    def _segments(self):
+        if not os.path.isdir(self.folder):
+            return []
+
+        return sorted(os.path.join(self.folder, name) for name in os.listdir(self.folder)
+                      if name.startswith(self.file_prefix) and name.endswith(self.file_extension))
+
+    def _records(self):
+        for path in self._segments():
+            with open(path, 'rb') as f:
+                for block in self._blocks(f):
+                    for line in gzip.decompress(block).splitlines():
+                        yield json.loads(line)
+
+    def _blocks(self, f):
+        # blocchi completi del file, si ferma al primo blocco incompleto (scrittura interrotta)
+        while True:
+            header = f.read(self._frame.size)
+            if len(header) < self._frame.size:
+                return
+
+            size, = self._frame.unpack(header)
+            block = f.read(size)
+            if len(block) < size:
+                return
+
+            yield block
+
+    def _append(self, records):
+        if len(records) == 0:
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+
+        segments = self._segments()
+        path = segments[-1] if len(segments) > 0 else None
+
+        if path is not None and not self._checked:
+            # scarta un eventuale blocco incompleto in fondo al file, altrimenti i blocchi successivi non sarebbero leggibili
+            with open(path, 'r+b') as f:
+                valid = 0
+                for block in self._blocks(f):
+                    valid += self._frame.size + len(block)
+                f.truncate(valid)
+
+        self._checked = True
+
+        if path is None or os.path.getsize(path) >= self.segment_size:
+            number = 1 if path is None else int(os.path.basename(path)[len(self.file_prefix):-len(self.file_extension)]) + 1
+            path = os.path.join(self.folder, '{}{:05d}{}'.format(self.file_prefix, number, self.file_extension))
+
+        block = gzip.compress(''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records).encode('utf-8'))
+
+        with open(path, 'ab') as f:
+            f.write(self._frame.pack(len(block)) + block)
+            f.flush()
+            os.fsync(f.fileno())
+
+        logging.info('Written {} records to task archive ({})'.format(len(records), path))
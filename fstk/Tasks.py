@@ -0,0 +1,404 @@
+from PySide2.QtCore import Qt, QAbstractListModel, QModelIndex
+
+
+def row_runs(rows):
+    # intervalli (prima, ultima) di righe consecutive, rows deve essere ordinato
+    first = last = None
+
+    for row in rows:
+        if last is not None and row == last + 1:
+            last = row
+            continue
+
+        if first is not None:
+            yield first, last
+
+        first = last = row
+
+    if first is not None:
+        yield first, last
+
+
+class Task(object):
+    # record di un task, senza nessun widget associato. Il titolo del ticket vale None se il ticket non è stato trovato.
+    # Le note sono nel notes store (vedi NotesStore), il task contiene il riferimento ('' se non ci sono note) e l'anteprima
+    __slots__ = ('id', 'name', 'ticket', 'elapsed_time', 'color_group', 'ticket_title', 'notes_ref', 'notes_preview')
+
+    def __init__(self, name, ticket='', elapsed_time=0, color_group='No color', ticket_title='', notes_ref='', notes_preview=''):
+        # assegnato dal TaskRegistry quando il task viene aggiunto alla lista
+        self.id = None
+        self.name = name
+        self.ticket = ticket
+        self.elapsed_time = elapsed_time
+        self.color_group = color_group
+        self.ticket_title = ticket_title
+        self.notes_ref = notes_ref
+        self.notes_preview = notes_preview
+
+    @classmethod
+    def from_dict(cls, d, task_id=None):
+        task = cls(d['name'], d['ticket'], d['elapsed_time'], d['color_group'], d['ticket_title'], d.get('notes_ref', ''), d.get('notes_preview', ''))
+        task.id = task_id
+
+        return task
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'ticket': self.ticket,
+            'elapsed_time': self.elapsed_time,
+            'color_group': self.color_group,
+            'ticket_title': self.ticket_title,
+            'notes_ref': self.notes_ref,
+            'notes_preview': self.notes_preview
+        }
+
+    def __repr__(self):
+        return "<Task {} {}>".format(self.id, self.to_dict())
+
+
+class TaskRegistry(object):
+    # registro centrale dei task: assegna ad ogni task un id stabile e mantiene gli indici per id, numero ticket e gruppo
+    # colore, in modo che le operazioni su un sottoinsieme di task non debbano scorrere tutta la lista
+
+    def __init__(self):
+        self._next_id = 0
+        self.by_id = {}
+        # numero ticket -> {id: task}, i task senza numero ticket non vengono indicizzati
+        self.by_ticket = {}
+        # gruppo colore -> {id: task}
+        self.by_color_group = {}
+
+        # numeri ticket presenti in più di un task, aggiornati ad ogni modifica dell'indice per ticket
+        self.duplicated_tickets = set()
+        # numeri ticket il cui stato di duplicato è cambiato e non è ancora stato notificato (vedi take_flipped_tickets)
+        self._flipped_tickets = set()
+
+    @property
+    def next_id(self):
+        # id che verrà assegnato al prossimo task, non diminuisce mai (neanche eliminando i task)
+        return self._next_id
+
+    def seed(self, next_id):
+        # riprende la numerazione salvata, in modo che gli id dei task eliminati non vengano riassegnati
+        self._next_id = max(self._next_id, next_id)
+
+    def add(self, task):
+        if task.id is None:
+            task.id = self._next_id
+            self._next_id += 1
+        else:
+            self._next_id = max(self._next_id, task.id + 1)
+
+        self.by_id[task.id] = task
+        self._index_ticket(task)
+        self._index(self.by_color_group, task.color_group, task)
+
+    def remove(self, task):
+        del self.by_id[task.id]
+        self._unindex_ticket(task)
+        self._unindex(self.by_color_group, task.color_group, task)
+
+    def clear(self):
+        self.by_id.clear()
+        self.by_ticket.clear()
+        self.by_color_group.clear()
+        self.duplicated_tickets.clear()
+        self._flipped_tickets.clear()
+
+    def get(self, task_id):
+        return self.by_id.get(task_id)
+
+    def set_ticket(self, task, ticket):
+        self._unindex_ticket(task)
+        task.ticket = ticket
+        self._index_ticket(task)
+
+    def set_color_group(self, task, color_group):
+        self._unindex(self.by_color_group, task.color_group, task)
+        task.color_group = color_group
+        self._index(self.by_color_group, task.color_group, task)
+
+    def tickets(self):
+        return self.by_ticket.keys()
+
+    def tasks_with_ticket(self, ticket=None):
+        # senza parametro ritorna tutti i task che hanno un numero ticket
+        if ticket is None:
+            return [t for tasks in self.by_ticket.values() for t in tasks.values()]
+
+        return list(self.by_ticket.get(ticket, {}).values())
+
+    def tasks_in_color_group(self, color_group):
+        return list(self.by_color_group.get(color_group, {}).values())
+
+    def is_duplicated(self, task):
+        return task.ticket in self.duplicated_tickets
+
+    def take_flipped_tickets(self):
+        # ritorna (e dimentica) i numeri ticket che sono diventati duplicati o hanno smesso di esserlo
+        flipped = self._flipped_tickets
+        self._flipped_tickets = set()
+
+        return flipped
+
+    def _index_ticket(self, task):
+        self._index(self.by_ticket, task.ticket, task)
+
+        # il ticket diventa duplicato solo nel passaggio da 1 a 2 task
+        if task.ticket != '' and len(self.by_ticket[task.ticket]) == 2:
+            self.duplicated_tickets.add(task.ticket)
+            self._flipped_tickets ^= {task.ticket}
+
+    def _unindex_ticket(self, task):
+        self._unindex(self.by_ticket, task.ticket, task)
+
+        # il ticket smette di essere duplicato solo nel passaggio da 2 a 1 task
+        if task.ticket in self.duplicated_tickets and len(self.by_ticket[task.ticket]) == 1:
+            self.duplicated_tickets.discard(task.ticket)
+            self._flipped_tickets ^= {task.ticket}
+
+    @staticmethod
+    def _index(index, key, task):
+        if key == '':
+            return
+
+        if key not in index:
+            index[key] = {}
+
+        index[key][task.id] = task
+
+    @staticmethod
+    def _unindex(index, key, task):
+        tasks = index.get(key)
+
+        if tasks is None:
+            return
+
+        tasks.pop(task.id, None)
+        if len(tasks) == 0:
+            del index[key]
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+class TaskListModel(QAbstractListModel):
+    # modello della lista dei task: contiene solo i record, il disegno delle righe è a carico del delegate
+
+    TaskRole = Qt.UserRole
+
+    # modifiche raggruppate (vedi begin_batch): id -> task da ridisegnare al termine
+    _batch_depth = 0
+    _batch_updated = None
+    # all_updated chiamato durante il batch: al termine viene ridisegnata l'intera lista
+    _batch_all_updated = False
+
+    def __init__(self):
+        super().__init__()
+        self._tasks = []
+        # cache id task -> riga, invalidata ad ogni modifica strutturale della lista
+        self._rows = None
+
+        self.registry = TaskRegistry()
+
+    # interfaccia QAbstractListModel
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self._tasks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._tasks):
+            return None
+
+        task = self._tasks[index.row()]
+
+        if role == self.TaskRole:
+            return task
+        elif role == Qt.DisplayRole:
+            return task.name
+
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    # accesso ai task
+
+    def task(self, row):
+        return self._tasks[row]
+
+    def tasks(self):
+        return iter(self._tasks)
+
+    def row_of(self, task):
+        if self._rows is None:
+            self._rows = {t.id: i for i, t in enumerate(self._tasks)}
+
+        return self._rows.get(task.id)
+
+    def index_of(self, task):
+        row = self.row_of(task)
+
+        if row is None:
+            return QModelIndex()
+
+        return self.index(row)
+
+    # modifiche alla lista
+
+    def set_tasks(self, tasks, next_id=0):
+        # sostituisce tutti i task con un solo reset del modello, invece di un inserimento per riga
+        self.beginResetModel()
+        self._tasks = list(tasks)
+        self._rows = None
+
+        self.registry.clear()
+        self.registry.seed(next_id)
+        for task in self._tasks:
+            self.registry.add(task)
+
+        # dopo un reset tutte le righe vengono comunque ridisegnate
+        self.registry.take_flipped_tickets()
+        self.endResetModel()
+
+    def append(self, task):
+        row = len(self._tasks)
+
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._tasks.append(task)
+        self.registry.add(task)
+        if self._rows is not None:
+            self._rows[task.id] = row
+        self.endInsertRows()
+
+        self._notify_flipped_tickets()
+
+        return row
+
+    def remove(self, task):
+        row = self.row_of(task)
+
+        if row is None:
+            return False
+
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._tasks[row]
+        self.registry.remove(task)
+        self._rows = None
+        self.endRemoveRows()
+
+        self._notify_flipped_tickets()
+
+        return True
+
+    def remove_tasks(self, tasks):
+        # rimuove più task con una notifica per ogni gruppo di righe consecutive, dal fondo in modo che le righe ancora
+        # da rimuovere non cambino, invece di ricalcolare le righe dopo ogni rimozione
+        rows = sorted(row for row in (self.row_of(t) for t in tasks) if row is not None)
+
+        for first, last in reversed(list(row_runs(rows))):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for task in self._tasks[first:last + 1]:
+                self.registry.remove(task)
+            del self._tasks[first:last + 1]
+            self._rows = None
+            self.endRemoveRows()
+
+        self._notify_flipped_tickets()
+
+        return len(rows)
+
+    def move(self, source, destination):
+        # sposta il task dalla riga source in modo che si trovi prima della riga destination (come beginMoveRows)
+        if destination in (source, source + 1):
+            return False
+
+        if not self.beginMoveRows(QModelIndex(), source, source, QModelIndex(), destination):
+            return False
+
+        task = self._tasks.pop(source)
+        self._tasks.insert(destination if destination < source else destination - 1, task)
+        self._rows = None
+        self.endMoveRows()
+
+        return True
+
+    def set_ticket(self, task, ticket):
+        self.registry.set_ticket(task, ticket)
+        self.task_updated(task)
+
+        self._notify_flipped_tickets()
+
+    def set_color_group(self, task, color_group):
+        self.registry.set_color_group(task, color_group)
+        self.task_updated(task)
+
+    def task_updated(self, task):
+        if self._batch_depth > 0:
+            self._batch_updated[task.id] = task
+            return
+
+        index = self.index_of(task)
+
+        if index.isValid():
+            self.dataChanged.emit(index, index)
+
+    def _notify_flipped_tickets(self):
+        # ridisegna solo i task il cui stato di ticket duplicato è effettivamente cambiato. Durante un batch i ticket
+        # rimangono nel registro e vengono notificati una sola volta da end_batch
+        if self._batch_depth > 0:
+            return
+
+        for ticket in self.registry.take_flipped_tickets():
+            for task in self.registry.tasks_with_ticket(ticket):
+                self.task_updated(task)
+
+    def all_updated(self):
+        if self._batch_depth > 0:
+            self._batch_all_updated = True
+            return
+
+        if len(self._tasks) > 0:
+            self.dataChanged.emit(self.index(0), self.index(len(self._tasks) - 1))
+
+    def begin_batch(self):
+        # da qui a end_batch task_updated, all_updated e i cambi di stato dei ticket duplicati vengono solo registrati. Le chiamate
+        # possono essere annidate, le notifiche vengono emesse al termine di quella più esterna
+        if self._batch_depth == 0:
+            self._batch_updated = {}
+
+        self._batch_depth += 1
+
+    def end_batch(self):
+        self._batch_depth -= 1
+
+        if self._batch_depth > 0:
+            return
+
+        updated = self._batch_updated
+        self._batch_updated = None
+
+        for ticket in self.registry.take_flipped_tickets():
+            updated.update((t.id, t) for t in self.registry.tasks_with_ticket(ticket))
+
+        if self._batch_all_updated:
+            # le singole righe sono comprese nell'aggiornamento dell'intera lista
+            self._batch_all_updated = False
+            self.all_updated()
+            return
+
+        # un solo dataChanged per ogni gruppo di righe consecutive (i task rimossi durante il batch non hanno una riga)
+        rows = sorted(row for row in (self.row_of(t) for t in updated.values()) if row is not None)
+
+        for first, last in row_runs(rows):
+            self.dataChanged.emit(self.index(first), self.index(last))
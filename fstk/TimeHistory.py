@@ -0,0 +1,473 @@
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import struct
+import time
+from collections import namedtuple
+
+from . import Globals
+from .SaveFiles import write_atomic
+from .SavefilesSqlite import SqliteBackend, connect, connect_read_only, replace_damaged_database
+
+
+# tipi di segmento: tempo contato dal task attivo, aggiunto/tolto con i pulsanti, impostato o azzerato
+COUNT = 'count'
+ADD = 'add'
+SUB = 'sub'
+SET = 'set'
+CLEAR = 'clear'
+
+kinds = (COUNT, ADD, SUB, SET, CLEAR)
+
+# start: istante (wall clock, secondi) di inizio del segmento, seconds: secondi accreditati al task (negativi se tolti)
+Segment = namedtuple('Segment', ('start', 'seconds', 'task_id', 'ticket', 'color_group', 'kind'))
+
+# record a larghezza fissa di un segmento: start, seconds, task_id, ticket, color_group, kind. Ticket e gruppo colore
+# sono indici in una lista di stringhe, kind è l'indice in kinds
+segment_record = struct.Struct('<qiIIIB3x')
+
+
+def open_store(read_only=False):
+    # store dello storico per il backend dei file di salvataggio in uso
+    if Globals.storage_backend == 'sqlite':
+        return SqliteSegmentStore(os.path.join(Globals.config_folder, Globals.sqlite_file_name), read_only)
+
+    return SegmentStore(os.path.join(Globals.config_folder, Globals.history_folder_name), read_only)
+
+
+def day_range(day):
+    # intervallo [inizio, fine) in secondi di un giorno (ora locale)
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def week_range(day):
+    # intervallo [inizio, fine) in secondi della settimana (da lunedì a domenica) che contiene il giorno
+    monday = day - datetime.timedelta(days=day.weekday())
+
+    return day_range(monday)[0], day_range(monday + datetime.timedelta(days=7))[0]
+
+
+class TimeHistory(object):
+    # storico dei segmenti di tempo dei task. Il tempo contato dal task attivo viene accreditato a piccoli incrementi
+    # (vedi TimeAccounting), gli incrementi contigui dello stesso task vengono uniti in un unico segmento che rimane
+    # aperto finchè il task conta. Il segmento aperto viene scritto ad ogni flush, e riscritto nella stessa posizione
+    # se nel frattempo si è allungato
+
+    # distanza massima (secondi) tra la fine del segmento aperto e l'inizio del nuovo tempo contato per unirli
+    merge_gap = 2
+
+    _open = None
+    _open_handle = None
+    _open_written = True
+
+    def __init__(self, store, wall_clock=time.time):
+        self.store = store
+        self._wall_clock = wall_clock
+
+    def record(self, task, seconds, kind):
+        if seconds == 0:
+            return
+
+        now = int(self._wall_clock())
+
+        if kind != COUNT:
+            self.store.write(Segment(now, seconds, task.id, task.ticket, task.color_group, kind))
+            return
+
+        start = now - seconds
+
+        if self._extends_open(task, start):
+            self._open = self._open._replace(seconds=self._open.seconds + seconds)
+            self._open_written = False
+            return
+
+        self._close_open()
+        self._open = Segment(start, seconds, task.id, task.ticket, task.color_group, COUNT)
+        self._open_written = False
+
+    def segments(self, since, until, ticket=None, task_id=None):
+        # segmenti con inizio nell'intervallo [since, until), letti dallo store un giorno alla volta
+        self._write_open()
+
+        return self.store.segments(since, until, ticket, task_id)
+
+    def record_buffer(self, since, until):
+        # record (vedi segment_record) di almeno tutti i segmenti nell'intervallo e lista delle stringhe a cui fanno riferimento,
+        # per la lettura colonnare dei report
+        self._write_open()
+
+        return self.store.record_buffer(since, until)
+
+    def flush(self):
+        self._write_open()
+        self.store.flush()
+
+    def close(self):
+        self.flush()
+        self.store.close()
+
+    def _extends_open(self, task, start):
+        o = self._open
+
+        if o is None or o.task_id != task.id or o.ticket != task.ticket or o.color_group != task.color_group:
+            return False
+
+        # i segmenti non attraversano la mezzanotte, in modo che ogni segmento appartenga ad un solo giorno
+        if datetime.date.fromtimestamp(start) != datetime.date.fromtimestamp(o.start):
+            return False
+
+        # i secondi accreditati sono interi, l'inizio ricavato può sovrapporsi di poco alla fine del segmento aperto
+        return abs(start - (o.start + o.seconds)) <= self.merge_gap
+
+    def _write_open(self):
+        if self._open is None or self._open_written:
+            return
+
+        self._open_handle = self.store.write(self._open, self._open_handle)
+        self._open_written = True
+
+    def _close_open(self):
+        self._write_open()
+        self._open = None
+        self._open_handle = None
+
+
+class SegmentStore(object):
+    # store su file dello storico, in una cartella con un file per giorno (YYYY-MM-DD.seg) a cui i segmenti vengono solo
+    # aggiunti, come record a larghezza fissa (vedi segment_record). Ticket e gruppi colore sono salvati una sola volta nel file
+    # strings, anch'esso scritto solo in aggiunta (una stringa json per riga), i record ne contengono l'indice.
+    # Il file index contiene per ogni giorno il numero di record e i ticket presenti: le ricerche leggono solo i file dei
+    # giorni richiesti (e per un ticket solo quelli in cui compare). È ricostruibile dai file dei giorni se non aggiornato
+
+    file_extension = '.seg'
+    strings_file_name = 'strings'
+    index_file_name = 'index.json'
+    index_version = 1
+
+    _file = None
+    _file_day = None
+    _index_changed = False
+    # ci sono scritture non ancora rese persistenti
+    _unsynced = False
+
+    def __init__(self, folder, read_only=False):
+        self.folder = folder
+        # in sola lettura (es. export mentre il software è in esecuzione) nessun file viene creato o modificato
+        self._read_only = read_only
+
+        if not read_only:
+            os.makedirs(folder, exist_ok=True)
+
+        self._strings = []
+        self._string_ids = {}
+        self._strings_file = None
+        self._load_strings()
+
+        # giorno (YYYY-MM-DD) -> {'records': numero di record, 'tickets': indici delle stringhe dei ticket}
+        self._days = {}
+        self._load_index()
+
+    def write(self, segment, handle=None):
+        # aggiunge il segmento al file del suo giorno, oppure lo riscrive nella posizione indicata da handle (ritornato
+        # dalla scrittura precedente dello stesso segmento)
+        if self._read_only:
+            raise ValueError('The time history ({}) has been opened read only'.format(self.folder))
+
+        day = self._day(segment.start)
+        self._open_day(day)
+
+        ticket = self._string_id(segment.ticket)
+        entry = self._days[day]
+
+        if handle is None:
+            handle = (day, entry['records'])
+            entry['records'] += 1
+
+        self._file.seek(handle[1] * segment_record.size)
+        self._file.write(segment_record.pack(segment.start, segment.seconds, segment.task_id, ticket,
+                                           self._string_id(segment.color_group), kinds.index(segment.kind)))
+
+        if ticket not in entry['tickets']:
+            entry['tickets'].append(ticket)
+
+        self._index_changed = True
+        self._unsynced = True
+
+        return handle
+
+    def flush(self):
+        if self._read_only or not self._unsynced:
+            return
+
+        self._sync_strings()
+
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+        self._unsynced = False
+
+        if self._index_changed:
+            write_atomic(os.path.join(self.folder, self.index_file_name), json.dumps({'version': self.index_version, 'days': self._days}))
+            self._index_changed = False
+
+    def close(self):
+        self._close_day()
+
+        if self._strings_file is not None:
+            self._strings_file.close()
+            self._strings_file = None
+
+    def days(self):
+        return sorted(self._days)
+
+    def ticket_days(self, ticket):
+        ticket = self._string_ids.get(ticket)
+
+        return sorted(day for day, entry in self._days.items() if ticket in entry['tickets'])
+
+    def day_records(self, day):
+        # record grezzi (tuple di segment_record) di un giorno
+        return segment_record.iter_unpack(self._read_day(day))
+
+    def record_buffer(self, since, until):
+        # contenuto dei file dei giorni dell'intervallo, i segmenti vanno comunque filtrati per inizio
+        first, last = self._day(since), self._day(until - 1)
+        buffers = []
+
+        for day in self.days():
+            if first <= day <= last:
+                buffers.append(self._read_day(day))
+
+        return b''.join(buffers), self._strings
+
+    def segments(self, since, until, ticket=None, task_id=None):
+        first, last = self._day(since), self._day(until - 1)
+        days = self.days() if ticket is None else self.ticket_days(ticket)
+        ticket_id = None if ticket is None else self._string_ids.get(ticket)
+
+        for day in days:
+            if not first <= day <= last:
+                continue
+
+            invalid = 0
+
+            for start, seconds, t_id, t, color_group, kind in self.day_records(day):
+                if not since <= start < until:
+                    continue
+                if ticket_id is not None and t != ticket_id:
+                    continue
+                if task_id is not None and t_id != task_id:
+                    continue
+                if t >= len(self._strings) or color_group >= len(self._strings):
+                    # stringa persa da un'interruzione (o scritta dopo l'apertura in sola lettura), il record viene saltato
+                    invalid += 1
+                    continue
+
+                yield Segment(start, seconds, t_id, self._strings[t], self._strings[color_group], kinds[kind])
+
+            if invalid > 0:
+                logging.warning('Skipped {} time history records of day {} referring to unknown strings'.format(invalid, day))
+
+    @staticmethod
+    def _day(timestamp):
+        return datetime.date.fromtimestamp(timestamp).isoformat()
+
+    def _read_day(self, day):
+        if self._file is not None:
+            self._sync_strings()
+            self._file.flush()
+
+        try:
+            with open(self._day_path(day), 'rb') as f:
+                return f.read(self._days.get(day, {}).get('records', 0) * segment_record.size)
+        except FileNotFoundError:
+            return b''
+
+    def _day_path(self, day):
+        return os.path.join(self.folder, day + self.file_extension)
+
+    def _open_day(self, day):
+        if day == self._file_day:
+            return
+
+        self._close_day()
+
+        path = self._day_path(day)
+        if not os.path.exists(path):
+            open(path, 'wb').close()
+
+        self._file = open(path, 'r+b')
+        self._file_day = day
+
+        if day not in self._days:
+            self._days[day] = {'records': 0, 'tickets': []}
+            self._index_changed = True
+
+        # scarta un eventuale record incompleto (scrittura interrotta) in fondo al file
+        self._file.truncate(self._days[day]['records'] * segment_record.size)
+
+    def _close_day(self):
+        if self._file is None:
+            return
+
+        self._sync_strings()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        self._file_day = None
+
+    def _sync_strings(self):
+        # le stringhe vanno rese persistenti prima dei record che le usano
+        self._strings_file.flush()
+        os.fsync(self._strings_file.fileno())
+
+    def _string_id(self, s):
+        i = self._string_ids.get(s)
+
+        if i is None:
+            i = len(self._strings)
+            self._strings.append(s)
+            self._string_ids[s] = i
+            self._strings_file.write((json.dumps(s) + '\n').encode('utf-8'))
+            # la stringa deve essere su disco prima di qualunque record che la usa, che potrebbe esservi scritto (es.
+            # dal buffer del file del giorno) prima del prossimo flush. Le nuove stringhe sono rare
+            self._sync_strings()
+
+        return i
+
+    def _load_strings(self):
+        path = os.path.join(self.folder, self.strings_file_name)
+
+        if self._read_only and not os.path.exists(path):
+            return
+
+        self._strings_file = open(path, 'rb' if self._read_only else 'a+b')
+        self._strings_file.seek(0)
+
+        valid = 0
+        for line in self._strings_file:
+            # una riga senza terminatore è una scrittura interrotta
+            if not line.endswith(b'\n'):
+                break
+
+            s = json.loads(line.decode('utf-8'))
+            self._string_ids[s] = len(self._strings)
+            self._strings.append(s)
+            valid += len(line)
+
+        if self._read_only:
+            self._strings_file.close()
+            self._strings_file = None
+            return
+
+        self._strings_file.truncate(valid)
+        self._strings_file.seek(0, os.SEEK_END)
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.folder, self.index_file_name)) as f:
+                index = json.load(f)
+            if index.get('version') == self.index_version:
+                self._days = index['days']
+        except (FileNotFoundError, ValueError):
+            pass
+
+        if not os.path.isdir(self.folder):
+            return
+
+        # i giorni scritti dopo l'ultimo aggiornamento dell'indice vengono riletti
+        for name in os.listdir(self.folder):
+            if not name.endswith(self.file_extension):
+                continue
+
+            day = name[:-len(self.file_extension)]
+            records = os.path.getsize(os.path.join(self.folder, name)) // segment_record.size
+
+            if self._days.get(day, {}).get('records') != records:
+                self._days[day] = {'records': records, 'tickets': []}
+                self._days[day]['tickets'] = sorted({r[3] for r in self.day_records(day) if r[3] < len(self._strings)})
+                self._index_changed = True
+                self._unsynced = True
+                logging.info('Rebuilt time history index for day {}'.format(day))
+
+
+class SqliteSegmentStore(object):
+    # store dello storico nella tabella time_segments del database del backend sqlite, indicizzata per inizio, ticket e
+    # task. Ogni scrittura è una transazione a sè, in modo da non tenere bloccato il database usato dai file di salvataggio
+
+    def __init__(self, filename, read_only=False):
+        self.filename = filename
+
+        if not read_only:
+            try:
+                self._db = connect(filename)
+            except sqlite3.DatabaseError as e:
+                # il database danneggiato è già stato segnalato (e conservato) al caricamento dei file di salvataggio
+                self._db = replace_damaged_database(filename, e)
+        elif os.path.exists(filename):
+            self._db = connect_read_only(filename)
+        else:
+            # il database non esiste ancora, lo storico è vuoto
+            self._db = sqlite3.connect(':memory:')
+            self._db.executescript(SqliteBackend._schema)
+
+    def write(self, segment, handle=None):
+        with self._db:
+            if handle is None:
+                return self._db.execute('INSERT INTO time_segments (start, seconds, task_id, ticket, color_group, kind) VALUES (?, ?, ?, ?, ?, ?)', segment).lastrowid
+
+            self._db.execute('UPDATE time_segments SET start = ?, seconds = ?, task_id = ?, ticket = ?, color_group = ?, kind = ? WHERE id = ?', segment + (handle,))
+
+        return handle
+
+    def flush(self):
+        # le scritture sono già state completate
+        pass
+
+    def close(self):
+        self._db.close()
+
+    def days(self):
+        return [day for day, in self._db.execute("SELECT DISTINCT date(start, 'unixepoch', 'localtime') FROM time_segments ORDER BY 1")]
+
+    def ticket_days(self, ticket):
+        return [day for day, in self._db.execute("SELECT DISTINCT date(start, 'unixepoch', 'localtime') FROM time_segments WHERE ticket = ? ORDER BY 1", (ticket,))]
+
+    def segments(self, since, until, ticket=None, task_id=None):
+        query = 'SELECT start, seconds, task_id, ticket, color_group, kind FROM time_segments WHERE start >= ? AND start < ?'
+        params = [since, until]
+
+        if ticket is not None:
+            query += ' AND ticket = ?'
+            params.append(ticket)
+        if task_id is not None:
+            query += ' AND task_id = ?'
+            params.append(task_id)
+
+        for row in self._db.execute(query + ' ORDER BY start', params):
+            yield Segment(int(row[0]), *row[1:])
+
+    def record_buffer(self, since, until):
+        # stesso formato dello store su file, con le stringhe numerate al momento
+        strings = []
+        string_ids = {}
+
+        def string_id(s):
+            if s not in string_ids:
+                string_ids[s] = len(strings)
+                strings.append(s)
+
+            return string_ids[s]
+
+        buffer = bytearray()
+        for start, seconds, task_id, ticket, color_group, kind in self.segments(since, until):
+            buffer += segment_record.pack(start, seconds, task_id, string_id(ticket), string_id(color_group), kinds.index(kind))
+
+        return bytes(buffer), strings
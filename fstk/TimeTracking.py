@@ -0,0 +1,168 @@
+import logging
+import time
+
+
+class TimeAggregates(object):
+    # totali del tempo tracciato (di tutta la lista, per gruppo colore e per ticket) mantenuti in modo incrementale:
+    # ogni variazione di tempo di un task viene applicata come differenza, senza dover riscorrere l'intera lista dei task
+
+    total = 0
+    by_color_group = None
+    by_ticket = None
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.total = 0
+        self.by_color_group = {}
+        self.by_ticket = {}
+
+    def add(self, seconds, color_group, ticket):
+        self.update_time(seconds, color_group, ticket)
+
+    def remove(self, seconds, color_group, ticket):
+        self.update_time(-seconds, color_group, ticket)
+
+    def update_time(self, delta, color_group, ticket):
+        if delta == 0:
+            return
+
+        self.total += delta
+        self._add_to(self.by_color_group, color_group, delta)
+
+        # i task senza numero ticket non vengono raggruppati
+        if ticket != '':
+            self._add_to(self.by_ticket, ticket, delta)
+
+    def move_color_group(self, seconds, old_color_group, new_color_group):
+        if old_color_group == new_color_group:
+            return
+
+        self._add_to(self.by_color_group, old_color_group, -seconds)
+        self._add_to(self.by_color_group, new_color_group, seconds)
+
+    def move_ticket(self, seconds, old_ticket, new_ticket):
+        if old_ticket == new_ticket:
+            return
+
+        if old_ticket != '':
+            self._add_to(self.by_ticket, old_ticket, -seconds)
+        if new_ticket != '':
+            self._add_to(self.by_ticket, new_ticket, seconds)
+
+    def get_color_group_time(self, color_group):
+        return self.by_color_group.get(color_group, 0)
+
+    def get_ticket_time(self, ticket):
+        return self.by_ticket.get(ticket, 0)
+
+    @staticmethod
+    def _add_to(d, key, delta):
+        value = d.get(key, 0) + delta
+
+        # rimuovo le chiavi azzerate, in modo che i dizionari non crescano con gruppi/ticket non più usati
+        if value == 0:
+            d.pop(key, None)
+        else:
+            d[key] = value
+
+    def __repr__(self):
+        return "<TimeAggregates total={} by_color_group={} by_ticket={}>".format(self.total, self.by_color_group, self.by_ticket)
+
+
+class TimeAccounting(object):
+    # contabilizza il tempo del task attivo senza contare i tick di un timer: memorizza l'istante (monotonic e wall clock)
+    # in cui il task ha iniziato a contare e ricava il tempo trascorso su richiesta. In questo modo un event loop
+    # bloccato (es. un dialog modale) non fa perdere tempo, e il timer di refresh dell'interfaccia può essere lento
+
+    # differenza oltre la quale si considera che il wall clock abbia fatto un salto (sospensione o cambio dell'ora)
+    clock_jump_threshold = 60
+
+    _active = None
+    _started_at = None
+    _synced_at = None
+    _synced_at_wall = None
+
+    def __init__(self, credit, clock=time.monotonic, wall_clock=time.time):
+        # funzione chiamata con (task, secondi) per accreditare al task i secondi interi trascorsi
+        self._credit = credit
+        self._clock = clock
+        self._wall_clock = wall_clock
+        # frazioni di secondo già trascorse ma non ancora accreditate, per ogni task non attivo
+        self._carry = {}
+
+    def get_active(self):
+        return self._active
+
+    def is_counting(self):
+        return self._active is not None
+
+    def start(self, task):
+        if task is self._active:
+            return
+
+        self.stop()
+
+        if task is None:
+            return
+
+        now = self._clock()
+        self._active = task
+        # la frazione di secondo rimasta dall'ultima volta viene recuperata spostando indietro l'istante di partenza
+        self._started_at = now - self._carry.pop(task, 0.0)
+        self._synced_at = now
+        self._synced_at_wall = self._wall_clock()
+
+    def stop(self):
+        if self._active is None:
+            return
+
+        self.commit()
+        self._carry[self._active] = self.pending()
+        self._active = None
+
+    def pending(self):
+        # secondi (con frazione) trascorsi dal task attivo e non ancora accreditati
+        if self._active is None:
+            return 0.0
+
+        return self._clock() - self._started_at
+
+    def commit(self):
+        if self._active is None:
+            return 0
+
+        now = self._clock()
+        now_wall = self._wall_clock()
+
+        drift = (now_wall - self._synced_at_wall) - (now - self._synced_at)
+        if abs(drift) > self.clock_jump_threshold:
+            # il tempo monotonic non avanza durante la sospensione del sistema, quindi quel tempo non viene contato
+            logging.info('Wall clock jumped by {:.0f} seconds while counting time (suspend/resume or clock change), the jump is not counted'.format(drift))
+
+        self._synced_at = now
+        self._synced_at_wall = now_wall
+
+        seconds = int(now - self._started_at)
+
+        if seconds > 0:
+            # accredito solo i secondi interi, la frazione rimane in conto per il prossimo commit
+            self._started_at += seconds
+            self._credit(self._active, seconds)
+
+        return seconds
+
+    def reset(self, task):
+        # scarta il tempo non ancora accreditato di un task (es. quando il suo tempo viene azzerato)
+        self._carry.pop(task, None)
+
+        if task is self._active:
+            self._started_at = self._clock()
+
+    def forget(self, task):
+        # da chiamare quando un task viene eliminato, il tempo non accreditato viene scartato
+        self._carry.pop(task, None)
+
+        if task is self._active:
+            self._active = None
@@ -3,6 +3,8 @@ try:
 except ImportError:
     import importlib_resources as pkg_resources
 
+from PySide2.QtCore import QTimer
+
 from . import assets
 
 ASSETS_PATHS_CACHE = {}
@@ -71,9 +73,53 @@ def launch_thread(thread_class, params, signals_handlers):
     THREADS_KEEPALIVE.append(th)
 
 
-def set_prop_and_refresh(widget, prop, value):
-    widget.setProperty(prop, value)
-    widget.setStyle(widget.style())
+class StyleInvalidator(object):
+    # coda delle modifiche alle proprietà usate dai selettori degli stylesheet. Le modifiche che non cambiano il valore
+    # vengono scartate, i widget modificati vengono ristilizzati (unpolish/polish) una sola volta, alla successiva
+    # iterazione dell'event loop, indipendentemente da quante proprietà sono cambiate
+
+    def __init__(self):
+        # widget da ristilizzare, un dizionario per mantenere l'ordine senza duplicati
+        self._pending = {}
+        self._scheduled = False
+
+        # contatori della sessione corrente, mostrati nelle statistiche
+        self.changes = 0
+        self.skipped = 0
+        self.repolished = 0
+
+    def set_property(self, widget, prop, value):
+        if widget.property(prop) == value:
+            self.skipped += 1
+            return
+
+        widget.setProperty(prop, value)
+        self.changes += 1
+        self._pending[widget] = None
+
+        if not self._scheduled:
+            self._scheduled = True
+            QTimer.singleShot(0, self.flush)
+
+    def flush(self):
+        pending = self._pending
+        self._pending = {}
+        self._scheduled = False
+
+        for widget in pending:
+            try:
+                style = widget.style()
+                style.unpolish(widget)
+                style.polish(widget)
+                widget.update()
+            except RuntimeError:
+                # il widget è stato distrutto prima della ristilizzazione
+                continue
+
+            self.repolished += 1
+
+
+style_invalidator = StyleInvalidator()
 
 
 def is_property_different(d1, d2, property):
@@ -3,11 +3,12 @@ import logging
 import os
 import sys
 import signal
+import time
 
 from PySide2.QtWidgets import QApplication
 
 from .Fstk import MainWidget, MainWindow
-from . import Globals
+from . import Globals, Styles
 
 faulthandler.enable()
 
@@ -21,6 +22,8 @@ logging.basicConfig(level=logging.DEBUG,
                     ])
 logging.debug('FSTK started...')
 
+Globals.start_time = time.monotonic()
+
 # se l'ambiente specifica una cartella di configurazione specifica
 if os.getenv('FSTK_CONFIG_FOLDER') is not None:
     Globals.config_folder = os.path.expanduser(os.getenv('FSTK_CONFIG_FOLDER'))
@@ -30,6 +33,25 @@ else:
 
 Globals.desktop_folder = os.path.expanduser(Globals.desktop_folder)
 
+# se l'ambiente specifica un backend per i file di salvataggio
+if os.getenv('FSTK_STORAGE_BACKEND') is not None:
+    if os.getenv('FSTK_STORAGE_BACKEND') not in ('json', 'sqlite', 'binary'):
+        logging.critical('Invalid value for enviroment variable FSTK_STORAGE_BACKEND ({}), valid values are: json, sqlite, binary'.format(os.getenv('FSTK_STORAGE_BACKEND')))
+        sys.exit()
+
+    Globals.storage_backend = os.getenv('FSTK_STORAGE_BACKEND')
+    logging.info('Enviroment variable FSTK_STORAGE_BACKEND defined, using {} storage backend.'.format(Globals.storage_backend))
+
+# export dei dati senza interfaccia grafica (python -m fstk export ...), non richiede il file di lock
+if len(sys.argv) > 1 and sys.argv[1] == 'export':
+    from . import Export
+    sys.exit(Export.main(sys.argv[2:]))
+
+# simulazione delle migrazioni dei file di salvataggio senza modificarli (python -m fstk check-migrations)
+if len(sys.argv) > 1 and sys.argv[1] == 'check-migrations':
+    from . import SavefilesMigrations
+    sys.exit(SavefilesMigrations.main(sys.argv[2:]))
+
 if not os.path.isdir(Globals.config_folder):
     try:
         os.mkdir(Globals.config_folder)
@@ -79,14 +101,13 @@ with open(lock_file_path, 'w') as o:
 
 # Qt Application
 app = QApplication(sys.argv)
-app.setStyleSheet(Globals.default_window_style + '''
+app.setStyleSheet(Globals.default_window_style + Styles.task_row_style + '''
     QMenuBar, QMenu { background-color: #444f5d } 
     QMenu::item:selected { background-color: #232931 } 
     QMenu::item:disabled { color: #6e6e6e } 
 
-    QListWidget { background-color: #232931; } 
-    QListWidget::item, QSizeGrip { background-color: #353d48; } 
-    QListWidget::item:selected { background-color: #4d1f48; } 
+    TaskListView { background-color: #232931; } 
+    QSizeGrip { background-color: #353d48; } 
 
     QStatusBar { background-color: #444f5d } 
     QScrollBar {
@@ -42,6 +42,12 @@ setuptools.setup(
         ':python_version < "3.8.5"': [
             'importlib_resources',
         ],
+        'fast': [
+            'orjson',
+        ],
+        'reports': [
+            'numpy',
+        ],
     },
     python_requires='>=3',
 )
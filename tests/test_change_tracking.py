@@ -0,0 +1,75 @@
+import copy
+import unittest
+
+from fstk.SaveFiles import ChangeTracker, FlushFlagDict
+
+
+class ChangeTrackingTest(unittest.TestCase):
+    # percorsi modificati registrati da FlushFlagDict nel ChangeTracker condiviso
+
+    def setUp(self):
+        self.tracker = ChangeTracker()
+        self.data = FlushFlagDict.wrap({
+            'current_tasks': {
+                '0': {'name': 'Task 0', 'elapsed_time': 0},
+                '1': {'name': 'Task 1', 'elapsed_time': 60}
+            },
+            'options': {'enabled': True},
+            'version': 1
+        }, self.tracker)
+
+    def test_nested_change_marks_its_path(self):
+        self.data['current_tasks']['1']['elapsed_time'] = 120
+
+        self.assertEqual(self.tracker.paths, {('current_tasks', '1', 'elapsed_time')})
+        self.assertEqual(self.tracker.sections(), {'current_tasks'})
+        self.assertTrue(self.tracker.is_dirty(('current_tasks',)))
+        self.assertTrue(self.tracker.is_dirty(('current_tasks', '1', 'elapsed_time', 'x')))
+        self.assertFalse(self.tracker.is_dirty(('current_tasks', '0')))
+
+    def test_unchanged_value_is_not_marked(self):
+        self.data['version'] = 1
+        self.data['options']['enabled'] = True
+        self.data['current_tasks']['0'] = {'name': 'Task 0', 'elapsed_time': 0}
+
+        self.assertTrue(self.tracker.is_clean())
+
+        # valori uguali ma di tipo diverso vengono serializzati in modo diverso
+        self.data['version'] = True
+        self.assertEqual(self.tracker.paths, {('version',)})
+
+    def test_delete_and_pop_mark_the_key(self):
+        del self.data['current_tasks']['0']
+        self.data['options'].pop('enabled')
+        self.data['options'].pop('missing', None)
+
+        self.assertEqual(self.tracker.paths, {('current_tasks', '0'), ('options', 'enabled')})
+
+    def test_reorder_marks_the_dictionary_once(self):
+        self.data['current_tasks'].reorder(['0', '1'])
+        self.assertTrue(self.tracker.is_clean())
+
+        self.data['current_tasks'].reorder(['1', '0'])
+        self.assertEqual(self.tracker.paths, {('current_tasks',)})
+        self.assertEqual(list(self.data['current_tasks']), ['1', '0'])
+
+    def test_assigned_dictionary_tracks_its_children(self):
+        self.data['current_tasks']['2'] = {'name': 'Task 2'}
+        self.tracker.clear()
+
+        self.data['current_tasks']['2']['name'] = 'Renamed'
+        self.assertEqual(self.tracker.paths, {('current_tasks', '2', 'name')})
+
+    def test_deepcopy_shares_the_tracker(self):
+        self.assertIs(copy.deepcopy(self.tracker), self.tracker)
+
+        data = copy.deepcopy(self.data)
+        self.assertTrue(self.tracker.is_clean())
+
+        data['version'] = 2
+        self.assertEqual(self.tracker.paths, {('version',)})
+        self.assertEqual(self.data['version'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
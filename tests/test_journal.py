@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from fstk import Globals
+from fstk.SaveFiles import SaveFile
+
+
+class JournalTest(unittest.TestCase):
+    # journal delle modifiche del backend json e sua compattazione nel file principale
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self._tmp.name, 'config.json')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def open_config(self):
+        config = SaveFile(self.filename, filetype='config', default=Globals.default_config, journal=True)
+        self.addCleanup(config.close)
+
+        return config
+
+    def read_file(self):
+        with open(self.filename) as f:
+            return json.load(f)
+
+    def create_file(self):
+        config = self.open_config()
+        config.save(compact=True)
+        config.wait()
+
+        return config
+
+    def test_changes_are_replayed_from_journal(self):
+        config = self.create_file()
+        config.set(('first_run',), False)
+        config.set(('window', 'x'), 100)
+        config.delete(('task_templates',))
+        config.sync_journal()
+        # interruzione senza compattazione: il file principale non contiene le modifiche
+        config.close()
+
+        self.assertTrue(self.read_file()['first_run'])
+
+        config = self.open_config()
+        self.assertFalse(config['first_run'])
+        self.assertEqual(config['window']['x'], 100)
+        self.assertNotIn('task_templates', config)
+
+    def test_compaction_empties_journal(self):
+        config = self.create_file()
+        config.set(('first_run',), False)
+        config.sync_journal()
+        config.save(compact=True)
+        config.wait()
+
+        self.assertFalse(self.read_file()['first_run'])
+        self.assertEqual(os.path.getsize(self.filename + '.journal'), 0)
+        self.assertFalse(os.path.exists(self.filename + '.journal.compacting'))
+
+    def test_truncated_record_is_dropped(self):
+        config = self.create_file()
+        config.set(('first_run',), False)
+        config.sync_journal()
+        config.close()
+
+        # scrittura interrotta a metà dell'ultimo record
+        with open(self.filename + '.journal', 'a') as o:
+            o.write('{"op":"set","path":["window","x"],"va')
+
+        config = self.open_config()
+        self.assertFalse(config['first_run'])
+        self.assertEqual(config['window']['x'], 0)
+
+        # i record successivi non vengono accodati alla riga incompleta
+        config.set(('window', 'y'), 50)
+        config.sync_journal()
+        config.close()
+
+        config = self.open_config()
+        self.assertEqual(config['window']['y'], 50)
+
+    def test_interrupted_compaction_is_replayed(self):
+        config = self.create_file()
+        config.set(('first_run',), False)
+        config.sync_journal()
+        config.close()
+
+        # compattazione interrotta dopo aver messo da parte il journal, il nuovo journal contiene le modifiche successive
+        os.replace(self.filename + '.journal', self.filename + '.journal.compacting')
+        with open(self.filename + '.journal', 'w') as o:
+            o.write('{"op":"set","path":["window","x"],"value":100}\n')
+
+        config = self.open_config()
+        self.assertFalse(config['first_run'])
+        self.assertEqual(config['window']['x'], 100)
+
+    def test_compaction_skipped_when_previous_write_is_stuck(self):
+        config = self.create_file()
+
+        # una scrittura bloccata impedisce la compattazione, le modifiche restano nel journal
+        release = threading.Event()
+        self.addCleanup(release.set)
+        config._backend._worker.submit(release.wait)
+        config._backend.compaction_wait_timeout = 0.05
+
+        config.set(('first_run',), False)
+        config.sync_journal()
+        config.save(compact=True)
+
+        self.assertTrue(self.read_file()['first_run'])
+        self.assertGreater(os.path.getsize(self.filename + '.journal'), 0)
+
+        release.set()
+        config.wait()
+        config.close()
+
+        self.assertFalse(self.open_config()['first_run'])
+
+
+if __name__ == '__main__':
+    unittest.main()
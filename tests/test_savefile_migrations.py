@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+
+from fstk import Globals
+from fstk.NotesStore import NotesStore
+from fstk.SaveFiles import SaveFile
+from fstk.TaskArchive import TaskArchive
+
+
+NOTES = 'First line of the notes\nsecond line'
+
+
+class TasksNotesMigrationTest(unittest.TestCase):
+    # migrazione delle note dei task (versione 4 -> 5) nel notes store, con il file dei task in modalità journal
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.filename = os.path.join(self.folder, 'tasks.json')
+        self.notes_folder = os.path.join(self.folder, 'notes')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write_v4_tasks(self):
+        with open(self.filename, 'w') as o:
+            json.dump({
+                'current_tasks': {
+                    '0': {'name': 'Task', 'ticket': '1234', 'elapsed_time': 5, 'color_group': 'Blue', 'ticket_title': '', 'notes': NOTES}
+                },
+                'version': 4
+            }, o)
+
+    def open_tasks(self, **kwargs):
+        resources = {'notes_store': NotesStore(self.notes_folder), 'task_archive': TaskArchive(os.path.join(self.folder, 'archive'))}
+        tasks = SaveFile(self.filename, filetype='tasks', journal=True, migration_resources=resources, **kwargs)
+        self.addCleanup(tasks.close)
+
+        return tasks
+
+    def assert_notes_migrated(self, task):
+        self.assertNotIn('notes', task)
+        self.assertEqual(task['notes_preview'], 'First line of the notes')
+        self.assertEqual(NotesStore(self.notes_folder).get(task['notes_ref']), NOTES)
+
+    def test_upgrade_journal_crash_reload(self):
+        self.write_v4_tasks()
+
+        tasks = self.open_tasks()
+        task = dict(tasks['current_tasks']['0'])
+        self.assert_notes_migrated(task)
+
+        # il file principale viene riscritto subito dopo la migrazione
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f)['version'], Globals.tasks_file_version)
+
+        tasks.set(('current_tasks', '0'), dict(task, elapsed_time=60))
+        tasks.sync_journal()
+        # interruzione senza salvataggio completo
+        tasks.close()
+
+        task = dict(self.open_tasks()['current_tasks']['0'])
+        self.assertEqual(task['elapsed_time'], 60)
+        self.assert_notes_migrated(task)
+
+    def test_migration_over_replayed_journal(self):
+        # file principale ancora alla versione 4 con il journal scritto dopo la migrazione (es. interruzione prima
+        # della riscrittura del file principale): i task del journal sono già migrati e non vengono toccati
+        self.write_v4_tasks()
+        ref = NotesStore(self.notes_folder).put(NOTES)
+        task = {'name': 'Task', 'ticket': '1234', 'elapsed_time': 60, 'color_group': 'Blue', 'ticket_title': '', 'notes_ref': ref, 'notes_preview': NotesStore.preview(NOTES)}
+
+        with open(self.filename + '.journal', 'w') as o:
+            o.write(json.dumps({'op': 'set', 'path': ['current_tasks', '0'], 'value': task}) + '\n')
+
+        task = dict(self.open_tasks()['current_tasks']['0'])
+        self.assertEqual(task['elapsed_time'], 60)
+        self.assert_notes_migrated(task)
+
+    def test_read_only_migration_writes_nothing(self):
+        self.write_v4_tasks()
+
+        tasks = self.open_tasks(read_only=True)
+        task = dict(tasks['current_tasks']['0'])
+
+        self.assertEqual(task['notes_preview'], 'First line of the notes')
+        self.assertFalse(os.path.exists(self.notes_folder))
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f)['version'], 4)
+
+
+    def test_dry_run_writes_nothing(self):
+        self.write_v4_tasks()
+
+        tasks = self.open_tasks(dry_run=True)
+
+        self.assertEqual([(i, j) for i, j, _, _ in tasks.migration_report], [(4, 5), (5, 6)])
+        self.assertEqual(tasks['version'], 4)
+        self.assertEqual(sorted(os.listdir(self.folder)), ['tasks.json'])
+
+    def test_next_task_id_after_archived_tasks(self):
+        self.write_v4_tasks()
+        TaskArchive(os.path.join(self.folder, 'archive')).archive([(7, {'name': 'Archived'})])
+
+        self.assertEqual(self.open_tasks()['next_task_id'], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from fstk import Globals
+from fstk.NotesStore import NotesStore
+from fstk.SaveFiles import SaveFile
+
+
+class SaveFileLoadTest(unittest.TestCase):
+    # caricamento dei file di salvataggio non ancora creati, vuoti o danneggiati
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self._tmp.name, 'config.json')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def open_config(self):
+        config = SaveFile(self.filename, filetype='config', default=Globals.default_config)
+        self.addCleanup(config.close)
+
+        return config
+
+    def test_missing_file_uses_defaults(self):
+        config = self.open_config()
+
+        self.assertIsNone(config.load_error)
+        self.assertEqual(config['version'], Globals.config_file_version)
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_empty_file_uses_defaults(self):
+        open(self.filename, 'w').close()
+
+        config = self.open_config()
+
+        self.assertIsNone(config.load_error)
+        self.assertEqual(config['version'], Globals.config_file_version)
+
+    def test_damaged_file_is_reported(self):
+        with open(self.filename, 'w') as o:
+            o.write('{"window": ')
+
+        config = self.open_config()
+
+        self.assertIsNotNone(config.load_error)
+        self.assertEqual(config['version'], Globals.config_file_version)
+
+
+    def test_default_tasks_are_current(self):
+        tasks = SaveFile(os.path.join(self._tmp.name, Globals.tasks_file_name), filetype='tasks', default=Globals.default_tasks, journal=True)
+        self.addCleanup(tasks.close)
+
+        # i task di default non richiedono migrazioni, le note del task di esempio sono un riferimento al notes store
+        self.assertTrue(tasks.default_loaded)
+        self.assertEqual(tasks['version'], Globals.tasks_file_version)
+        self.assertEqual(tasks['next_task_id'], 1)
+        self.assertEqual(tasks['current_tasks']['0']['notes_ref'], NotesStore.ref(Globals.default_task_notes))
+        self.assertNotIn('notes', tasks['current_tasks']['0'])
+
+        # le modifiche non si ripercuotono sui default
+        tasks.set(('current_tasks', '0', 'name'), 'Renamed')
+        self.assertEqual(Globals.default_tasks['current_tasks']['0']['name'], 'Task di esempio')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from fstk import Globals, SavefilesBinary
+from fstk.SaveFiles import SaveFile
+
+
+def tasks_data():
+    return {
+        'current_tasks': {
+            str(i): {'name': 'Task {}'.format(i), 'ticket': str(1000 + i), 'elapsed_time': i * 60, 'color_group': 'Blue',
+                     'ticket_title': None if i == 2 else '', 'notes_ref': '', 'notes_preview': ''}
+            for i in range(3)
+        },
+        'next_task_id': 3,
+        'version': Globals.tasks_file_version
+    }
+
+
+class StorageBackendTest(unittest.TestCase):
+    # round trip dei task tra il file json e gli altri backend
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.filename = os.path.join(self.folder, Globals.tasks_file_name)
+
+        with open(self.filename, 'w') as o:
+            json.dump(tasks_data(), o)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def open_tasks(self, backend, **kwargs):
+        tasks = SaveFile(self.filename, filetype='tasks', journal=True, backend=backend, **kwargs)
+        self.addCleanup(tasks.close)
+
+        return tasks
+
+    def change_task(self, tasks, elapsed_time):
+        task = dict(tasks['current_tasks']['1'], elapsed_time=elapsed_time)
+        tasks.set(('current_tasks', '1'), task)
+        tasks.sync_journal()
+
+    def assert_no_json_journal(self):
+        self.assertFalse(os.path.exists(self.filename + '.journal'))
+
+
+class BinaryBackendTest(StorageBackendTest):
+
+    def test_round_trip(self):
+        tasks = self.open_tasks('binary')
+        self.assertEqual(dict(tasks['current_tasks']['2']), tasks_data()['current_tasks']['2'])
+
+        self.change_task(tasks, 999)
+        tasks.close()
+
+        tasks = self.open_tasks('binary')
+        self.assertEqual(tasks['current_tasks']['1']['elapsed_time'], 999)
+        self.assertEqual(tasks['next_task_id'], 3)
+
+        tasks.save(compact=True)
+        tasks.wait()
+        tasks.close()
+
+        self.assertEqual(self.open_tasks('binary')['current_tasks']['1']['elapsed_time'], 999)
+        self.assert_no_json_journal()
+
+    def test_switch_back_to_json(self):
+        tasks = self.open_tasks('binary')
+        self.change_task(tasks, 999)
+        tasks.close()
+
+        # le modifiche fatte con il backend binario non vengono perse tornando al backend json
+        tasks = self.open_tasks('json')
+        self.assertEqual(tasks['current_tasks']['1']['elapsed_time'], 999)
+        self.assertFalse(os.path.exists(os.path.join(self.folder, 'tasks' + SavefilesBinary.file_extension)))
+
+        self.change_task(tasks, 1000)
+        tasks.close()
+
+        # tornando al backend binario i dati vengono importati di nuovo dal file json
+        self.assertEqual(self.open_tasks('binary')['current_tasks']['1']['elapsed_time'], 1000)
+
+    def test_reader_lazy_access(self):
+        tasks = self.open_tasks('binary')
+        tasks.save(compact=True)
+        tasks.wait()
+
+        binary = os.path.join(self.folder, 'tasks' + SavefilesBinary.file_extension)
+
+        with SavefilesBinary.TasksFileReader(binary) as reader:
+            data = reader.to_dict()
+            self.assertEqual(reader.task(1), ('1', data['current_tasks']['1']))
+            self.assertEqual(reader.string(0), 'Task 0')
+            self.assertEqual(dict(reader.tasks()), data['current_tasks'])
+
+        exported = os.path.join(self.folder, 'exported.json')
+        SavefilesBinary.to_json(binary, exported)
+
+        with open(exported) as f:
+            self.assertEqual(json.load(f), tasks_data())
+
+
+class SqliteBackendTest(StorageBackendTest):
+
+    def database(self):
+        return os.path.join(self.folder, Globals.sqlite_file_name)
+
+    def imported(self):
+        with sqlite3.connect(self.database()) as db:
+            return db.execute("SELECT 1 FROM imports WHERE filetype = 'tasks'").fetchone() is not None
+
+    def test_round_trip(self):
+        tasks = self.open_tasks('sqlite')
+        self.assertEqual(dict(tasks['current_tasks']['2']), tasks_data()['current_tasks']['2'])
+
+        self.change_task(tasks, 999)
+        tasks.delete(('current_tasks', '0'))
+        tasks.sync_journal()
+        tasks.close()
+
+        tasks = self.open_tasks('sqlite')
+        self.assertEqual(tasks['current_tasks']['1']['elapsed_time'], 999)
+        self.assertEqual(list(tasks['current_tasks']), ['1', '2'])
+        self.assertEqual(tasks['next_task_id'], 3)
+
+        tasks.save(compact=True)
+        tasks.close()
+
+        # il file json viene solo letto per l'importazione
+        self.assert_no_json_journal()
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f), tasks_data())
+
+    def test_damaged_import_is_reported(self):
+        with open(self.filename, 'w') as o:
+            o.write('{"current_tasks": ')
+
+        tasks = self.open_tasks('sqlite', default=tasks_data())
+        self.assertIsNotNone(tasks.load_error)
+        self.assertEqual(tasks.load_error_filename, self.filename)
+        tasks.close()
+
+        # l'importazione non viene registrata, e viene ripetuta dopo il ripristino del file json
+        self.assertFalse(self.imported())
+
+        with open(self.filename, 'w') as o:
+            json.dump(dict(tasks_data(), next_task_id=10), o)
+
+        tasks = self.open_tasks('sqlite')
+        self.assertIsNone(tasks.load_error)
+        self.assertEqual(tasks['next_task_id'], 10)
+        self.assertTrue(self.imported())
+
+    def test_damaged_database_is_reported(self):
+        with open(self.database(), 'wb') as o:
+            o.write(b'not a database' * 100)
+
+        tasks = self.open_tasks('sqlite', default=tasks_data())
+        self.assertIsInstance(tasks.load_error, sqlite3.DatabaseError)
+        self.assertEqual(tasks.load_error_filename, self.database())
+
+        # il database danneggiato viene sostituito solo al primo salvataggio
+        with open(self.database(), 'rb') as f:
+            self.assertTrue(f.read().startswith(b'not a database'))
+
+        self.change_task(tasks, 999)
+        tasks.close()
+
+        tasks = self.open_tasks('sqlite')
+        self.assertIsNone(tasks.load_error)
+        self.assertEqual(tasks['current_tasks']['1']['elapsed_time'], 999)
+
+
+if __name__ == '__main__':
+    unittest.main()
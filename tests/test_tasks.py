@@ -0,0 +1,57 @@
+import unittest
+
+try:
+    from fstk.Tasks import Task, TaskListModel, TaskRegistry
+except ImportError as e:
+    # il modello della lista dei task dipende da PySide2
+    raise unittest.SkipTest('PySide2 is not available ({})'.format(e))
+
+
+class TaskRegistryIdsTest(unittest.TestCase):
+
+    def test_ids_of_deleted_tasks_are_not_reused(self):
+        registry = TaskRegistry()
+        for task_id in (0, 1, 2):
+            t = Task('Task {}'.format(task_id))
+            t.id = task_id
+            registry.add(t)
+
+        registry.remove(registry.get(2))
+        next_id = registry.next_id
+
+        # riavvio: il registro viene ricreato dai task rimasti e dall'id salvato
+        registry = TaskRegistry()
+        for task_id in (0, 1):
+            t = Task('Task {}'.format(task_id))
+            t.id = task_id
+            registry.add(t)
+        registry.seed(next_id)
+
+        task = Task('New task')
+        registry.add(task)
+
+        self.assertEqual(task.id, 3)
+
+
+class TaskListModelBatchTest(unittest.TestCase):
+
+    def test_all_updated_in_batch_emits_once(self):
+        model = TaskListModel()
+        model.set_tasks(Task('Task {}'.format(i)) for i in range(5))
+
+        emitted = []
+        model.dataChanged.connect(lambda top_left, bottom_right: emitted.append((top_left.row(), bottom_right.row())))
+
+        model.begin_batch()
+        model.task_updated(model.task(1))
+        model.all_updated()
+        model.task_updated(model.task(3))
+        self.assertEqual(emitted, [])
+        model.end_batch()
+
+        # un solo aggiornamento dell'intera lista, che comprende le singole righe
+        self.assertEqual(emitted, [(0, 4)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from fstk.TimeHistory import Segment, SegmentStore
+
+
+class SegmentStoreCrashTest(unittest.TestCase):
+    # consistenza tra il file strings e i file dei giorni dopo un'interruzione
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.start = int(time.time())
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def open_store(self, **kwargs):
+        store = SegmentStore(self.folder, **kwargs)
+        self.addCleanup(store.close)
+
+        return store
+
+    def read_strings(self):
+        with open(os.path.join(self.folder, SegmentStore.strings_file_name), 'rb') as f:
+            return [json.loads(line) for line in f]
+
+    def test_new_string_on_disk_before_record(self):
+        store = self.open_store()
+        store.write(Segment(self.start, 60, 1, '1234', 'Blue', 'count'))
+
+        # senza flush: le stringhe usate dal record sono già su disco
+        self.assertEqual(self.read_strings(), ['1234', 'Blue'])
+
+    def test_records_with_lost_strings_are_skipped(self):
+        store = self.open_store()
+        store.write(Segment(self.start, 60, 1, '1234', 'Blue', 'count'))
+        store.write(Segment(self.start + 60, 30, 2, '5678', 'Red', 'count'))
+        store.flush()
+        store.close()
+
+        # interruzione che ha perso le ultime stringhe ma non i record
+        with open(os.path.join(self.folder, SegmentStore.strings_file_name), 'wb') as o:
+            o.write(b'"1234"\n"Blue"\n')
+
+        segments = list(self.open_store(read_only=True).segments(self.start, self.start + 120))
+
+        self.assertEqual(segments, [Segment(self.start, 60, 1, '1234', 'Blue', 'count')])
+
+
+if __name__ == '__main__':
+    unittest.main()